@@ -1,26 +1,451 @@
-from fastapi import FastAPI, APIRouter, HTTPException, File, UploadFile, BackgroundTasks
+from fastapi import FastAPI, APIRouter, HTTPException, File, UploadFile, BackgroundTasks, Request, Response, WebSocket, WebSocketDisconnect, Query
 from dotenv import load_dotenv
 from starlette.middleware.cors import CORSMiddleware
+from fastapi.responses import ORJSONResponse, StreamingResponse
 from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import ASCENDING, DESCENDING, GEOSPHERE, IndexModel, InsertOne, UpdateMany, UpdateOne
+from pymongo import monitoring
+from pymongo.errors import AutoReconnect, BulkWriteError, DuplicateKeyError, NetworkTimeout
+import httpx
 import os
 import logging
 import json
 from pathlib import Path
 from pydantic import BaseModel, Field
-from typing import List, Optional, Dict, Any
+from typing import List, Optional, Dict, Any, Tuple, Iterator, AsyncIterator, Callable
 import uuid
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, timezone
+import abc
 import asyncio
+import base64
+import bisect
+import gzip
+import io
+import ipaddress
+import math
+import multiprocessing
 import random
+import re
+import struct
+import threading
+import time
+import urllib.parse
+import zlib
+from array import array
+from collections import OrderedDict
+from dataclasses import dataclass
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+import xml.etree.ElementTree as ET
+import numpy as np
+import orjson
+import pandas as pd
+from scipy.sparse import csr_matrix
+from scipy.sparse.csgraph import connected_components, dijkstra
 
 ROOT_DIR = Path(__file__).parent
 load_dotenv(ROOT_DIR / '.env')
 
+# Indexes every collection needs; reconciled by ensure_indexes() at startup
+REQUIRED_INDEXES: Dict[str, List[IndexModel]] = {
+    "active_routes": [
+        IndexModel([("id", ASCENDING)], unique=True),
+        IndexModel([("is_active", ASCENDING), ("last_seen_at", ASCENDING)]),
+    ],
+    "archived_routes": [
+        IndexModel([("id", ASCENDING)], unique=True),
+        IndexModel([("ended_at", DESCENDING)]),
+    ],
+    "sos_alerts": [
+        IndexModel([("id", ASCENDING)], unique=True),
+        IndexModel([("timestamp", DESCENDING)]),
+        IndexModel([("user_id", ASCENDING), ("timestamp", DESCENDING)]),
+    ],
+    "emergency_contacts": [
+        IndexModel([("id", ASCENDING)], unique=True),
+        IndexModel([("owner_id", ASCENDING), ("priority", ASCENDING), ("id", ASCENDING)]),
+    ],
+    "incidents": [
+        IndexModel([("id", ASCENDING)], unique=True),
+        IndexModel([("geo", GEOSPHERE)]),
+        IndexModel([("timestamp", DESCENDING)]),
+    ],
+    "location_traces": [
+        IndexModel([("route_id", ASCENDING), ("start", ASCENDING)]),
+    ],
+    "sos_coalesce": [
+        IndexModel([("last_triggered_at", ASCENDING)], expireAfterSeconds=3600),  # windows are minutes long
+    ],
+    "notification_log": [
+        IndexModel([("key", ASCENDING)], unique=True),
+        IndexModel([("alert_id", ASCENDING)]),
+    ],
+}
+MONGO_SLOW_QUERY_MS = float(os.environ.get("MONGO_SLOW_QUERY_MS", "100"))
+LATENCY_BUCKETS_S = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+class Histogram:
+    """Fixed-bucket histogram rendered in the Prometheus text format"""
+    __slots__ = ("bounds", "counts", "sum")
+
+    def __init__(self, bounds: Tuple[float, ...] = LATENCY_BUCKETS_S):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.sum = 0.0
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(self.bounds, value)] += 1
+        self.sum += value
+
+    def exposition(self, name: str, labels: str = "") -> List[str]:
+        prefix = labels + "," if labels else ""
+        lines, cumulative = [], 0
+        for bound, count in zip(self.bounds, self.counts):
+            cumulative += count
+            lines.append(f'{name}_bucket{{{prefix}le="{bound}"}} {cumulative}')
+        cumulative += self.counts[-1]
+        lines.append(f'{name}_bucket{{{prefix}le="+Inf"}} {cumulative}')
+        suffix = f"{{{labels}}}" if labels else ""
+        lines.append(f"{name}_sum{suffix} {self.sum}")
+        lines.append(f"{name}_count{suffix} {cumulative}")
+        return lines
+
+class MongoCommandMonitor(monitoring.CommandListener):
+    """Per-collection command latency, slow-query and unindexed-query logging.
+
+    Called from the driver's threads, so stats are guarded by a lock. A query is
+    reported as unindexed when none of its filter fields leads a declared index.
+    """
+
+    FILTER_FIELDS = {"find": "filter", "count": "query", "findAndModify": "query", "distinct": "query"}
+
+    def __init__(self, slow_ms: float = MONGO_SLOW_QUERY_MS):
+        self.slow_ms = slow_ms
+        self.stats: Dict[Tuple[str, str], Dict[str, float]] = {}
+        self._pending: Dict[Tuple[int, Any], Tuple[str, str, List[str]]] = {}
+        self._warned: set = set()
+        self._lock = threading.Lock()
+
+    @classmethod
+    def filter_of(cls, command) -> Optional[Dict[str, Any]]:
+        name = next(iter(command))
+        if name in cls.FILTER_FIELDS:
+            return command.get(cls.FILTER_FIELDS[name]) or {}
+        if name in ("update", "delete"):
+            statements = command.get("updates") or command.get("deletes") or [{}]
+            return statements[0].get("q", {})
+        if name == "aggregate":
+            pipeline = command.get("pipeline") or [{}]
+            return pipeline[0].get("$match") if pipeline else None
+        return None
+
+    def started(self, event):
+        collection = event.command.get(event.command_name)
+        if not isinstance(collection, str):
+            return
+        query = self.filter_of(event.command)
+        fields = [k for k in query if not k.startswith("$")] if query else []
+        with self._lock:
+            self._pending[(event.request_id, event.connection_id)] = (collection, event.command_name, fields)
+
+    def _finish(self, event, failed: bool):
+        with self._lock:
+            pending = self._pending.pop((event.request_id, event.connection_id), None)
+            if pending is None:
+                return
+            collection, operation, fields = pending
+            elapsed_ms = event.duration_micros / 1000.0
+            stat = self.stats.setdefault((collection, operation), {
+                "count": 0, "failed": 0, "total_ms": 0.0, "max_ms": 0.0, "slow": 0, "seconds": Histogram()})
+            stat["seconds"].observe(elapsed_ms / 1000.0)
+            stat["count"] += 1
+            stat["failed"] += failed
+            stat["total_ms"] += elapsed_ms
+            stat["max_ms"] = max(stat["max_ms"], elapsed_ms)
+            stat["slow"] += elapsed_ms >= self.slow_ms
+            unindexed = fields and "_id" not in fields and not any(
+                next(iter(index.document["key"])) in fields for index in REQUIRED_INDEXES.get(collection, ()))
+            warn_unindexed = unindexed and (collection, tuple(sorted(fields))) not in self._warned
+            if warn_unindexed:
+                self._warned.add((collection, tuple(sorted(fields))))
+        if elapsed_ms >= self.slow_ms:
+            logging.getLogger(__name__).warning(f"Slow Mongo {operation} on {collection} took {elapsed_ms:.1f} ms (filter fields: {fields})")
+        if warn_unindexed:
+            logging.getLogger(__name__).warning(f"Mongo {operation} on {collection} filters on {fields}, which no declared index covers")
+
+    def succeeded(self, event):
+        self._finish(event, failed=False)
+
+    def failed(self, event):
+        self._finish(event, failed=True)
+
 # MongoDB connection
+mongo_monitor = MongoCommandMonitor()
 mongo_url = os.environ['MONGO_URL']
-client = AsyncIOMotorClient(mongo_url)
+client = AsyncIOMotorClient(mongo_url, event_listeners=[mongo_monitor])
 db = client[os.environ['DB_NAME']]
 
+# Event bus: fans SOS and route events out to every worker
+EVENT_BUS_URL = os.environ.get("EVENT_BUS_URL", "")  # empty for in-process, redis://[:password@]host:port otherwise
+EVENT_BUS_PREFIX = os.environ.get("EVENT_BUS_PREFIX", "safeguard:")
+EVENT_BUS_LINGER_S = 0.002  # how long a flush waits for more events to batch
+EVENT_BUS_MAX_BATCH = 1000
+EVENT_BUS_MAX_PENDING = 100000  # events held while the broker is unreachable
+EVENT_BUS_SUBSCRIBER_QUEUE = 1000
+EVENT_BUS_RECONNECT_S = 1.0
+ROUTE_LIFECYCLE_CHANNEL = "routes"
+SOS_CHANNEL = "sos"
+
+class EventSubscription:
+    """Async iterator over the events of one or more channels"""
+
+    def __init__(self, bus: "EventBus", channels: Tuple[str, ...]):
+        self.bus = bus
+        self.channels = channels
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=EVENT_BUS_SUBSCRIBER_QUEUE)
+
+    async def __aenter__(self):
+        for channel in self.channels:
+            self.bus._add_subscriber(channel, self.queue)
+        return self
+
+    async def __aexit__(self, *exc_info):
+        for channel in self.channels:
+            self.bus._remove_subscriber(channel, self.queue)
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self) -> Dict[str, Any]:
+        return await self.queue.get()
+
+class EventBus(abc.ABC):
+    """Batched publish/subscribe between workers.
+
+    publish() never waits: events are queued and a flusher sends everything that
+    arrived within EVENT_BUS_LINGER_S as one batch, one message per channel. A batch
+    that cannot be sent is kept and retried, up to EVENT_BUS_MAX_PENDING events.
+    Subclasses implement _send to carry a batch to every worker's subscribers.
+    """
+
+    def __init__(self, prefix: str = EVENT_BUS_PREFIX):
+        self.prefix = prefix
+        self.subscribers: Dict[str, set] = {}
+        self.pending: List[Tuple[str, Dict[str, Any]]] = []
+        self.published = 0
+        self.dropped = 0
+        self._wakeup = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+
+    def publish(self, channel: str, event: Dict[str, Any]):
+        """Queue an event; it must be JSON-native (timestamps as ISO strings)"""
+        if len(self.pending) >= EVENT_BUS_MAX_PENDING:
+            self.pending.pop(0)
+            self.dropped += 1
+        self.pending.append((channel, event))
+        self._wakeup.set()
+
+    def subscribe(self, *channels: str) -> EventSubscription:
+        return EventSubscription(self, channels)
+
+    def _add_subscriber(self, channel: str, queue: asyncio.Queue):
+        self.subscribers.setdefault(channel, set()).add(queue)
+
+    def _remove_subscriber(self, channel: str, queue: asyncio.Queue):
+        queues = self.subscribers.get(channel)
+        if queues is not None:
+            queues.discard(queue)
+            if not queues:
+                del self.subscribers[channel]
+
+    def _dispatch(self, channel: str, events: List[Dict[str, Any]]):
+        for queue in self.subscribers.get(channel, ()):
+            for event in events:
+                try:
+                    queue.put_nowait(event)
+                except asyncio.QueueFull:
+                    self.dropped += 1
+                    logger.warning(f"Event bus subscriber on {channel} is too slow; dropped an event")
+
+    @staticmethod
+    def _group(batch: List[Tuple[str, Dict[str, Any]]]) -> Dict[str, List[Dict[str, Any]]]:
+        by_channel: Dict[str, List[Dict[str, Any]]] = {}
+        for channel, event in batch:
+            by_channel.setdefault(channel, []).append(event)
+        return by_channel
+
+    @abc.abstractmethod
+    async def _send(self, by_channel: Dict[str, List[Dict[str, Any]]]):
+        ...
+
+    async def flush(self):
+        while self.pending:
+            batch, self.pending = self.pending[:EVENT_BUS_MAX_BATCH], self.pending[EVENT_BUS_MAX_BATCH:]
+            try:
+                await self._send(self._group(batch))
+            except Exception as e:
+                # Keep the batch in order at the head of the queue and retry after a pause
+                self.pending[:0] = batch
+                overflow = max(0, len(self.pending) - EVENT_BUS_MAX_PENDING)
+                del self.pending[:overflow]
+                self.dropped += overflow
+                logger.error(f"Event bus publish failed, {len(self.pending)} event(s) pending: {e}")
+                await asyncio.sleep(EVENT_BUS_RECONNECT_S)
+                return
+            self.published += len(batch)
+
+    async def _run(self):
+        while True:
+            await self._wakeup.wait()
+            self._wakeup.clear()
+            await asyncio.sleep(EVENT_BUS_LINGER_S)
+            await self.flush()
+            if self.pending:
+                self._wakeup.set()
+
+    async def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        await self.flush()
+
+class InProcessEventBus(EventBus):
+    """Event bus for a single worker: batches go straight to this process's subscribers"""
+
+    async def _send(self, by_channel: Dict[str, List[Dict[str, Any]]]):
+        for channel, events in by_channel.items():
+            self._dispatch(channel, events)
+
+class RESPError(Exception):
+    pass
+
+def resp_command(*args) -> bytes:
+    out = [b"*%d\r\n" % len(args)]
+    for arg in args:
+        data = arg if isinstance(arg, bytes) else str(arg).encode()
+        out.append(b"$%d\r\n%s\r\n" % (len(data), data))
+    return b"".join(out)
+
+async def read_resp(reader: asyncio.StreamReader):
+    line = await reader.readline()
+    if not line.endswith(b"\r\n"):
+        raise ConnectionError("Connection closed by the event bus server")
+    kind, rest = line[:1], line[1:-2]
+    if kind == b"+":
+        return rest.decode()
+    if kind == b"-":
+        raise RESPError(rest.decode())
+    if kind == b":":
+        return int(rest)
+    if kind == b"$":
+        length = int(rest)
+        return None if length < 0 else (await reader.readexactly(length + 2))[:-2]
+    if kind in (b"*", b">"):
+        length = int(rest)
+        return None if length < 0 else [await read_resp(reader) for _ in range(length)]
+    raise ConnectionError(f"Unexpected reply from the event bus server: {line[:40]!r}")
+
+class RESPEventBus(EventBus):
+    """Event bus over a Redis-protocol server using PUBLISH/SUBSCRIBE.
+
+    One connection pipelines each batch as PUBLISH commands in a single write; a
+    second connection stays in subscribe mode and dispatches incoming messages to
+    local subscribers. Both reconnect on failure and resubscribe every channel.
+    """
+
+    def __init__(self, url: str, prefix: str = EVENT_BUS_PREFIX):
+        super().__init__(prefix)
+        parsed = urllib.parse.urlparse(url)
+        self.host = parsed.hostname or "localhost"
+        self.port = parsed.port or 6379
+        self.password = urllib.parse.unquote(parsed.password) if parsed.password else None
+        self._publisher: Optional[Tuple[asyncio.StreamReader, asyncio.StreamWriter]] = None
+        self._subscriber_writer: Optional[asyncio.StreamWriter] = None
+        self._listener: Optional[asyncio.Task] = None
+
+    async def _connect(self) -> Tuple[asyncio.StreamReader, asyncio.StreamWriter]:
+        reader, writer = await asyncio.open_connection(self.host, self.port)
+        if self.password:
+            writer.write(resp_command("AUTH", self.password))
+            await read_resp(reader)
+        return reader, writer
+
+    async def _send(self, by_channel):
+        if self._publisher is None:
+            self._publisher = await self._connect()
+        reader, writer = self._publisher
+        try:
+            writer.write(b"".join(resp_command("PUBLISH", self.prefix + channel, orjson.dumps(events))
+                                  for channel, events in by_channel.items()))
+            await writer.drain()
+            for _ in by_channel:
+                await read_resp(reader)
+        except (OSError, ConnectionError, asyncio.IncompleteReadError):
+            self._publisher = None
+            writer.close()
+            raise
+
+    def _add_subscriber(self, channel, queue):
+        first = channel not in self.subscribers
+        super()._add_subscriber(channel, queue)
+        if first and self._subscriber_writer is not None:
+            self._subscriber_writer.write(resp_command("SUBSCRIBE", self.prefix + channel))
+
+    def _remove_subscriber(self, channel, queue):
+        super()._remove_subscriber(channel, queue)
+        if channel not in self.subscribers and self._subscriber_writer is not None:
+            self._subscriber_writer.write(resp_command("UNSUBSCRIBE", self.prefix + channel))
+
+    async def _listen(self):
+        while True:
+            try:
+                reader, writer = await self._connect()
+                # UNSUBSCRIBE with no channels is not allowed, so always hold the lifecycle channel
+                channels = set(self.subscribers) | {ROUTE_LIFECYCLE_CHANNEL}
+                writer.write(resp_command("SUBSCRIBE", *(self.prefix + channel for channel in channels)))
+                self._subscriber_writer = writer
+                while True:
+                    message = await read_resp(reader)
+                    if isinstance(message, list) and len(message) == 3 and message[0] == b"message":
+                        channel = message[1].decode()[len(self.prefix):]
+                        self._dispatch(channel, orjson.loads(message[2]))
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Event bus subscriber connection lost, reconnecting: {e}")
+            finally:
+                if self._subscriber_writer is not None:
+                    self._subscriber_writer.close()
+                    self._subscriber_writer = None
+            await asyncio.sleep(EVENT_BUS_RECONNECT_S)
+
+    async def start(self):
+        await super().start()
+        if self._listener is None:
+            self._listener = asyncio.create_task(self._listen())
+
+    async def stop(self):
+        await super().stop()
+        if self._listener is not None:
+            self._listener.cancel()
+            self._listener = None
+        if self._publisher is not None:
+            self._publisher[1].close()
+            self._publisher = None
+
+def configured_event_bus(url: str = EVENT_BUS_URL) -> EventBus:
+    """In-process bus when no broker URL is configured, otherwise a RESP (Redis protocol) bus"""
+    if not url:
+        return InProcessEventBus()
+    if url.startswith(("redis://", "resp://")):
+        return RESPEventBus(url)
+    raise ValueError(f"Unsupported EVENT_BUS_URL scheme: {url.split(':', 1)[0]}")
+
+event_bus = configured_event_bus()
+
 # Create the main app without a prefix
 app = FastAPI()
 
@@ -34,6 +459,7 @@ class EmergencyContact(BaseModel):
     phone: str
     relation: str
     priority: int = 1
+    owner_id: str = "default"  # user the contact belongs to
 
 class IncidentReport(BaseModel):
     id: str = Field(default_factory=lambda: str(uuid.uuid4()))
@@ -51,6 +477,24 @@ class SOSAlert(BaseModel):
     timestamp: datetime = Field(default_factory=datetime.utcnow)
     status: str = "active"  # active, resolved
     audio_analysis: Optional[Dict[str, Any]] = None
+    user_id: Optional[str] = None
+    device_id: Optional[str] = None
+    trigger_count: int = 1
+    evidence: List[Dict[str, Any]] = []
+
+class BatchRiskRequest(BaseModel):
+    points: List[Dict[str, float]]  # [{lat: float, lng: float}, ...]
+    radius: int = Field(1000, gt=0, le=5000)
+    at: Optional[datetime] = None  # score as of this time; defaults to now
+
+class LocationFix(BaseModel):
+    route_id: str
+    lat: float
+    lng: float
+    timestamp: datetime = Field(default_factory=datetime.utcnow)
+
+class BulkLocationUpdate(BaseModel):
+    fixes: List[LocationFix]
 
 class VoiceAnalysis(BaseModel):
     emotion: str
@@ -66,6 +510,44 @@ class RouteData(BaseModel):
     current_location: Dict[str, float]
     deviation_threshold: int = 500  # meters
     is_active: bool = True
+    user_id: Optional[str] = None  # live channels also receive this user's SOS events
+    status: str = "active"  # active, stopped, completed or expired
+    started_at: datetime = Field(default_factory=datetime.utcnow)
+    last_seen_at: datetime = Field(default_factory=datetime.utcnow)
+    ended_at: Optional[datetime] = None
+
+# Lean response records for hot endpoints. They are returned inside ORJSONResponse,
+# which serializes slotted dataclasses natively and skips jsonable_encoder.
+@dataclass(slots=True)
+class SOSAlertReceipt:
+    alert_id: str
+    status: str
+    message: str
+    timestamp: datetime
+
+@dataclass(slots=True)
+class RouteTrackingReceipt:
+    route_id: str
+    status: str
+    message: str
+
+@dataclass(slots=True)
+class RiskPoint:
+    lat: float
+    lng: float
+    risk_score: float
+    risk_level: str
+    incident_count: int
+
+@dataclass(slots=True)
+class RiskAnalysis:
+    location: Dict[str, float]
+    at: datetime
+    risk_score: float
+    risk_level: str
+    incident_count: int
+    recent_incidents: List[Dict[str, Any]]
+    recommendations: List[str]
 
 # Mock data for demo
 DEMO_INCIDENTS = [
@@ -76,61 +558,908 @@ DEMO_INCIDENTS = [
 ]
 
 # Routes for Feature 1: Voice-Only SOS
+VOICE_SAMPLE_RATE = 16000  # default for raw PCM streams
+VOICE_MAX_SAMPLE_RATE = 192000
+VOICE_WINDOW_S = 0.5
+VOICE_HOP_S = 0.25  # live verdict cadence
+VOICE_READ_CHUNK = 64 * 1024
+VOICE_ANALYSIS_WORKERS = int(os.environ.get("VOICE_ANALYSIS_WORKERS", "2"))
+VOICE_SILENCE_RMS = 0.01
+
+def parse_wav_header(header: bytes) -> Tuple[int, int, int]:
+    """(sample_rate, channels, data_offset) of a 16-bit PCM WAV header"""
+    if header[:4] != b"RIFF" or header[8:12] != b"WAVE":
+        raise ValueError("Not a WAV file")
+    offset = 12
+    sample_rate = channels = None
+    while offset + 8 <= len(header):
+        chunk_id, size = header[offset:offset + 4], struct.unpack("<I", header[offset + 4:offset + 8])[0]
+        if chunk_id == b"fmt ":
+            audio_format, channels, sample_rate = struct.unpack("<HHI", header[offset + 8:offset + 16])
+            bits = struct.unpack("<H", header[offset + 22:offset + 24])[0]
+            if audio_format != 1 or bits != 16:
+                raise ValueError("Only 16-bit PCM WAV is supported")
+            if not 0 < sample_rate <= VOICE_MAX_SAMPLE_RATE or not channels:
+                raise ValueError("WAV header has an invalid sample rate or channel count")
+        elif chunk_id == b"data":
+            if sample_rate is None:
+                break
+            return sample_rate, channels, offset + 8
+        offset += 8 + size + (size & 1)
+    raise ValueError("WAV header incomplete or missing fmt/data chunk")
+
+def analyze_voice_windows(pcm: bytes, sample_rate: int, channels: int = 1) -> List[Dict[str, Any]]:
+    """Acoustic features and a distress verdict for each full window of s16le PCM.
+
+    Runs in the voice process pool. All windows are analysed together: energy and
+    zero-crossing rate in the time domain, spectral centroid/flatness from one rFFT
+    per window, and pitch from the FFT autocorrelation peak in the 75-1000 Hz band.
+    """
+    window = int(sample_rate * VOICE_WINDOW_S)
+    samples = np.frombuffer(pcm, dtype="<i2")
+    if channels > 1:
+        samples = samples[:len(samples) - len(samples) % channels].reshape(-1, channels).mean(axis=1)
+    count = len(samples) // window
+    if count == 0:
+        return []
+    frames = samples[:count * window].reshape(count, window).astype(np.float32) / 32768.0
+    frames -= frames.mean(axis=1, keepdims=True)
+    
+    rms = np.sqrt((frames ** 2).mean(axis=1))
+    zcr = (np.abs(np.diff(np.signbit(frames).astype(np.int8), axis=1)).sum(axis=1)) / window
+    spectrum = np.abs(np.fft.rfft(frames * np.hanning(window), n=2 * window, axis=1))
+    freqs = np.fft.rfftfreq(2 * window, d=1.0 / sample_rate)
+    power = spectrum ** 2 + 1e-12
+    centroid = (power * freqs).sum(axis=1) / power.sum(axis=1)
+    flatness = np.exp(np.log(power).mean(axis=1)) / power.mean(axis=1)
+    autocorr = np.fft.irfft(power, axis=1)[:, :window]
+    lag_lo, lag_hi = int(sample_rate / 1000), int(sample_rate / 75)
+    band = autocorr[:, lag_lo:lag_hi]
+    # First lag close to the band maximum, which avoids picking a pitch octave too low
+    lags = lag_lo + np.argmax(band >= 0.9 * band.max(axis=1, keepdims=True), axis=1)
+    voicing = autocorr[np.arange(count), lags] / np.maximum(autocorr[:, 0], 1e-12)
+    pitch = np.where(voicing > 0.3, sample_rate / lags, 0.0)
+    
+    # Heuristic arousal score: loud, high-pitched, bright, voiced speech reads as distress
+    loudness = np.clip((20 * np.log10(np.maximum(rms, 1e-6)) + 40) / 30, 0, 1)
+    pitch_score = np.clip((pitch - 180) / 220, 0, 1)
+    brightness = np.clip((centroid - 1000) / 2000, 0, 1)
+    stress = np.where(rms < VOICE_SILENCE_RMS, 0.0, 0.45 * loudness + 0.35 * pitch_score + 0.2 * brightness * (1 - flatness))
+    
+    verdicts = []
+    for i in range(count):
+        stress_level = float(stress[i])
+        if rms[i] < VOICE_SILENCE_RMS:
+            emotion = "calm"
+        elif stress_level >= 0.75:
+            emotion = "fear"
+        elif stress_level >= 0.6:
+            emotion = "stress"
+        elif stress_level >= 0.45:
+            emotion = "anxiety"
+        else:
+            emotion = "neutral"
+        verdicts.append({
+            "emotion": emotion,
+            "confidence": float(np.clip(0.5 + abs(stress_level - 0.5), 0.5, 0.99) * min(1.0, 0.5 + voicing[i])),
+            "fear_detected": emotion in ("fear", "stress", "anxiety"),
+            "stress_level": stress_level,
+            "features": {"rms": float(rms[i]), "zcr": float(zcr[i]), "pitch_hz": float(pitch[i]),
+                         "spectral_centroid_hz": float(centroid[i]), "spectral_flatness": float(flatness[i])},
+        })
+    return verdicts
+
+voice_pool: Optional[ProcessPoolExecutor] = None
+
+async def run_voice_analysis(pcm: bytes, sample_rate: int, channels: int = 1) -> List[Dict[str, Any]]:
+    """Run feature extraction in the process pool so the event loop keeps serving SOS traffic"""
+    global voice_pool
+    if voice_pool is None:
+        # Spawned, not forked: the parent already runs Motor monitor threads and thread pools
+        # whose locks a forked child could inherit while held
+        voice_pool = ProcessPoolExecutor(max_workers=VOICE_ANALYSIS_WORKERS, mp_context=multiprocessing.get_context("spawn"))
+    return await asyncio.get_running_loop().run_in_executor(voice_pool, analyze_voice_windows, pcm, sample_rate, channels)
+
+def voice_result(verdict: Dict[str, Any]) -> Dict[str, Any]:
+    analysis = VoiceAnalysis(**{k: verdict[k] for k in ("emotion", "confidence", "fear_detected", "stress_level")})
+    return {
+        "analysis": analysis.dict(),
+        "trigger_sos": analysis.fear_detected and analysis.confidence > 0.75,
+        "message": f"Voice analysis complete. Emotion: {analysis.emotion} (confidence: {analysis.confidence:.2f})"
+    }
+
 @api_router.post("/voice-analysis")
-async def analyze_voice_emotion(audio: UploadFile = File(...)):
-    """Analyze voice for emotion detection (Demo mode)"""
+async def analyze_voice_emotion(audio: UploadFile = File(...), sample_rate: int = Query(VOICE_SAMPLE_RATE, gt=0, le=VOICE_MAX_SAMPLE_RATE)):
+    """Analyze a recorded clip (16-bit PCM WAV, or raw s16le mono at sample_rate)"""
     try:
-        # Simulate voice analysis processing
-        await asyncio.sleep(2)  # Simulate processing time
-        
-        # Demo: Random emotion detection based on filename or random
-        emotions = ["calm", "fear", "stress", "neutral", "anxiety"]
-        detected_emotion = random.choice(emotions)
-        
-        fear_detected = detected_emotion in ["fear", "stress", "anxiety"]
-        confidence = random.uniform(0.7, 0.95)
-        stress_level = random.uniform(0.3, 0.9) if fear_detected else random.uniform(0.1, 0.4)
+        first = await audio.read(VOICE_READ_CHUNK)
+        channels = 1
+        if first[:4] == b"RIFF":
+            sample_rate, channels, data_offset = parse_wav_header(first)
+            first = first[data_offset:]
+        window_bytes = int(sample_rate * VOICE_WINDOW_S) * 2 * channels
         
-        analysis = VoiceAnalysis(
-            emotion=detected_emotion,
-            confidence=confidence,
-            fear_detected=fear_detected,
-            stress_level=stress_level
-        )
+        # Read in chunks and hand whole windows to the pool as they arrive
+        pending = bytearray(first)
+        jobs = []
+        while True:
+            usable = len(pending) - len(pending) % window_bytes
+            if usable:
+                jobs.append(asyncio.ensure_future(run_voice_analysis(bytes(pending[:usable]), sample_rate, channels)))
+                del pending[:usable]
+            chunk = await audio.read(VOICE_READ_CHUNK)
+            if not chunk:
+                break
+            pending += chunk
+        if not jobs:
+            raise ValueError("Audio shorter than one analysis window")
+        verdicts = [verdict for job in await asyncio.gather(*jobs) for verdict in job]
         
-        return {
-            "analysis": analysis.dict(),
-            "trigger_sos": fear_detected and confidence > 0.75,
-            "message": f"Voice analysis complete. Emotion: {detected_emotion} (confidence: {confidence:.2f})"
-        }
+        # The most distressed window decides the clip verdict
+        return voice_result(max(verdicts, key=lambda v: v["stress_level"]))
+    except ValueError as e:
+        raise HTTPException(status_code=415, detail=f"Voice analysis failed: {str(e)}")
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Voice analysis failed: {str(e)}")
 
+@api_router.websocket("/voice-analysis/live")
+async def live_voice_analysis(websocket: WebSocket, sample_rate: int = Query(VOICE_SAMPLE_RATE, gt=0, le=VOICE_MAX_SAMPLE_RATE)):
+    """Stream s16le mono PCM as binary frames; a verdict is pushed for every VOICE_HOP_S of audio"""
+    await websocket.accept()
+    window_bytes = int(sample_rate * VOICE_WINDOW_S) * 2
+    hop_bytes = int(sample_rate * VOICE_HOP_S) * 2
+    buffer = bytearray()
+    try:
+        while True:
+            frame = await websocket.receive()
+            if frame["type"] == "websocket.disconnect":
+                raise WebSocketDisconnect(frame.get("code", 1000))
+            if frame.get("bytes") is None:
+                await websocket.send_json({"event": "error", "detail": "Send audio as binary s16le PCM frames"})
+                continue
+            buffer += frame["bytes"]
+            while len(buffer) >= window_bytes:
+                verdicts = await run_voice_analysis(bytes(buffer[:window_bytes]), sample_rate)
+                del buffer[:hop_bytes]
+                await websocket.send_json(voice_result(verdicts[0]))
+    except WebSocketDisconnect:
+        pass
+
 # Routes for Feature 2: Historical Incident Reports & Risk Analysis
-@api_router.get("/risk-analysis")
-async def get_location_risk(lat: float, lng: float, radius: int = 1000):
-    """Analyze location risk based on historical incidents"""
+EARTH_RADIUS_M = 6371008.8
+METERS_PER_DEGREE_LAT = math.pi * EARTH_RADIUS_M / 180.0
+INCIDENT_CELL_DEG = float(os.environ.get("INCIDENT_CELL_DEG", "0.01"))  # ~1.1 km grid cells
+BATCH_RISK_MAX_POINTS = 20000
+BATCH_RISK_CHUNK = 64
+BATCH_RISK_MATRIX_SIZE = 2_000_000
+RISK_AGG_CELL_DEG = 0.0025  # ~280 m aggregate cells
+RISK_AGG_EXACT_RADIUS_M = 2 * RISK_AGG_CELL_DEG * METERS_PER_DEGREE_LAT  # smaller radii score incidents individually
+RISK_CACHE_CELL_DEG = 0.001  # ~110 m quantization of /api/risk-analysis lookups
+RISK_CACHE_SIZE = int(os.environ.get("RISK_CACHE_SIZE", "50000"))
+RISK_CACHE_TTL_S = float(os.environ.get("RISK_CACHE_TTL_S", "300"))
+RISK_CACHE_MAX_AGE = 60  # Cache-Control max-age for clients
+RISK_CACHE_BULK_CLEAR = 1000  # incident batches larger than this clear the whole cache
+RISK_AGG_KEY_OFFSET = 1 << 21
+RISK_AGG_CHUNK_CELLS = 1 << 19  # (point, cell) pairs looked up per chunk in weighted_counts
+RISK_DECAY_HALF_LIFE_DAYS = float(os.environ.get("RISK_DECAY_HALF_LIFE_DAYS", "365"))
+RISK_DECAY_EPOCH = datetime(2024, 1, 1)
+RISK_HOUR_BANDWIDTH_H = 2.0
+RISK_HOUR_BASELINE = 0.25  # share of an incident's weight that applies at any hour
+RISK_SEVERITY_WEIGHTS = np.array([0.5, 0.75, 1.0, 1.5, 2.0])  # severity 1-5; a severity 3 incident counts once
+
+def haversine_m(lat1, lng1, lat2, lng2):
+    """Great-circle distance in meters. Accepts floats or NumPy arrays."""
+    lat1, lng1, lat2, lng2 = np.radians(lat1), np.radians(lng1), np.radians(lat2), np.radians(lng2)
+    a = np.sin((lat2 - lat1) / 2.0) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lng2 - lng1) / 2.0) ** 2
+    return 2.0 * EARTH_RADIUS_M * np.arcsin(np.sqrt(np.minimum(a, 1.0)))
+
+def morton_order(lats: np.ndarray, lngs: np.ndarray, cell_deg: float) -> np.ndarray:
+    """Argsort of points along a Z-order curve over cell_deg cells"""
+    ix = np.floor((lats - lats.min()) / cell_deg).astype(np.uint64) & 0xFFFF
+    iy = np.floor((lngs - lngs.min()) / cell_deg).astype(np.uint64) & 0xFFFF
+    key = np.zeros(len(lats), dtype=np.uint64)
+    for bit in range(16):
+        key |= ((ix >> np.uint64(bit)) & np.uint64(1)) << np.uint64(2 * bit)
+        key |= ((iy >> np.uint64(bit)) & np.uint64(1)) << np.uint64(2 * bit + 1)
+    return np.argsort(key, kind="stable")
+
+def incident_to_index_entry(doc: Dict[str, Any]) -> Dict[str, Any]:
+    """Normalize an incidents document (or demo record) to the shape returned by the API"""
+    if "location" in doc:
+        timestamp = doc.get("timestamp")
+        return {
+            "lat": float(doc["location"]["lat"]),
+            "lng": float(doc["location"]["lng"]),
+            "type": doc.get("incident_type", "unknown"),
+            "severity": int(doc.get("severity", 1)),
+            "timestamp": timestamp.isoformat() if isinstance(timestamp, datetime) else timestamp,
+        }
+    return {k: doc[k] for k in ("lat", "lng", "type", "severity", "timestamp")}
+
+class IncidentIndex:
+    """In-memory uniform grid over incidents.
+
+    Incidents are bucketed into INCIDENT_CELL_DEG cells and their coordinates are
+    kept in columnar NumPy arrays, so a radius lookup only touches the cells that
+    overlap the query circle and then filters candidates by haversine distance.
+    """
+
+    def __init__(self, cell_deg: float = INCIDENT_CELL_DEG):
+        self.cell_deg = cell_deg
+        self.cells: Dict[Tuple[int, int], List[int]] = {}
+        self.incidents: List[Dict[str, Any]] = []
+        self.lat = np.empty(1024)
+        self.lng = np.empty(1024)
+        self.ready = False
+        self.version = 0
+        self._sorted_version = -1
+        self._sorted_lat = self._sorted_lng = np.empty(0)
+        self._sorted_rows = np.empty(0, dtype=np.int64)
+
+    def __len__(self) -> int:
+        return len(self.incidents)
+
+    def cell_of(self, lat: float, lng: float) -> Tuple[int, int]:
+        return (math.floor(lat / self.cell_deg), math.floor(lng / self.cell_deg))
+
+    def add(self, incident: Dict[str, Any]) -> int:
+        row = len(self.incidents)
+        if row == len(self.lat):
+            self.lat = np.resize(self.lat, row * 2)
+            self.lng = np.resize(self.lng, row * 2)
+        self.lat[row] = incident["lat"]
+        self.lng[row] = incident["lng"]
+        self.incidents.append(incident)
+        self.cells.setdefault(self.cell_of(incident["lat"], incident["lng"]), []).append(row)
+        self.version += 1
+        return row
+
+    def add_many(self, incidents: List[Dict[str, Any]]):
+        """Append a batch of incidents, growing the coordinate arrays at most once"""
+        start, end = len(self.incidents), len(self.incidents) + len(incidents)
+        if end > len(self.lat):
+            capacity = max(end, len(self.lat) * 2)
+            self.lat = np.resize(self.lat, capacity)
+            self.lng = np.resize(self.lng, capacity)
+        self.lat[start:end] = [incident["lat"] for incident in incidents]
+        self.lng[start:end] = [incident["lng"] for incident in incidents]
+        self.incidents.extend(incidents)
+        cell_x = np.floor(self.lat[start:end] / self.cell_deg).astype(np.int64).tolist()
+        cell_y = np.floor(self.lng[start:end] / self.cell_deg).astype(np.int64).tolist()
+        for row, key in enumerate(zip(cell_x, cell_y), start):
+            self.cells.setdefault(key, []).append(row)
+        self.version += len(incidents)
+
+    def sorted_by_lat(self) -> Tuple[np.ndarray, np.ndarray]:
+        """Incident coordinates ordered by latitude, rebuilt lazily after inserts"""
+        if self._sorted_version != self.version:
+            n = len(self.incidents)
+            order = np.argsort(self.lat[:n], kind="stable")
+            self._sorted_lat, self._sorted_lng, self._sorted_rows = self.lat[:n][order], self.lng[:n][order], order
+            self._sorted_version = self.version
+        return self._sorted_lat, self._sorted_lng
+
+    def count_within(self, lats: np.ndarray, lngs: np.ndarray, radius_m: float,
+                     pair_weights: Optional[Callable[[np.ndarray, np.ndarray], np.ndarray]] = None) -> np.ndarray:
+        """Vectorized incident counts within radius_m of every (lat, lng) point.
+
+        With pair_weights(points, rows), each incident row within range of a point
+        counts with the returned weight instead of once.
+        """
+        counts = np.zeros(len(lats), dtype=np.int64 if pair_weights is None else np.float64)
+        inc_lat, inc_lng = self.sorted_by_lat()
+        if inc_lat.size == 0 or len(lats) == 0:
+            return counts
+        dlat = radius_m / METERS_PER_DEGREE_LAT
+        # Score points in Z-order so each chunk covers a compact patch and meets few incidents
+        order = morton_order(lats, lngs, max(dlat, self.cell_deg))
+        for start in range(0, len(order), BATCH_RISK_CHUNK):
+            chunk = order[start:start + BATCH_RISK_CHUNK]
+            p_lat, p_lng = lats[chunk], lngs[chunk]
+            lo = np.searchsorted(inc_lat, p_lat.min() - dlat, side="left")
+            hi = np.searchsorted(inc_lat, p_lat.max() + dlat, side="right")
+            if lo >= hi:
+                continue
+            c_lat, c_lng, c_rows = inc_lat[lo:hi], inc_lng[lo:hi], self._sorted_rows[lo:hi]
+            dlng = dlat / max(math.cos(math.radians(min(float(np.abs(p_lat).max()) + dlat, 89.9))), 1e-6)
+            band = (c_lng >= p_lng.min() - dlng) & (c_lng <= p_lng.max() + dlng)
+            c_lat, c_lng, c_rows = c_lat[band], c_lng[band], c_rows[band]
+            # Cheap per-pair bounding-box test first; haversine only runs on the survivors.
+            # The box is conservative, so it never drops a pair that is within radius_m.
+            step = max(1, BATCH_RISK_MATRIX_SIZE // len(chunk))
+            chunk_counts = np.zeros(len(chunk), dtype=counts.dtype)
+            for c in range(0, c_lat.size, step):
+                b_lat, b_lng = c_lat[c:c + step], c_lng[c:c + step]
+                in_box = (np.abs(p_lat[:, None] - b_lat[None, :]) <= dlat) & (np.abs(p_lng[:, None] - b_lng[None, :]) <= dlng)
+                pi, ci = np.nonzero(in_box)
+                distances = haversine_m(p_lat[pi], p_lng[pi], b_lat[ci], b_lng[ci])
+                inside = distances <= radius_m
+                pi, ci = pi[inside], ci[inside]
+                weights = None if pair_weights is None else pair_weights(chunk[pi], c_rows[c:c + step][ci])
+                chunk_counts += np.bincount(pi, weights=weights, minlength=len(chunk)).astype(counts.dtype)
+            counts[chunk] = chunk_counts
+        return counts
+
+    def cell_range(self, lat: float, lng: float, radius_m: float) -> Tuple[int, int, int, int]:
+        """Inclusive cell bounds (ix0, ix1, iy0, iy1) of the box enclosing the query circle"""
+        dlat = radius_m / METERS_PER_DEGREE_LAT
+        dlng = dlat / max(math.cos(math.radians(min(abs(lat) + dlat, 89.9))), 1e-6)
+        return (
+            math.floor((lat - dlat) / self.cell_deg), math.floor((lat + dlat) / self.cell_deg),
+            math.floor((lng - dlng) / self.cell_deg), math.floor((lng + dlng) / self.cell_deg),
+        )
+
+    def candidate_rows(self, lat: float, lng: float, radius_m: float) -> np.ndarray:
+        ix0, ix1, iy0, iy1 = self.cell_range(lat, lng, radius_m)
+        if (ix1 - ix0 + 1) * (iy1 - iy0 + 1) > len(self.cells):
+            # Query box covers more cells than exist; walking the occupied ones is cheaper
+            rows = [r for (ix, iy), bucket in self.cells.items()
+                    if ix0 <= ix <= ix1 and iy0 <= iy <= iy1 for r in bucket]
+        else:
+            rows = []
+            for ix in range(ix0, ix1 + 1):
+                for iy in range(iy0, iy1 + 1):
+                    bucket = self.cells.get((ix, iy))
+                    if bucket:
+                        rows.extend(bucket)
+        return np.asarray(rows, dtype=np.int64)
+
+    def query(self, lat: float, lng: float, radius_m: float) -> List[Tuple[Dict[str, Any], float]]:
+        """Return (incident, distance_m) pairs within radius_m, nearest first"""
+        rows = self.candidate_rows(lat, lng, radius_m)
+        if rows.size == 0:
+            return []
+        distances = haversine_m(lat, lng, self.lat[rows], self.lng[rows])
+        inside = distances <= radius_m
+        rows, distances = rows[inside], distances[inside]
+        order = np.argsort(distances, kind="stable")
+        return [(self.incidents[rows[i]], float(distances[i])) for i in order]
+
+incident_index = IncidentIndex()
+
+def decay_exponent(timestamps: np.ndarray) -> np.ndarray:
+    """Half-lives elapsed between RISK_DECAY_EPOCH and each datetime64 timestamp"""
+    elapsed_s = (timestamps - np.datetime64(RISK_DECAY_EPOCH)) / np.timedelta64(1, "s")
+    return elapsed_s / (RISK_DECAY_HALF_LIFE_DAYS * 86400.0)
+
+def local_hours(utc_hours: np.ndarray, lngs: np.ndarray) -> np.ndarray:
+    """Approximate local (solar) hour of day from UTC hour and longitude"""
+    return (utc_hours + lngs / 15.0) % 24.0
+
+def hour_weights(hours: np.ndarray) -> np.ndarray:
+    """(n, 24) weight of each hour-of-day bucket for query hours, wrapping around midnight"""
+    distance = np.abs(np.arange(24) + 0.5 - hours[:, None])
+    distance = np.minimum(distance, 24.0 - distance)
+    return RISK_HOUR_BASELINE + (1.0 - RISK_HOUR_BASELINE) * np.exp(-distance ** 2 / (2.0 * RISK_HOUR_BANDWIDTH_H ** 2))
+
+def as_utc(at: Optional[datetime]) -> datetime:
+    if at is None:
+        return datetime.utcnow()
+    return at.astimezone(timezone.utc).replace(tzinfo=None) if at.tzinfo else at
+
+class RiskAggregates:
+    """Time-decayed incident weights per spatial cell, local hour of day and severity.
+
+    Each incident adds 2 ** (half-lives since RISK_DECAY_EPOCH) to its
+    (cell, hour, severity) bucket, so decay needs no rewrites: a query scales the
+    sums by 2 ** -(half-lives up to the query time). A lookup reads the fixed set of
+    cells whose centers fall inside the radius and weights their hour buckets by
+    closeness to the query's local hour.
+
+    Below RISK_AGG_EXACT_RADIUS_M a circle holds too few cells for their centers to
+    stand in for the incidents, so those lookups weight each incident found by
+    incident_index individually. Per-incident weights are kept row-aligned with
+    incident_index, since both are only filled through register_incident(s).
+    """
+
+    def __init__(self, cell_deg: float = RISK_AGG_CELL_DEG):
+        self.cell_deg = cell_deg
+        self.rows: Dict[int, int] = {}
+        self.values = np.zeros((1024, 24, len(RISK_SEVERITY_WEIGHTS)))
+        self.cell_lng = np.zeros(1024)  # center longitude of each row's cell, for local hours
+        self._sorted_keys = np.empty(0, dtype=np.int64)
+        self._sorted_rows = np.empty(0, dtype=np.int64)
+        self._lookup_stale = False
+        self.count = 0
+        self.incident_weight = np.zeros(1024)  # severity weight * 2 ** half-lives, per incident_index row
+        self.incident_hour = np.zeros(1024, dtype=np.int64)  # local hour-of-day bucket, per incident_index row
+
+    def _keys(self, ix, iy):
+        return (ix + RISK_AGG_KEY_OFFSET) * (RISK_AGG_KEY_OFFSET * 2) + (iy + RISK_AGG_KEY_OFFSET)
+
+    def _row(self, key: int) -> int:
+        row = self.rows.get(key)
+        if row is None:
+            row = self.rows[key] = len(self.rows)
+            if row == len(self.values):
+                self.values = np.concatenate([self.values, np.zeros_like(self.values)])
+                self.cell_lng = np.concatenate([self.cell_lng, np.zeros_like(self.cell_lng)])
+            self.cell_lng[row] = (key % (RISK_AGG_KEY_OFFSET * 2) - RISK_AGG_KEY_OFFSET + 0.5) * self.cell_deg
+            self._lookup_stale = True
+        return row
+
+    def add_many(self, incidents: List[Dict[str, Any]]):
+        if not incidents:
+            return
+        lats = np.array([incident["lat"] for incident in incidents], dtype=np.float64)
+        lngs = np.array([incident["lng"] for incident in incidents], dtype=np.float64)
+        severities = np.clip(np.array([incident["severity"] for incident in incidents]), 1, 5) - 1
+        timestamps = pd.to_datetime([incident["timestamp"] for incident in incidents], errors="coerce", utc=True, format="mixed")
+        timestamps = timestamps.tz_convert(None).fillna(pd.Timestamp(datetime.utcnow())).values
+        hours = local_hours((timestamps - timestamps.astype("datetime64[D]")) / np.timedelta64(1, "h"), lngs).astype(np.int64)
+        keys = self._keys(np.floor(lats / self.cell_deg).astype(np.int64), np.floor(lngs / self.cell_deg).astype(np.int64))
+        rows = np.array([self._row(key) for key in keys.tolist()])
+        growth = np.exp2(decay_exponent(timestamps))
+        np.add.at(self.values, (rows, hours, severities), growth)
+        start, end = self.count, self.count + len(incidents)
+        if end > len(self.incident_weight):
+            capacity = max(end, len(self.incident_weight) * 2)
+            self.incident_weight = np.resize(self.incident_weight, capacity)
+            self.incident_hour = np.resize(self.incident_hour, capacity)
+        self.incident_weight[start:end] = RISK_SEVERITY_WEIGHTS[severities] * growth
+        self.incident_hour[start:end] = hours
+        self.count = end
+
+    def _lookup(self, keys: np.ndarray) -> np.ndarray:
+        """Rows for cell keys, -1 where a cell has no incidents"""
+        if self._lookup_stale:
+            keys_list = np.fromiter(self.rows.keys(), dtype=np.int64, count=len(self.rows))
+            order = np.argsort(keys_list)
+            self._sorted_keys = keys_list[order]
+            self._sorted_rows = np.fromiter(self.rows.values(), dtype=np.int64, count=len(self.rows))[order]
+            self._lookup_stale = False
+        if not len(self._sorted_keys):
+            return np.full(keys.shape, -1)
+        idx = np.minimum(np.searchsorted(self._sorted_keys, keys), len(self._sorted_keys) - 1)
+        return np.where(self._sorted_keys[idx] == keys, self._sorted_rows[idx], -1)
+
+    def weighted_counts(self, lats: np.ndarray, lngs: np.ndarray, radius_m: float, at: datetime) -> np.ndarray:
+        """Decayed, hour- and severity-weighted incident counts around each point at time at"""
+        lats, lngs = np.asarray(lats, dtype=np.float64), np.asarray(lngs, dtype=np.float64)
+        result = np.zeros(len(lats))
+        if not len(lats) or not self.rows:
+            return result
+        if radius_m < RISK_AGG_EXACT_RADIUS_M:
+            return self.exact_weighted_counts(lats, lngs, radius_m, at)
+        dlat = radius_m / METERS_PER_DEGREE_LAT
+        dlng = dlat / max(math.cos(math.radians(min(np.abs(lats).max() + dlat, 89.9))), 1e-6)
+        span_x, span_y = math.ceil(dlat / self.cell_deg), math.ceil(dlng / self.cell_deg)
+        offset_x, offset_y = np.meshgrid(np.arange(-span_x, span_x + 1), np.arange(-span_y, span_y + 1), indexing="ij")
+        offset_x, offset_y = offset_x.ravel(), offset_y.ravel()
+        decay = np.exp2(-decay_exponent(np.datetime64(at)))
+        utc_hour = at.hour + at.minute / 60.0
+        chunk = max(RISK_AGG_CHUNK_CELLS // len(offset_x), 1)
+        for start in range(0, len(lats), chunk):
+            lat, lng = lats[start:start + chunk], lngs[start:start + chunk]
+            cell_x = np.floor(lat / self.cell_deg).astype(np.int64)[:, None] + offset_x
+            cell_y = np.floor(lng / self.cell_deg).astype(np.int64)[:, None] + offset_y
+            rows = self._lookup(self._keys(cell_x, cell_y))
+            point, slot = np.nonzero(rows >= 0)
+            # Equirectangular distance to the cell center; exact enough at risk radii
+            north_m = ((cell_x[point, slot] + 0.5) * self.cell_deg - lat[point]) * METERS_PER_DEGREE_LAT
+            east_m = ((cell_y[point, slot] + 0.5) * self.cell_deg - lng[point]) * METERS_PER_DEGREE_LAT * np.cos(np.radians(lat[point]))
+            inside = north_m * north_m + east_m * east_m <= radius_m * radius_m
+            point, rows = point[inside], rows[point[inside], slot[inside]]
+            if not len(point):
+                continue
+            # Within a radius the local hour barely moves, so each cell is weighted at its own center
+            unique_rows, inverse = np.unique(rows, return_inverse=True)
+            by_hour = self.values[unique_rows] @ RISK_SEVERITY_WEIGHTS
+            cell_scores = (by_hour * hour_weights(local_hours(utc_hour, self.cell_lng[unique_rows]))).sum(axis=1)
+            result[start:start + len(lat)] = np.bincount(point, weights=cell_scores[inverse], minlength=len(lat))
+        return result * decay
+
+    def exact_weighted_counts(self, lats: np.ndarray, lngs: np.ndarray, radius_m: float, at: datetime) -> np.ndarray:
+        """weighted_counts over the individual incidents within radius_m rather than whole cells"""
+        utc_hour = at.hour + at.minute / 60.0
+
+        def pair_weights(points: np.ndarray, rows: np.ndarray) -> np.ndarray:
+            by_hour = hour_weights(local_hours(utc_hour, incident_index.lng[rows]))
+            return self.incident_weight[rows] * np.take_along_axis(by_hour, self.incident_hour[rows][:, None], axis=1)[:, 0]
+
+        weighted = incident_index.count_within(lats, lngs, radius_m, pair_weights)
+        return weighted * np.exp2(-decay_exponent(np.datetime64(at)))
+
+risk_aggregates = RiskAggregates()
+
+def register_incident(incident: Dict[str, Any]) -> Dict[str, Any]:
+    """Add an incident to the in-memory risk structures"""
+    entry = incident_to_index_entry(incident)
+    incident_index.add(entry)
+    risk_aggregates.add_many([entry])
+    risk_tiles.apply_incidents([entry])
+    risk_cache.apply_incidents([entry])
+    if road_graph is not None:
+        road_graph.apply_incident(entry)
+    return entry
+
+def register_incidents(incidents: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Batch form of register_incident used by bulk imports"""
+    entries = [incident_to_index_entry(incident) for incident in incidents]
+    incident_index.add_many(entries)
+    risk_aggregates.add_many(entries)
+    risk_tiles.apply_incidents(entries)
+    risk_cache.apply_incidents(entries)
+    return entries
+
+async def load_incident_index():
+    """Build the in-memory index from demo data and the incidents collection"""
+    register_incidents(DEMO_INCIDENTS)
+    try:
+        cursor = db.incidents.find({}, {"_id": 0, "location": 1, "incident_type": 1, "severity": 1, "timestamp": 1})
+        batch = []
+        async for doc in cursor.batch_size(5000):
+            batch.append(doc)
+            if len(batch) == 5000:
+                register_incidents(batch)
+                batch = []
+        register_incidents(batch)
+    except Exception as e:
+        logger.warning(f"Incident index loaded without database incidents: {e}")
+    incident_index.ready = True
+    logger.info(f"Incident index ready with {len(incident_index)} incidents")
+
+async def find_incidents_near_db(lat: float, lng: float, radius: int) -> List[Tuple[Dict[str, Any], float]]:
+    """2dsphere radius query used while the in-memory index is still warming up"""
+    query = {"geo": {"$geoWithin": {"$centerSphere": [[lng, lat], radius / EARTH_RADIUS_M]}}}
+    docs = await db.incidents.find(query, {"_id": 0, "geo": 0}).to_list(10000)
+    nearby = [incident_to_index_entry(doc) for doc in docs]
+    nearby += [incident for incident in DEMO_INCIDENTS
+               if haversine_m(lat, lng, incident["lat"], incident["lng"]) <= radius]
+    return sorted(((i, float(haversine_m(lat, lng, i["lat"], i["lng"]))) for i in nearby), key=lambda p: p[1])
+
+@api_router.post("/incidents")
+async def report_incident(incident: IncidentReport):
+    """Report a new incident"""
+    incident_dict = incident.dict()
+    incident_dict["geo"] = {"type": "Point", "coordinates": [incident.location["lng"], incident.location["lat"]]}
+    await db.incidents.insert_one(incident_dict)
+    register_incident(incident_dict)
+    return {"incident_id": incident.id, "message": "Incident reported. Thank you for helping keep others safe."}
+
+INCIDENT_IMPORT_CHUNK_ROWS = 5000
+INCIDENT_IMPORT_MAX_ERRORS = 20
+INCIDENT_IMPORT_MAX_LINE_BYTES = 64 * 1024
+INCIDENT_IMPORT_COLUMNS = ["lat", "lng", "incident_type", "description", "severity", "timestamp"]
+INCIDENT_IMPORT_ALIASES = {"latitude": "lat", "lon": "lng", "longitude": "lng", "type": "incident_type"}
+
+async def iter_upload_lines(request: Request, chunk_rows: int = INCIDENT_IMPORT_CHUNK_ROWS,
+                            max_line_bytes: int = INCIDENT_IMPORT_MAX_LINE_BYTES):
+    """Yield (first_line_number, lines) chunks of a streamed, optionally gzipped, request body.
+
+    Raises 413 for a line longer than max_line_bytes; gzip input is inflated at most
+    max_line_bytes at a time so a small, highly compressed body cannot balloon in memory.
+    """
+    decoder = zlib.decompressobj(16 + zlib.MAX_WBITS) if request.headers.get("content-encoding") == "gzip" else None
+    pending, lines, line_no = b"", [], 1
+
+    def split(data: bytes):
+        nonlocal pending
+        *complete, pending = (pending + data).split(b"\n")
+        if len(pending) > max_line_bytes or any(len(line) > max_line_bytes for line in complete):
+            raise HTTPException(status_code=413, detail=f"Line near {line_no + len(lines)} is longer than {max_line_bytes} bytes")
+        lines.extend(line for line in complete if line.strip())
+
+    async for data in request.stream():
+        while data:
+            if decoder:
+                piece, data = decoder.decompress(data, max_line_bytes), decoder.unconsumed_tail
+            else:
+                piece, data = data, b""
+            split(piece)
+            while len(lines) >= chunk_rows:
+                yield line_no, lines[:chunk_rows]
+                lines = lines[chunk_rows:]
+                line_no += chunk_rows
+    if decoder:
+        split(decoder.flush())
+        if not decoder.eof:
+            raise zlib.error("gzip stream ended early")
+    if pending.strip():
+        lines.append(pending)
+    if lines:
+        yield line_no, lines
+
+def parse_ndjson_chunk(lines: List[bytes], first_line: int, errors: List[str]) -> pd.DataFrame:
+    records, line_numbers = [], []
+    for offset, line in enumerate(lines):
+        try:
+            record = json.loads(line)
+            if isinstance(record.get("location"), dict):
+                record = {**record, **record.pop("location")}
+        except (ValueError, AttributeError):
+            if len(errors) < INCIDENT_IMPORT_MAX_ERRORS:
+                errors.append(f"line {first_line + offset}: not a JSON object")
+            continue
+        records.append(record)
+        line_numbers.append(first_line + offset)
+    return pd.DataFrame.from_records(records, index=line_numbers)
+
+def parse_csv_chunk(lines: List[bytes], first_line: int, header: List[str]) -> pd.DataFrame:
+    frame = pd.read_csv(io.BytesIO(b"\n".join(lines)), header=None, names=header, dtype=str, on_bad_lines="skip", engine="c")
+    frame.index = frame.index + first_line
+    return frame
+
+def validate_incident_frame(frame: pd.DataFrame, errors: List[str]) -> Tuple[List[Dict[str, Any]], int]:
+    """Coerce an imported chunk to incidents documents, recording rejected rows"""
+    for alias, name in INCIDENT_IMPORT_ALIASES.items():
+        if alias in frame:
+            frame[name] = frame[name].combine_first(frame[alias]) if name in frame else frame[alias]
+    column = lambda name: frame[name] if name in frame else pd.Series(np.nan, index=frame.index)
+    lat = pd.to_numeric(column("lat"), errors="coerce")
+    lng = pd.to_numeric(column("lng"), errors="coerce")
+    severity = pd.to_numeric(column("severity"), errors="coerce").fillna(1)
+    raw_timestamp = column("timestamp")
+    timestamp = pd.to_datetime(raw_timestamp, errors="coerce", utc=True, format="mixed").dt.tz_convert(None)
+    incident_type = column("incident_type")
+    
+    valid = lat.between(-90, 90) & lng.between(-180, 180) & severity.between(1, 5) & incident_type.notna()
+    valid &= timestamp.notna() | raw_timestamp.isna()
+    for line in frame.index[~valid][:max(INCIDENT_IMPORT_MAX_ERRORS - len(errors), 0)]:
+        errors.append(f"line {line}: needs lat, lng, incident_type and a severity of 1-5")
     
-    # Calculate risk based on nearby incidents (demo data)
-    nearby_incidents = []
-    for incident in DEMO_INCIDENTS:
-        # Simple distance calculation (not accurate for production)
-        lat_diff = abs(incident["lat"] - lat)
-        lng_diff = abs(incident["lng"] - lng)
-        if lat_diff < 0.01 and lng_diff < 0.01:  # Roughly within radius
-            nearby_incidents.append(incident)
+    now = datetime.utcnow()
+    timestamps = timestamp[valid].astype(object).where(timestamp[valid].notna(), now)
+    descriptions = column("description")[valid].fillna("").astype(str)
+    docs = []
+    for lat_i, lng_i, type_i, desc_i, sev_i, ts_i in zip(lat[valid].tolist(), lng[valid].tolist(), incident_type[valid].astype(str).tolist(),
+                                                          descriptions.tolist(), severity[valid].astype(int).tolist(), timestamps.tolist()):
+        docs.append({
+            "id": str(uuid.uuid4()),
+            "location": {"lat": lat_i, "lng": lng_i},
+            "incident_type": type_i,
+            "description": desc_i,
+            "timestamp": ts_i.to_pydatetime() if isinstance(ts_i, pd.Timestamp) else ts_i,
+            "severity": sev_i,
+            "geo": {"type": "Point", "coordinates": [lng_i, lat_i]},
+        })
+    return docs, int((~valid).sum())
+
+@api_router.post("/incidents/import")
+async def import_incidents(request: Request):
+    """Stream a bulk NDJSON or CSV (optionally gzipped) incident upload into Mongo and the risk index.
+
+    The body is consumed and committed INCIDENT_IMPORT_CHUNK_ROWS lines at a time, so
+    memory use does not depend on the size of the upload. Records are one per line;
+    CSV files need a header row and must not quote embedded newlines.
+    """
+    content_type = request.headers.get("content-type", "").split(";")[0].strip()
+    if content_type not in ("application/x-ndjson", "application/jsonl", "text/csv"):
+        raise HTTPException(status_code=415, detail="Upload application/x-ndjson or text/csv")
     
-    risk_score = len(nearby_incidents) * 0.2  # Simple risk calculation
-    risk_level = "low" if risk_score < 0.3 else "medium" if risk_score < 0.7 else "high"
+    imported = rejected = 0
+    errors: List[str] = []
+    header = None
+    try:
+        async for first_line, lines in iter_upload_lines(request):
+            if content_type == "text/csv":
+                if header is None:
+                    header = [INCIDENT_IMPORT_ALIASES.get(name, name) for name in lines[0].decode().strip().lower().split(",")]
+                    lines, first_line = lines[1:], first_line + 1
+                    if not lines:
+                        continue
+                frame = parse_csv_chunk(lines, first_line, header)
+            else:
+                frame = parse_ndjson_chunk(lines, first_line, errors)
+            rejected += len(lines) - len(frame)
+            docs, invalid = validate_incident_frame(frame, errors)
+            rejected += invalid
+            if not docs:
+                continue
+            try:
+                await db.incidents.insert_many(docs, ordered=False)
+            except BulkWriteError as e:
+                write_errors = e.details.get("writeErrors", [])
+                for error in write_errors[:max(INCIDENT_IMPORT_MAX_ERRORS - len(errors), 0)]:
+                    errors.append(f"incident {docs[error['index']]['id']}: {error.get('errmsg', 'write failed')}")
+                failed = {error["index"] for error in write_errors}
+                rejected += len(docs) - e.details.get("nInserted", len(docs) - len(failed))
+                docs = [doc for i, doc in enumerate(docs) if i not in failed]
+            register_incidents(docs)
+            imported += len(docs)
+            del docs, frame
+    except zlib.error:
+        raise HTTPException(status_code=400, detail=f"Corrupt gzip body after {imported} imported incidents")
     
+    if imported and road_graph is not None:
+        road_graph.refresh_risk()
+    logger.info(f"Imported {imported} incidents ({rejected} rejected)")
+    return {"imported": imported, "rejected": rejected, "errors": errors[:INCIDENT_IMPORT_MAX_ERRORS]}
+
+def incident_risk_score(incident_count):
+    """Risk from a (weighted) incident count; works on scalars and NumPy arrays alike"""
+    return np.minimum(incident_count * 0.2, 1.0) if isinstance(incident_count, np.ndarray) else min(incident_count * 0.2, 1.0)
+
+def get_risk_level(risk_score: float) -> str:
+    return "low" if risk_score < 0.3 else "medium" if risk_score < 0.7 else "high"
+
+class RiskResultCache:
+    """LRU + TTL cache of /api/risk-analysis results per quantized cell, radius and hour.
+
+    Lookups within the same RISK_CACHE_CELL_DEG cell share one result scored at the
+    cell center, and concurrent misses for a key wait on a single computation. New
+    incidents drop the entries whose radius reaches them; incidents added on other
+    workers are picked up within RISK_CACHE_TTL_S.
+    """
+
+    def __init__(self, max_entries: int = RISK_CACHE_SIZE, ttl_s: float = RISK_CACHE_TTL_S):
+        self.max_entries = max_entries
+        self.ttl_s = ttl_s
+        self.entries: "OrderedDict[Tuple[int, int, int, datetime], Tuple[float, Dict[str, Any]]]" = OrderedDict()
+        self.by_cell: Dict[Tuple[int, int], set] = {}
+        self.radii: Dict[int, int] = {}
+        self.inflight: Dict[Tuple[int, int, int, datetime], asyncio.Future] = {}
+        self.epoch = 0  # bumped on invalidation so a computation that raced it is not stored
+        self.hits = self.misses = self.shared = 0
+
+    @staticmethod
+    def key(lat: float, lng: float, radius: int, hour: datetime) -> Tuple[int, int, int, datetime]:
+        return round(lat / RISK_CACHE_CELL_DEG), round(lng / RISK_CACHE_CELL_DEG), radius, hour
+
+    async def get(self, key, compute) -> Dict[str, Any]:
+        """Cached result for key; compute() returns (result, cacheable) on a miss"""
+        entry = self.entries.get(key)
+        now = time.monotonic()
+        if entry is not None and entry[0] > now:
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+        flight = self.inflight.get(key)
+        if flight is not None:
+            self.shared += 1
+            try:
+                return await asyncio.shield(flight)
+            except asyncio.CancelledError:
+                if not flight.cancelled():
+                    raise
+            # The leading request was cancelled (client gone); compute it here instead
+            return await self.get(key, compute)
+        
+        self.misses += 1
+        flight = self.inflight[key] = asyncio.get_running_loop().create_future()
+        epoch = self.epoch
+        try:
+            result, cacheable = await compute()
+        except Exception as e:
+            flight.set_exception(e)
+            flight.exception()  # waiters re-raise it; keep asyncio from logging it as unretrieved
+            raise
+        except BaseException:
+            flight.cancel()
+            raise
+        finally:
+            self.inflight.pop(key, None)
+        flight.set_result(result)
+        if cacheable and epoch == self.epoch:
+            self._store(key, result, now + self.ttl_s)
+        return result
+
+    def _store(self, key, result: Dict[str, Any], expires: float):
+        if key not in self.entries:
+            self.by_cell.setdefault(key[:2], set()).add(key)
+            self.radii[key[2]] = self.radii.get(key[2], 0) + 1
+        self.entries[key] = (expires, result)
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_entries:
+            self._drop(next(iter(self.entries)))
+
+    def _drop(self, key):
+        del self.entries[key]
+        keys = self.by_cell[key[:2]]
+        keys.discard(key)
+        if not keys:
+            del self.by_cell[key[:2]]
+        self.radii[key[2]] -= 1
+        if not self.radii[key[2]]:
+            del self.radii[key[2]]
+
+    def apply_incidents(self, incidents: List[Dict[str, Any]]):
+        """Drop the cached results whose radius reaches any of the incidents"""
+        self.epoch += 1
+        if not self.entries:
+            return
+        if len(incidents) > RISK_CACHE_BULK_CLEAR:
+            self.entries.clear()
+            self.by_cell.clear()
+            self.radii.clear()
+            return
+        stale = set()
+        for incident in incidents:
+            for radius in self.radii:
+                # One extra cell of margin covers the distance from a cell center to its edge
+                dlat = radius / METERS_PER_DEGREE_LAT + RISK_CACHE_CELL_DEG
+                dlng = dlat / max(math.cos(math.radians(incident["lat"])), 0.01)
+                x0, x1 = round((incident["lat"] - dlat) / RISK_CACHE_CELL_DEG), round((incident["lat"] + dlat) / RISK_CACHE_CELL_DEG)
+                y0, y1 = round((incident["lng"] - dlng) / RISK_CACHE_CELL_DEG), round((incident["lng"] + dlng) / RISK_CACHE_CELL_DEG)
+                if (x1 - x0 + 1) * (y1 - y0 + 1) > len(self.by_cell):
+                    cells = [cell for cell in self.by_cell if x0 <= cell[0] <= x1 and y0 <= cell[1] <= y1]
+                else:
+                    cells = [(x, y) for x in range(x0, x1 + 1) for y in range(y0, y1 + 1) if (x, y) in self.by_cell]
+                for cell in cells:
+                    stale.update(key for key in self.by_cell[cell] if key[2] == radius)
+        for key in stale:
+            self._drop(key)
+
+risk_cache = RiskResultCache()
+
+def most_recent_incidents(incidents: List[Dict[str, Any]], limit: int = 3) -> List[Dict[str, Any]]:
+    return sorted(incidents, key=lambda i: i["timestamp"] or "", reverse=True)[:limit]
+
+def risk_cell_centers(lats: np.ndarray, lngs: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Centers of the RISK_CACHE_CELL_DEG cells points are scored at, matching RiskResultCache.key"""
+    return np.round(lats / RISK_CACHE_CELL_DEG) * RISK_CACHE_CELL_DEG, np.round(lngs / RISK_CACHE_CELL_DEG) * RISK_CACHE_CELL_DEG
+
+async def compute_location_risk(lat: float, lng: float, radius: int, at: datetime) -> Tuple[Dict[str, Any], bool]:
+    """Risk fields for one point; only results from the loaded index are cacheable"""
+    ready = incident_index.ready
+    if ready:
+        nearby = incident_index.query(lat, lng, radius)
+        weighted = float(risk_aggregates.weighted_counts(np.array([lat]), np.array([lng]), radius, at)[0])
+    else:
+        nearby = await find_incidents_near_db(lat, lng, radius)
+        weighted = len(nearby)
+    nearby_incidents = [incident for incident, _ in nearby]
+    
+    risk_score = incident_risk_score(weighted)
+    risk_level = get_risk_level(risk_score)
     return {
-        "location": {"lat": lat, "lng": lng},
-        "risk_score": min(risk_score, 1.0),
+        "risk_score": risk_score,
         "risk_level": risk_level,
         "incident_count": len(nearby_incidents),
-        "recent_incidents": nearby_incidents[:3],
-        "recommendations": get_safety_recommendations(risk_level)
-    }
+        "recent_incidents": most_recent_incidents(nearby_incidents),
+        "recommendations": get_safety_recommendations(risk_level),
+    }, ready
+
+@api_router.get("/risk-analysis")
+async def get_location_risk(lat: float, lng: float, request: Request, radius: int = Query(1000, gt=0, le=5000), at: Optional[datetime] = None):
+    """Analyze location risk based on historical incidents, weighted by recency, severity and time of day.
+
+    Scored for the ~110 m cell around the location at the start of the hour of at
+    (default now), served from risk_cache, and revalidated with ETag/If-None-Match.
+    """
+    hour = risk_tile_hour(at)
+    key = RiskResultCache.key(lat, lng, radius, hour)
+    result = await risk_cache.get(key, lambda: compute_location_risk(
+        key[0] * RISK_CACHE_CELL_DEG, key[1] * RISK_CACHE_CELL_DEG, radius, hour))
+    
+    response = ORJSONResponse(RiskAnalysis(location={"lat": lat, "lng": lng}, at=hour, **result))
+    etag = f'"{zlib.crc32(response.body):08x}"'
+    headers = {"ETag": etag, "Cache-Control": f"public, max-age={RISK_CACHE_MAX_AGE}"}
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers=headers)
+    response.headers.update(headers)
+    return response
+
+@api_router.post("/risk-analysis/batch")
+async def get_batch_location_risk(request: BatchRiskRequest):
+    """Score many coordinates in one vectorized pass over the incident arrays.
+
+    Points are scored like /api/risk-analysis scores a single point: at the center
+    of their ~110 m cell, at the start of the hour of at, so both endpoints agree.
+    """
+    if len(request.points) > BATCH_RISK_MAX_POINTS:
+        raise HTTPException(status_code=413, detail=f"At most {BATCH_RISK_MAX_POINTS} points per batch")
+    if not incident_index.ready:
+        raise HTTPException(status_code=503, detail="Risk index is still loading, retry shortly")
+    try:
+        lats = np.fromiter((p["lat"] for p in request.points), dtype=np.float64, count=len(request.points))
+        lngs = np.fromiter((p["lng"] for p in request.points), dtype=np.float64, count=len(request.points))
+    except KeyError:
+        raise HTTPException(status_code=422, detail="Every point needs lat and lng")
+    
+    at = risk_tile_hour(request.at)
+    cell_lats, cell_lngs = risk_cell_centers(lats, lngs)
+    counts = incident_index.count_within(cell_lats, cell_lngs, request.radius)
+    scores = incident_risk_score(risk_aggregates.weighted_counts(cell_lats, cell_lngs, request.radius, at))
+    
+    return ORJSONResponse({
+        "radius": request.radius,
+        "at": at,
+        "results": [
+            RiskPoint(lat, lng, score, get_risk_level(score), count)
+            for lat, lng, score, count in zip(lats.tolist(), lngs.tolist(), scores.tolist(), counts.tolist())
+        ]
+    })
 
 def get_safety_recommendations(risk_level: str) -> List[str]:
     if risk_level == "high":
@@ -152,75 +1481,734 @@ def get_safety_recommendations(risk_level: str) -> List[str]:
             "Stay aware of surroundings"
         ]
 
+# Risk heatmap tiles (Web Mercator z/x/y pyramid)
+RISK_TILE_SIZE = 64  # pixels per side; clients upscale, risk varies slowly at this resolution
+RISK_TILE_MIN_ZOOM = 10
+RISK_TILE_MAX_ZOOM = 17
+RISK_TILE_PRECOMPUTE_MAX_ZOOM = int(os.environ.get("RISK_TILE_PRECOMPUTE_MAX_ZOOM", "14"))
+RISK_TILE_RADIUS_M = 1000  # same default radius as /api/risk-analysis
+RISK_TILE_CACHE_SIZE = int(os.environ.get("RISK_TILE_CACHE_SIZE", "5000"))
+RISK_TILE_MAX_AGE = 300
+RISK_TILE_PRECOMPUTE_PAUSE_S = 0.02
+
+def tile_pixel_centers(z: int, x: int, y: int) -> Tuple[np.ndarray, np.ndarray]:
+    """Latitude/longitude grids of the pixel centers of a tile"""
+    n = 2.0 ** z
+    offsets = (np.arange(RISK_TILE_SIZE) + 0.5) / RISK_TILE_SIZE
+    lngs = (x + offsets) / n * 360.0 - 180.0
+    lats = np.degrees(np.arctan(np.sinh(np.pi * (1.0 - 2.0 * (y + offsets) / n))))
+    return np.repeat(lats, RISK_TILE_SIZE).reshape(RISK_TILE_SIZE, RISK_TILE_SIZE), np.tile(lngs, (RISK_TILE_SIZE, 1))
+
+def tiles_covering(z: int, lat: float, lng: float, radius_m: float) -> List[Tuple[int, int]]:
+    """Tiles at zoom z overlapping the box around (lat, lng) +/- radius_m"""
+    n = 2 ** z
+    dlat = radius_m / METERS_PER_DEGREE_LAT
+    dlng = dlat / max(math.cos(math.radians(min(abs(lat) + dlat, 89.9))), 1e-6)
+
+    def tile_x(lon):
+        return min(max(int((lon + 180.0) / 360.0 * n), 0), n - 1)
+
+    def tile_y(la):
+        la = math.radians(min(max(la, -85.0511), 85.0511))
+        return min(max(int((1.0 - math.asinh(math.tan(la)) / math.pi) / 2.0 * n), 0), n - 1)
+
+    return [(x, y) for x in range(tile_x(lng - dlng), tile_x(lng + dlng) + 1)
+            for y in range(tile_y(lat + dlat), tile_y(lat - dlat) + 1)]
+
+def tile_keys_covering(z: int, lats: np.ndarray, lngs: np.ndarray, radius_m: float) -> np.ndarray:
+    """Vectorized tiles_covering for many points: x * 2**z + y of every tile touched, sorted, with repeats"""
+    n = 2 ** z
+    lats, lngs = np.asarray(lats, dtype=np.float64), np.asarray(lngs, dtype=np.float64)
+    dlat = radius_m / METERS_PER_DEGREE_LAT
+    dlng = dlat / np.maximum(np.cos(np.radians(np.minimum(np.abs(lats) + dlat, 89.9))), 1e-6)
+
+    def tile_x(lon):
+        return np.clip(((lon + 180.0) / 360.0 * n).astype(np.int64), 0, n - 1)
+
+    def tile_y(la):
+        la = np.radians(np.clip(la, -85.0511, 85.0511))
+        return np.clip(((1.0 - np.arcsinh(np.tan(la)) / np.pi) / 2.0 * n).astype(np.int64), 0, n - 1)
+
+    x0, x1 = tile_x(lngs - dlng), tile_x(lngs + dlng)
+    y0, y1 = tile_y(lats + dlat), tile_y(lats - dlat)
+    if not len(x0):
+        return np.zeros(0, dtype=np.int64)
+    span_x, span_y = int((x1 - x0).max()) + 1, int((y1 - y0).max()) + 1
+    x = x0[:, None, None] + np.arange(span_x)[None, :, None]
+    y = y0[:, None, None] + np.arange(span_y)[None, None, :]
+    inside = (x <= x1[:, None, None]) & (y <= y1[:, None, None])
+    return np.sort((x * n + y)[inside])
+
+def encode_png(rgba: np.ndarray) -> bytes:
+    """Minimal RGBA PNG encoder (no imaging dependency needed for heatmap tiles)"""
+    height, width, _ = rgba.shape
+    raw = np.zeros((height, width * 4 + 1), dtype=np.uint8)  # filter byte 0 per scanline
+    raw[:, 1:] = rgba.reshape(height, width * 4)
+
+    def chunk(tag: bytes, data: bytes) -> bytes:
+        return struct.pack(">I", len(data)) + tag + data + struct.pack(">I", zlib.crc32(tag + data))
+
+    header = struct.pack(">IIBBBBB", width, height, 8, 6, 0, 0, 0)
+    return b"\x89PNG\r\n\x1a\n" + chunk(b"IHDR", header) + chunk(b"IDAT", zlib.compress(raw.tobytes(), 6)) + chunk(b"IEND", b"")
+
+def risk_colors(risk: np.ndarray) -> np.ndarray:
+    """Green -> yellow -> red heat ramp; zero risk is fully transparent"""
+    rgba = np.zeros(risk.shape + (4,), dtype=np.uint8)
+    rgba[..., 0] = np.clip(risk * 2.0, 0.0, 1.0) * 255
+    rgba[..., 1] = np.clip(2.0 - risk * 2.0, 0.0, 1.0) * 200
+    rgba[..., 3] = np.where(risk > 0, 80 + risk * 140, 0)
+    return rgba
+
+class RiskTileCache:
+    """LRU of per-pixel risk tiles, one per (z, x, y, hour).
+
+    Pixels are scored with the same time-decayed aggregates as /api/risk-analysis
+    at the start of the tile's hour, so keying by hour keeps both the hour-of-day
+    weighting and decay current. New incidents drop every cached hour of the tiles
+    they reach; the next request rebuilds them.
+    """
+
+    def __init__(self, max_tiles: int = RISK_TILE_CACHE_SIZE):
+        self.max_tiles = max_tiles
+        self.risk: "OrderedDict[Tuple[int, int, int, datetime], np.ndarray]" = OrderedDict()
+        self.encoded: Dict[Tuple[int, int, int, datetime, str], Tuple[bytes, str]] = {}
+
+    def _store(self, key: Tuple[int, int, int, datetime], risk: np.ndarray):
+        self.risk[key] = risk
+        self.risk.move_to_end(key)
+        while len(self.risk) > self.max_tiles:
+            old_key, _ = self.risk.popitem(last=False)
+            self._drop_encoded(old_key)
+
+    def _drop_encoded(self, key: Tuple[int, int, int, datetime]):
+        for fmt in ("png", "bin"):
+            self.encoded.pop(key + (fmt,), None)
+
+    def get_risk(self, z: int, x: int, y: int, hour: datetime) -> np.ndarray:
+        key = (z, x, y, hour)
+        risk = self.risk.get(key)
+        if risk is None:
+            lats, lngs = tile_pixel_centers(z, x, y)
+            weighted = risk_aggregates.weighted_counts(lats.ravel(), lngs.ravel(), RISK_TILE_RADIUS_M, hour)
+            risk = incident_risk_score(weighted).reshape(RISK_TILE_SIZE, RISK_TILE_SIZE)
+            self._store(key, risk)
+        else:
+            self.risk.move_to_end(key)
+        return risk
+
+    def get_encoded(self, z: int, x: int, y: int, hour: datetime, fmt: str) -> Tuple[bytes, str]:
+        """Encoded tile body and its ETag"""
+        risk = self.get_risk(z, x, y, hour)
+        cached = self.encoded.get((z, x, y, hour, fmt))
+        if cached is None:
+            if fmt == "png":
+                body = encode_png(risk_colors(risk))
+            else:
+                body = np.round(risk * 255).astype(np.uint8).tobytes()
+            cached = (body, f'"{zlib.crc32(body):08x}"')
+            self.encoded[(z, x, y, hour, fmt)] = cached
+        return cached
+
+    def apply_incidents(self, incidents: List[Dict[str, Any]]):
+        """Drop the cached tiles (every hour) that the incidents reach"""
+        if not self.risk or not incidents:
+            return
+        lats = np.fromiter((incident["lat"] for incident in incidents), dtype=np.float64, count=len(incidents))
+        lngs = np.fromiter((incident["lng"] for incident in incidents), dtype=np.float64, count=len(incidents))
+        cached = list(self.risk)
+        stale = np.zeros(len(cached), dtype=bool)
+        zooms = np.array([key[0] for key in cached])
+        for z in np.unique(zooms):
+            at_zoom = np.nonzero(zooms == z)[0]
+            keys = np.array([cached[i][1] * 2 ** int(z) + cached[i][2] for i in at_zoom], dtype=np.int64)
+            covered = tile_keys_covering(int(z), lats, lngs, RISK_TILE_RADIUS_M)
+            if len(covered):
+                stale[at_zoom] = covered[np.minimum(np.searchsorted(covered, keys), len(covered) - 1)] == keys
+        for i in np.nonzero(stale)[0]:
+            del self.risk[cached[i]]
+            self._drop_encoded(cached[i])
+
+    async def precompute(self):
+        """Fill the low zoom levels for every area that has incidents, for the current hour"""
+        built = 0
+        hour = risk_tile_hour(None)
+        for z in range(RISK_TILE_MIN_ZOOM, min(RISK_TILE_PRECOMPUTE_MAX_ZOOM, RISK_TILE_MAX_ZOOM) + 1):
+            occupied = set()
+            for ix, iy in list(incident_index.cells):
+                lat, lng = (ix + 0.5) * incident_index.cell_deg, (iy + 0.5) * incident_index.cell_deg
+                occupied.update(tiles_covering(z, lat, lng, RISK_TILE_RADIUS_M + incident_index.cell_deg * METERS_PER_DEGREE_LAT))
+            for x, y in occupied:
+                if built >= self.max_tiles:
+                    return
+                self.get_risk(z, x, y, hour)
+                built += 1
+                await asyncio.sleep(RISK_TILE_PRECOMPUTE_PAUSE_S)  # leave the loop mostly free for requests while the pyramid fills
+        logger.info(f"Precomputed {built} risk tiles")
+
+def risk_tile_hour(at: Optional[datetime]) -> datetime:
+    return as_utc(at).replace(minute=0, second=0, microsecond=0)
+
+risk_tiles = RiskTileCache()
+
+@api_router.get("/risk-tiles/{z}/{x}/{tile}")
+async def get_risk_tile(z: int, x: int, tile: str, request: Request, at: Optional[datetime] = None):
+    """Serve a risk heatmap tile as PNG or raw uint8 (.bin), scored at the start of the hour of at (default now)"""
+    y_str, _, fmt = tile.partition(".")
+    if fmt not in ("png", "bin") or not y_str.isdigit():
+        raise HTTPException(status_code=404, detail="Tiles are served as {y}.png or {y}.bin")
+    y = int(y_str)
+    if not RISK_TILE_MIN_ZOOM <= z <= RISK_TILE_MAX_ZOOM or not (0 <= x < 2 ** z and 0 <= y < 2 ** z):
+        raise HTTPException(status_code=404, detail="Tile out of range")
+    
+    body, etag = risk_tiles.get_encoded(z, x, y, risk_tile_hour(at), fmt)
+    headers = {"ETag": etag, "Cache-Control": f"public, max-age={RISK_TILE_MAX_AGE}"}
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers=headers)
+    return Response(content=body, media_type="image/png" if fmt == "png" else "application/octet-stream", headers=headers)
+
 # Routes for Feature 3: Safety Maps & Chatbot
+OSM_EXTRACT_PATH = os.environ.get("OSM_EXTRACT_PATH")  # .osm or .osm.gz road network extract
+ROUTE_RISK_WEIGHT = float(os.environ.get("ROUTE_RISK_WEIGHT", "4.0"))  # extra cost per meter at risk 1.0
+EDGE_RISK_RADIUS_M = 150
+ROUTE_SNAP_MAX_M = 1000
+ROUTE_CACHE_SIZE = 2048
+ROUTE_SEARCH_LIMIT_FACTOR = 2.0  # first Dijkstra cost limit, as a multiple of the straight-line distance
+ROAD_NODE_CELL_DEG = 0.005
+WALKING_SPEED_MPS = 1.35
+WALKABLE_HIGHWAYS = {
+    "primary", "primary_link", "secondary", "secondary_link", "tertiary", "tertiary_link",
+    "unclassified", "residential", "living_street", "service", "pedestrian", "footway",
+    "path", "steps", "track", "cycleway", "road",
+}
+
+def parse_osm_extract(path: str) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    """Stream an OSM XML extract into node coordinates and walkable edge endpoints"""
+    node_ids: Dict[int, int] = {}
+    lats, lngs = array("d"), array("d")
+    us, vs = array("q"), array("q")
+    opener = gzip.open if path.endswith(".gz") else open
+    with opener(path, "rb") as f:
+        context = ET.iterparse(f, events=("start", "end"))
+        _, root = next(context)
+        for event, elem in context:
+            if event != "end":
+                continue
+            if elem.tag == "node":
+                node_ids[int(elem.get("id"))] = len(lats)
+                lats.append(float(elem.get("lat")))
+                lngs.append(float(elem.get("lon")))
+                root.clear()
+            elif elem.tag == "way":
+                tags = {tag.get("k"): tag.get("v") for tag in elem.iter("tag")}
+                if tags.get("highway") in WALKABLE_HIGHWAYS and tags.get("foot") != "no" and tags.get("access") != "private":
+                    refs = [node_ids.get(int(nd.get("ref"))) for nd in elem.iter("nd")]
+                    for a, b in zip(refs, refs[1:]):
+                        if a is not None and b is not None and a != b:
+                            us.append(a)
+                            vs.append(b)
+                root.clear()
+    u, v = np.frombuffer(us, dtype=np.int64), np.frombuffer(vs, dtype=np.int64)
+    # Keep only nodes that lie on a walkable way and renumber them densely
+    used = np.unique(np.concatenate([u, v]))
+    lat, lng = np.frombuffer(lats, dtype=np.float64)[used], np.frombuffer(lngs, dtype=np.float64)[used]
+    return lat, lng, np.searchsorted(used, u), np.searchsorted(used, v)
+
+class RoadGraph:
+    """Walkable road network in CSR form with risk-weighted edge costs.
+
+    Edge weight = length * (1 + ROUTE_RISK_WEIGHT * risk), where risk is the
+    /api/risk-analysis score of the edge midpoint over EDGE_RISK_RADIUS_M. Weights
+    never drop below the great-circle length, so no path can cost less than the
+    straight-line distance; searches use that to bound how far Dijkstra explores.
+    Risk updates swap in a new weight matrix and bump a generation counter, so a
+    search running in a worker thread never caches a path from stale weights.
+    """
+
+    def __init__(self, lat: np.ndarray, lng: np.ndarray, u: np.ndarray, v: np.ndarray):
+        n = len(lat)
+        src, dst = np.concatenate([u, v]), np.concatenate([v, u])
+        order = np.lexsort((dst, src))
+        src, dst = src[order], dst[order]
+        unique = np.ones(len(src), dtype=bool)
+        unique[1:] = (src[1:] != src[:-1]) | (dst[1:] != dst[:-1])
+        src, dst = src[unique], dst[unique]
+        
+        self.lat, self.lng = lat, lng
+        self.indptr = np.concatenate([[0], np.cumsum(np.bincount(src, minlength=n))]).astype(np.int32)
+        self.indices = dst.astype(np.int32)
+        self.length = haversine_m(lat[src], lng[src], lat[dst], lng[dst])
+        self.mid_lat, self.mid_lng = (lat[src] + lat[dst]) / 2.0, (lng[src] + lng[dst]) / 2.0
+        self.incident_counts = np.zeros(len(dst), dtype=np.int64)
+        self.risk = np.zeros(len(dst))
+        self.node_cells = self._grid(lat, lng)
+        self.edge_cells = self._grid(self.mid_lat, self.mid_lng)
+        self.weights = self._matrix(self.length)
+        _, self.components = connected_components(self.weights, directed=False)
+        self.generation = 0
+        self.routes: "OrderedDict[Tuple[int, int], Optional[List[int]]]" = OrderedDict()
+        self._lock = threading.Lock()  # guards weights, generation and routes across the loop and search threads
+
+    def _matrix(self, weights: np.ndarray) -> csr_matrix:
+        n = len(self.lat)
+        # Coincident nodes give zero-length edges; keep them as (tiny) explicit edges
+        return csr_matrix((np.maximum(weights, 1e-6), self.indices, self.indptr), shape=(n, n))
+
+    def __len__(self) -> int:
+        return len(self.lat)
+
+    @staticmethod
+    def _grid(lat: np.ndarray, lng: np.ndarray) -> Dict[Tuple[int, int], List[int]]:
+        cells: Dict[Tuple[int, int], List[int]] = {}
+        keys = zip(np.floor(lat / ROAD_NODE_CELL_DEG).astype(np.int64).tolist(), np.floor(lng / ROAD_NODE_CELL_DEG).astype(np.int64).tolist())
+        for i, key in enumerate(keys):
+            cells.setdefault(key, []).append(i)
+        return cells
+
+    def _near(self, cells, lat_arr, lng_arr, lat: float, lng: float, radius_m: float) -> Tuple[np.ndarray, np.ndarray]:
+        """Ids and distances of grid members within radius_m"""
+        dlat = radius_m / METERS_PER_DEGREE_LAT
+        dlng = dlat / max(math.cos(math.radians(min(abs(lat) + dlat, 89.9))), 1e-6)
+        ids = [i for ix in range(math.floor((lat - dlat) / ROAD_NODE_CELL_DEG), math.floor((lat + dlat) / ROAD_NODE_CELL_DEG) + 1)
+               for iy in range(math.floor((lng - dlng) / ROAD_NODE_CELL_DEG), math.floor((lng + dlng) / ROAD_NODE_CELL_DEG) + 1)
+               for i in cells.get((ix, iy), ())]
+        ids = np.asarray(ids, dtype=np.int64)
+        distances = haversine_m(lat, lng, lat_arr[ids], lng_arr[ids])
+        inside = distances <= radius_m
+        return ids[inside], distances[inside]
+
+    def nearest_node(self, lat: float, lng: float) -> Optional[int]:
+        ids, distances = self._near(self.node_cells, self.lat, self.lng, lat, lng, ROUTE_SNAP_MAX_M)
+        return int(ids[np.argmin(distances)]) if ids.size else None
+
+    def _set_risk(self, edges: np.ndarray):
+        self.risk[edges] = incident_risk_score(self.incident_counts[edges])
+        weights = self.length * (1.0 + ROUTE_RISK_WEIGHT * self.risk)
+        matrix = self._matrix(weights)
+        with self._lock:
+            self.weights = matrix
+            self.generation += 1
+            self.routes.clear()
+
+    def refresh_risk(self):
+        """Recompute every edge's risk from the incident index"""
+        self.incident_counts = incident_index.count_within(self.mid_lat, self.mid_lng, EDGE_RISK_RADIUS_M)
+        self._set_risk(np.arange(len(self.indices)))
+
+    def apply_incident(self, incident: Dict[str, Any]):
+        """Raise the cost of the edges a new incident is close to"""
+        edges, _ = self._near(self.edge_cells, self.mid_lat, self.mid_lng, incident["lat"], incident["lng"], EDGE_RISK_RADIUS_M)
+        if edges.size:
+            self.incident_counts[edges] += 1
+            self._set_risk(edges)
+
+    def shortest_path(self, source: int, target: int) -> Optional[List[int]]:
+        """Lowest-cost path; results are cached until edge risks change.
+
+        Dijkstra runs with a cost limit starting at ROUTE_SEARCH_LIMIT_FACTOR times
+        the straight-line distance and doubling until the target is reached, so a
+        typical route only explores the nodes around its endpoints.
+        """
+        key = (source, target)
+        with self._lock:
+            if key in self.routes:
+                self.routes.move_to_end(key)
+                return self.routes[key]
+            weights, generation = self.weights, self.generation
+        
+        path = None
+        if self.components[source] == self.components[target]:
+            straight = float(haversine_m(self.lat[source], self.lng[source], self.lat[target], self.lng[target]))
+            limit = max(straight * ROUTE_SEARCH_LIMIT_FACTOR, ROUTE_SNAP_MAX_M)
+            while True:
+                costs, predecessors = dijkstra(weights, indices=source, return_predecessors=True, limit=limit)
+                if np.isfinite(costs[target]):
+                    break
+                limit *= 2  # the target is reachable, so some finite limit finds it
+            path = [target]
+            while path[-1] != source:
+                path.append(int(predecessors[path[-1]]))
+            path.reverse()
+        
+        with self._lock:
+            if generation == self.generation:
+                self.routes[key] = path
+                while len(self.routes) > ROUTE_CACHE_SIZE:
+                    self.routes.popitem(last=False)
+        return path
+
+    def edge_between(self, a: int, b: int) -> int:
+        start, end = self.indptr[a], self.indptr[a + 1]
+        return int(start + np.searchsorted(self.indices[start:end], b))
+
+road_graph: Optional[RoadGraph] = None
+
+async def load_road_graph():
+    """Load the OSM extract (if configured) once the incident index is ready"""
+    global road_graph
+    if not OSM_EXTRACT_PATH:
+        logger.info("OSM_EXTRACT_PATH not set; /api/safety-route uses straight-line routes")
+        return
+    try:
+        graph = RoadGraph(*await asyncio.to_thread(parse_osm_extract, OSM_EXTRACT_PATH))
+    except Exception as e:
+        logger.error(f"Failed to load road graph from {OSM_EXTRACT_PATH}: {e}")
+        return
+    graph.refresh_risk()
+    road_graph = graph
+    logger.info(f"Road graph ready with {len(graph)} nodes and {len(graph.indices)} edges")
+
+def safety_label(risk: float) -> str:
+    return {"low": "high", "medium": "medium", "high": "low"}[get_risk_level(risk)]
+
+def format_route(waypoints: List[Dict[str, Any]], distance_m: float, risks: np.ndarray, lengths: np.ndarray) -> Dict[str, Any]:
+    mean_risk = float(np.average(risks, weights=lengths)) if lengths.sum() > 0 else float(risks.max(initial=0.0))
+    risky_segments = int((risks >= 0.3).sum())
+    alerts = [f"Route passes {risky_segments} segment(s) with recent incidents - stay alert"] if risky_segments else [
+        "No recent incidents reported along this route"]
+    if mean_risk >= 0.7:
+        alerts.append("Consider travelling with a companion or sharing your live location")
+    return {
+        "route": waypoints,
+        "total_distance": f"{distance_m / 1000:.1f} km",
+        "estimated_time": f"{max(1, round(distance_m / WALKING_SPEED_MPS / 60))} minutes",
+        "safety_score": round(1.0 - mean_risk, 2),
+        "alerts": alerts
+    }
+
 @api_router.get("/safety-route")
 async def get_safe_route(start_lat: float, start_lng: float, end_lat: float, end_lng: float):
     """Get safest route between two points"""
     
-    # Demo: Return mock route data with safety analysis
-    waypoints = [
-        {"lat": start_lat, "lng": start_lng, "safety": "high"},
-        {"lat": (start_lat + end_lat)/2, "lng": (start_lng + end_lng)/2, "safety": "medium"},
-        {"lat": end_lat, "lng": end_lng, "safety": "high"}
-    ]
+    graph = road_graph
+    source = graph.nearest_node(start_lat, start_lng) if graph else None
+    target = graph.nearest_node(end_lat, end_lng) if graph else None
+    if source is None or target is None:
+        # No road network loaded (or points off the network): score the straight line
+        lats = np.array([start_lat, (start_lat + end_lat) / 2, end_lat])
+        lngs = np.array([start_lng, (start_lng + end_lng) / 2, end_lng])
+        risks = incident_risk_score(incident_index.count_within(lats, lngs, EDGE_RISK_RADIUS_M))
+        waypoints = [{"lat": float(la), "lng": float(ln), "safety": safety_label(r)} for la, ln, r in zip(lats, lngs, risks)]
+        distance = float(haversine_m(start_lat, start_lng, end_lat, end_lng))
+        return format_route(waypoints, distance, risks, np.full(3, distance / 3))
     
-    return {
-        "route": waypoints,
-        "total_distance": "2.3 km",
-        "estimated_time": "8 minutes",
-        "safety_score": 0.85,
-        "alerts": [
-            "Well-lit path recommended",
-            "CCTV coverage available on this route"
-        ]
-    }
+    path = await asyncio.to_thread(graph.shortest_path, source, target)
+    if path is None:
+        raise HTTPException(status_code=404, detail="No walkable route between these points")
+    
+    edges = np.array([graph.edge_between(a, b) for a, b in zip(path, path[1:])], dtype=np.int64)
+    risks, lengths = graph.risk[edges], graph.length[edges]
+    waypoints = [{"lat": float(graph.lat[path[0]]), "lng": float(graph.lng[path[0]]), "safety": safety_label(float(risks[0]) if edges.size else 0.0)}]
+    waypoints += [{"lat": float(graph.lat[node]), "lng": float(graph.lng[node]), "safety": safety_label(float(risk))}
+                  for node, risk in zip(path[1:], risks)]
+    return format_route(waypoints, float(lengths.sum()), risks, lengths)
+
+SAFETY_INTENTS_PATH = Path(os.environ.get("SAFETY_INTENTS_PATH", ROOT_DIR / "safety_intents.json"))
+SAFETY_CHAT_CACHE_SIZE = 4096
+SAFETY_CHAT_MIN_SCORE = 0.2
+SAFETY_CHAT_RISK_RADIUS_M = 1000
+CHAT_TOKEN_RE = re.compile(r"[a-z0-9]+")
+CHAT_STOPWORDS = frozenset(
+    "a an the is am are was be i me my to of in on at it this that do does how what which can could for you your and or with there".split()
+)
+
+def chat_terms(text: str) -> Tuple[str, ...]:
+    """Normalized unigram and bigram terms of a chat message"""
+    tokens = []
+    for token in CHAT_TOKEN_RE.findall(text.lower()):
+        if token in CHAT_STOPWORDS:
+            continue
+        if len(token) > 3 and token.endswith("s") and not token.endswith("ss"):
+            token = token[:-1]
+        tokens.append(token)
+    return tuple(tokens) + tuple(f"{a} {b}" for a, b in zip(tokens, tokens[1:]))
+
+class IntentIndex:
+    """TF-IDF inverted index over the safety intent corpus.
+
+    Each intent's patterns form one document. A message only touches the postings
+    of its own terms, so matching cost depends on the message, not on how many
+    intents the corpus holds. Matches are memoized per normalized message.
+    """
+
+    def __init__(self, corpus: Dict[str, Any]):
+        self.intents = corpus["intents"]
+        self.fallback = corpus["fallback"]
+        term_counts = []
+        for intent in self.intents:
+            counts: Dict[str, int] = {}
+            for pattern in intent["patterns"]:
+                for term in chat_terms(pattern):
+                    counts[term] = counts.get(term, 0) + 1
+            term_counts.append(counts)
+        doc_freq: Dict[str, int] = {}
+        for counts in term_counts:
+            for term in counts:
+                doc_freq[term] = doc_freq.get(term, 0) + 1
+        self.idf = {term: math.log(1 + len(self.intents) / df) for term, df in doc_freq.items()}
+        self.postings: Dict[str, List[Tuple[int, float]]] = {}
+        for intent_id, counts in enumerate(term_counts):
+            weights = {term: (1 + math.log(tf)) * self.idf[term] for term, tf in counts.items()}
+            norm = math.sqrt(sum(w * w for w in weights.values())) or 1.0
+            for term, weight in weights.items():
+                self.postings.setdefault(term, []).append((intent_id, weight / norm))
+        self.cache: OrderedDict = OrderedDict()
+
+    @classmethod
+    def load(cls, path: Path = SAFETY_INTENTS_PATH) -> "IntentIndex":
+        with open(path) as f:
+            return cls(json.load(f))
+
+    def match(self, message: str) -> Optional[Dict[str, Any]]:
+        terms = tuple(sorted(set(chat_terms(message))))
+        if terms in self.cache:
+            self.cache.move_to_end(terms)
+            intent_id = self.cache[terms]
+        else:
+            intent_id = self._score(terms)
+            self.cache[terms] = intent_id
+            if len(self.cache) > SAFETY_CHAT_CACHE_SIZE:
+                self.cache.popitem(last=False)
+        return self.intents[intent_id] if intent_id is not None else None
+
+    def _score(self, terms: Tuple[str, ...]) -> Optional[int]:
+        query = {term: self.idf[term] for term in terms if term in self.idf}
+        norm = math.sqrt(sum(w * w for w in query.values()))
+        if not norm:
+            return None
+        scores: Dict[int, float] = {}
+        for term, weight in query.items():
+            for intent_id, doc_weight in self.postings[term]:
+                scores[intent_id] = scores.get(intent_id, 0.0) + weight * doc_weight
+        intent_id, score = max(scores.items(), key=lambda item: item[1])
+        return intent_id if score / norm >= SAFETY_CHAT_MIN_SCORE else None
+
+intent_index: Optional[IntentIndex] = None
+
+def load_intent_index():
+    global intent_index
+    intent_index = IntentIndex.load()
+    logger.info(f"Loaded {len(intent_index.intents)} safety chat intents")
+
+def live_risk_summary(lat: Optional[float], lng: Optional[float]) -> str:
+    if lat is None or lng is None:
+        return "Share your location for live risk information about your area."
+    if not incident_index.ready:
+        return "Live incident data for your area is still loading."
+    count = int(incident_index.count_within(np.array([lat]), np.array([lng]), SAFETY_CHAT_RISK_RADIUS_M)[0])
+    weighted = risk_aggregates.weighted_counts(np.array([lat]), np.array([lng]), SAFETY_CHAT_RISK_RADIUS_M, datetime.utcnow())[0]
+    risk_level = get_risk_level(incident_risk_score(float(weighted)))
+    return f"{count} incident{'s' if count != 1 else ''} reported within 1 km of you; risk here is {risk_level}."
 
 @api_router.post("/safety-chat")
-async def safety_chatbot(message: str):
+async def safety_chatbot(message: str, lat: Optional[float] = None, lng: Optional[float] = None):
     """AI chatbot for safety queries"""
+    if intent_index is None:
+        raise HTTPException(status_code=503, detail="Safety chat is still loading")
     
-    # Demo: Simple keyword-based responses
-    message_lower = message.lower()
+    intent = intent_index.match(message) or intent_index.fallback
+    response = intent["response"]
+    if "{risk_summary}" in response:
+        response = response.replace("{risk_summary}", live_risk_summary(lat, lng))
     
-    if "safe" in message_lower and ("route" in message_lower or "road" in message_lower):
-        return {
-            "response": "Based on recent data, I recommend taking the main road with better lighting. The side streets have had 2 incidents reported this month.",
-            "suggestions": ["Take main road", "Travel before 9 PM", "Share live location"]
-        }
-    elif "emergency" in message_lower or "help" in message_lower:
-        return {
-            "response": "In case of emergency, press the SOS button. Your location will be shared with emergency contacts. Say 'I'm fine' calmly if you need silent help.",
-            "suggestions": ["Press SOS", "Use voice alert", "Share location"]
-        }
-    elif "incident" in message_lower or "report" in message_lower:
-        return {
-            "response": "You can report incidents anonymously. This helps other users stay informed about unsafe areas.",
-            "suggestions": ["Report incident", "View incident map", "Get area alerts"]
-        }
-    else:
-        return {
-            "response": "I'm here to help with your safety concerns. You can ask about safe routes, report incidents, or get emergency help.",
-            "suggestions": ["Find safe route", "Report incident", "Emergency help"]
-        }
+    return {
+        "intent": intent.get("name", "fallback"),
+        "response": response,
+        "suggestions": intent["suggestions"]
+    }
 
 # Routes for Feature 4: Gesture-based SOS
+GESTURE_MODEL_PATH = os.environ.get("GESTURE_MODEL_PATH")  # .npz with "features" and "labels"
+GESTURE_SOS_GESTURES = {"peace_sign", "open_palm", "help_gesture"}
+GESTURE_SOS_CONFIDENCE = 0.8
+GESTURE_K = 7
+GESTURE_REJECT_DISTANCE = 1.5  # mean neighbour distance (palm units) beyond which a pose is "unknown"
+GESTURE_MAX_FRAMES = 512
+GESTURE_BATCH_MAX = 256
+GESTURE_BATCH_WAIT_S = 0.004
+GESTURE_WORKERS = int(os.environ.get("GESTURE_WORKERS", "2"))
+HAND_LANDMARKS = 21
+
+def hand_features(landmarks: np.ndarray) -> np.ndarray:
+    """Pose features for (n, 21, 3) hand landmarks (MediaPipe order).
+
+    Landmarks are translated to the wrist, rotated so the wrist -> middle-finger MCP
+    axis points up, and scaled by that length, so features ignore where the hand
+    is in the frame, its roll and its distance from the camera.
+    """
+    points = landmarks - landmarks[:, :1, :]
+    axis = points[:, 9, :2]
+    scale = np.maximum(np.linalg.norm(axis, axis=1), 1e-6)
+    angle = np.arctan2(axis[:, 0], -axis[:, 1])
+    cos, sin = np.cos(angle), np.sin(angle)
+    x, y = points[:, :, 0], points[:, :, 1]
+    rotated = np.stack([x * cos[:, None] + y * sin[:, None], y * cos[:, None] - x * sin[:, None], points[:, :, 2]], axis=2)
+    return (rotated / scale[:, None, None]).reshape(len(points), -1)
+
+def synthetic_hand_prototypes(samples_per_gesture: int = 40, seed: int = 7) -> Tuple[np.ndarray, np.ndarray]:
+    """Built-in training poses used when no GESTURE_MODEL_PATH is configured"""
+    mcp = {"index": (0.25, -0.95), "middle": (0.0, -1.0), "ring": (-0.22, -0.95), "pinky": (-0.42, -0.85)}
+    thumbs = {
+        "out": [(0.35, -0.25, 0), (0.55, -0.45, 0), (0.75, -0.6, 0), (0.9, -0.72, 0)],
+        "up": [(0.35, -0.25, 0), (0.45, -0.5, 0), (0.5, -0.85, 0), (0.55, -1.15, 0)],
+        "side": [(0.35, -0.25, 0), (0.45, -0.45, -0.1), (0.35, -0.7, -0.15), (0.2, -0.8, -0.15)],
+        "tucked": [(0.3, -0.25, 0), (0.3, -0.5, -0.2), (0.1, -0.65, -0.2), (-0.05, -0.7, -0.2)],
+    }
+
+    def finger(name: str, extended: bool):
+        bx, by = mcp[name]
+        if extended:
+            return [(bx, by, 0), (bx * 1.15, by - 0.45, 0), (bx * 1.25, by - 0.75, 0), (bx * 1.3, by - 1.0, 0)]
+        return [(bx, by, 0), (bx, by - 0.3, -0.2), (bx, by - 0.1, -0.35), (bx, by + 0.05, -0.3)]
+
+    poses = {
+        "open_palm": ("out", {"index", "middle", "ring", "pinky"}),
+        "peace_sign": ("side", {"index", "middle"}),
+        "pointing": ("side", {"index"}),
+        "fist": ("side", set()),
+        "help_gesture": ("tucked", set()),
+        "thumbs_up": ("up", set()),
+    }
+    rng = np.random.default_rng(seed)
+    features, labels = [], []
+    for label, (thumb, extended) in poses.items():
+        base = np.array([(0.0, 0.0, 0.0)] + thumbs[thumb] + [p for f in mcp for p in finger(f, f in extended)])
+        hands = np.repeat(base[None], samples_per_gesture, axis=0)
+        hands[:, :, :2] *= rng.uniform(0.8, 1.2, size=(samples_per_gesture, 1, 2))
+        hands += rng.normal(0.0, 0.03, size=hands.shape)
+        hands[samples_per_gesture // 2:, :, 0] *= -1  # mirrored half for the other hand
+        features.append(hand_features(hands))
+        labels += [label] * samples_per_gesture
+    return np.vstack(features), np.array(labels)
+
+class GestureModel:
+    """k-nearest-neighbour classifier over normalized hand-landmark features"""
+
+    def __init__(self, features: np.ndarray, labels: np.ndarray, k: int = GESTURE_K):
+        self.features = features.astype(np.float32)
+        self.sq_norms = (self.features ** 2).sum(axis=1)
+        self.classes, self.label_ids = np.unique(labels, return_inverse=True)
+        self.k = min(k, len(self.features))
+
+    @classmethod
+    def load(cls, path: Optional[str] = GESTURE_MODEL_PATH) -> "GestureModel":
+        if path:
+            data = np.load(path)
+            return cls(data["features"], data["labels"])
+        return cls(*synthetic_hand_prototypes())
+
+    def predict(self, features: np.ndarray) -> Tuple[List[str], np.ndarray]:
+        x = features.astype(np.float32)
+        sq_dist = (x ** 2).sum(axis=1)[:, None] + self.sq_norms[None, :] - 2.0 * x @ self.features.T
+        nearest = np.argpartition(sq_dist, self.k - 1, axis=1)[:, :self.k]
+        distances = np.sqrt(np.maximum(np.take_along_axis(sq_dist, nearest, axis=1), 0.0))
+        votes = np.zeros((len(x), len(self.classes)))
+        np.add.at(votes, (np.arange(len(x))[:, None], self.label_ids[nearest]), 1.0)
+        winners = votes.argmax(axis=1)
+        closeness = np.clip(1.0 - distances.mean(axis=1) / GESTURE_REJECT_DISTANCE, 0.0, 1.0)
+        confidence = votes.max(axis=1) / self.k * np.sqrt(closeness)
+        labels = [str(self.classes[w]) if c > 0 else "unknown" for w, c in zip(winners, closeness)]
+        return labels, confidence
+
+class GestureBatcher:
+    """Micro-batches concurrent classification requests into single model calls.
+
+    The first waiting request opens a GESTURE_BATCH_WAIT_S window; everything that
+    arrives within it (up to GESTURE_BATCH_MAX frames) is classified together in the
+    worker pool, off the event loop.
+    """
+
+    def __init__(self, model: GestureModel):
+        self.model = model
+        self.queue: asyncio.Queue = asyncio.Queue()
+        self.pool = ThreadPoolExecutor(max_workers=GESTURE_WORKERS, thread_name_prefix="gesture")
+        self._task: Optional[asyncio.Task] = None
+
+    async def classify(self, features: np.ndarray) -> Tuple[List[str], np.ndarray]:
+        future = asyncio.get_running_loop().create_future()
+        await self.queue.put((features, future))
+        return await future
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self.queue.get()]
+            await asyncio.sleep(GESTURE_BATCH_WAIT_S)
+            rows = len(batch[0][0])
+            while rows < GESTURE_BATCH_MAX and not self.queue.empty():
+                batch.append(self.queue.get_nowait())
+                rows += len(batch[-1][0])
+            try:
+                labels, confidence = await loop.run_in_executor(self.pool, self.model.predict, np.vstack([f for f, _ in batch]))
+            except Exception as e:
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+            offset = 0
+            for features, future in batch:
+                if not future.done():
+                    future.set_result((labels[offset:offset + len(features)], confidence[offset:offset + len(features)]))
+                offset += len(features)
+
+    def start(self):
+        if self._task is None:
+            self.predict_warm()
+            self._task = asyncio.create_task(self._run())
+
+    def predict_warm(self):
+        self.model.predict(np.zeros((1, HAND_LANDMARKS * 3)))
+
+    def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        self.pool.shutdown(wait=False)
+
+gesture_batcher: Optional[GestureBatcher] = None
+
+def load_gesture_model():
+    global gesture_batcher
+    try:
+        model = GestureModel.load()
+    except Exception as e:
+        logger.error(f"Failed to load gesture model from {GESTURE_MODEL_PATH}, using built-in poses: {e}")
+        model = GestureModel.load(None)
+    gesture_batcher = GestureBatcher(model)
+    gesture_batcher.start()
+
 @api_router.post("/gesture-detection")
 async def detect_gesture(gesture_data: Dict[str, Any]):
-    """Process gesture detection data"""
+    """Classify hand landmarks: {"landmarks": [[x, y, z] x 21]} or {"frames": [{"landmarks": ...}, ...]}"""
     
-    # Demo: Simulate gesture recognition
-    gesture_type = gesture_data.get("type", "unknown")
-    confidence = random.uniform(0.6, 0.95)
+    frames = gesture_data.get("frames")
+    single = frames is None
+    if single:
+        frames = [gesture_data]
+    if not isinstance(frames, list) or not frames or len(frames) > GESTURE_MAX_FRAMES:
+        raise HTTPException(status_code=422, detail=f"Send 1-{GESTURE_MAX_FRAMES} frames of hand landmarks")
+    try:
+        landmarks = np.array([frame["landmarks"] for frame in frames], dtype=np.float64)
+    except (KeyError, TypeError, ValueError):
+        raise HTTPException(status_code=422, detail="Each frame needs 21 [x, y, z] hand landmarks")
+    if landmarks.shape[1:] != (HAND_LANDMARKS, 3):
+        raise HTTPException(status_code=422, detail="Each frame needs 21 [x, y, z] hand landmarks")
+    if gesture_batcher is None:
+        raise HTTPException(status_code=503, detail="Gesture model is still loading")
     
-    recognized_gestures = ["peace_sign", "open_palm", "help_gesture"]
-    is_sos_gesture = gesture_type in recognized_gestures and confidence > 0.8
+    labels, confidence = await gesture_batcher.classify(hand_features(landmarks))
+    results = []
+    for label, score in zip(labels, confidence.tolist()):
+        is_sos_gesture = label in GESTURE_SOS_GESTURES and score > GESTURE_SOS_CONFIDENCE
+        results.append({
+            "gesture_detected": label,
+            "confidence": score,
+            "sos_triggered": is_sos_gesture,
+            "message": f"Gesture {'recognized' if is_sos_gesture else 'detected'}: {label}"
+        })
     
-    return {
-        "gesture_detected": gesture_type,
-        "confidence": confidence,
-        "sos_triggered": is_sos_gesture,
-        "message": f"Gesture {'recognized' if is_sos_gesture else 'detected'}: {gesture_type}"
-    }
+    if single:
+        return results[0]
+    return {"results": results, "sos_triggered": any(r["sos_triggered"] for r in results)}
 
 @api_router.post("/shake-detection")
 async def process_shake_pattern(shake_data: Dict[str, Any]):
@@ -240,104 +2228,1660 @@ async def process_shake_pattern(shake_data: Dict[str, Any]):
         "message": "Emergency shake pattern detected" if is_emergency_shake else "Normal movement detected"
     }
 
+SHAKE_RECORD_HEADER = struct.Struct("<16sHI")  # device_id (utf-8, NUL padded), sample_rate Hz, sample count
+SHAKE_RATE_HZ = 50
+SHAKE_WINDOW = 128  # samples per window after resampling (~2.5 s)
+SHAKE_MAX_SAMPLES = 4096  # per window, before resampling
+SHAKE_MAX_WINDOWS = 2000
+SHAKE_MAX_BODY_BYTES = SHAKE_MAX_WINDOWS * (SHAKE_RECORD_HEADER.size + SHAKE_MAX_SAMPLES * 12)
+SHAKE_PEAK_MS2 = 8.0  # peak height above the window mean, m/s^2
+SHAKE_MIN_PEAKS = 5
+SHAKE_BAND_HZ = (1.5, 6.0)
+SHAKE_MIN_BAND_RATIO = 0.5
+SHAKE_MAX_IRREGULARITY = 0.45  # std / mean of the intervals between peaks
+
+def parse_shake_windows(body: bytes) -> Tuple[List[str], np.ndarray]:
+    """Decode packed records into device ids and a (windows, SHAKE_WINDOW) signal matrix.
+
+    Each record is SHAKE_RECORD_HEADER followed by sample_count x,y,z float32
+    little-endian triples. A shake is back-and-forth motion along one axis, so each
+    window is reduced to its highest-variance axis with gravity removed, then
+    resampled to SHAKE_RATE_HZ so the whole batch can be analysed as one matrix.
+    """
+    device_ids, signals = [], []
+    offset = 0
+    while offset < len(body):
+        if len(device_ids) >= SHAKE_MAX_WINDOWS:
+            raise ValueError(f"At most {SHAKE_MAX_WINDOWS} windows per request")
+        if offset + SHAKE_RECORD_HEADER.size > len(body):
+            raise ValueError("Truncated record header")
+        raw_id, rate, count = SHAKE_RECORD_HEADER.unpack_from(body, offset)
+        offset += SHAKE_RECORD_HEADER.size
+        if not rate or not 2 <= count <= SHAKE_MAX_SAMPLES or offset + count * 12 > len(body):
+            raise ValueError("Invalid sample_rate or sample count")
+        xyz = np.frombuffer(body, dtype="<f4", count=count * 3, offset=offset).reshape(count, 3)
+        offset += count * 12
+        centered = xyz - xyz.mean(axis=0)
+        axis_signal = centered[:, np.argmax((centered ** 2).sum(axis=0))].astype(np.float64)
+        # Resample onto the common grid, cropping or zero-extending to SHAKE_WINDOW samples
+        target_t = np.arange(SHAKE_WINDOW) / SHAKE_RATE_HZ
+        source_t = np.arange(count) / rate
+        signals.append(np.interp(target_t, source_t, axis_signal, right=np.nan))
+        device_ids.append(raw_id.rstrip(b"\0").decode("utf-8", "replace"))
+    if not device_ids:
+        raise ValueError("No windows in request")
+    return device_ids, np.vstack(signals)
+
+def detect_sos_shakes(signals: np.ndarray) -> Dict[str, np.ndarray]:
+    """Vectorized SOS shake-rhythm detection over a (windows, samples) matrix.
+
+    A window matches when it holds at least SHAKE_MIN_PEAKS strong acceleration
+    peaks, most of its motion energy is in the deliberate-shake band, and the peaks
+    are evenly spaced (a rhythm rather than a drop or a bump).
+    """
+    valid = ~np.isnan(signals)
+    means = np.nanmean(signals, axis=1, keepdims=True)
+    signal = np.where(valid, signals - means, 0.0)
+    
+    power = np.abs(np.fft.rfft(signal * np.hanning(signal.shape[1]), axis=1)) ** 2
+    freqs = np.fft.rfftfreq(signal.shape[1], d=1.0 / SHAKE_RATE_HZ)
+    in_band = (freqs >= SHAKE_BAND_HZ[0]) & (freqs <= SHAKE_BAND_HZ[1])
+    band_ratio = power[:, in_band].sum(axis=1) / np.maximum(power[:, 1:].sum(axis=1), 1e-12)
+    dominant_hz = freqs[1:][np.argmax(power[:, 1:], axis=1)]
+    
+    middle = signal[:, 1:-1]
+    peaks = (middle > signal[:, :-2]) & (middle >= signal[:, 2:]) & (middle > SHAKE_PEAK_MS2)
+    peak_counts = peaks.sum(axis=1)
+    rows, cols = np.nonzero(peaks)
+    same_window = rows[1:] == rows[:-1]
+    gaps, gap_rows = np.diff(cols)[same_window].astype(np.float64), rows[1:][same_window]
+    windows = len(signal)
+    gap_n = np.bincount(gap_rows, minlength=windows)
+    gap_mean = np.bincount(gap_rows, weights=gaps, minlength=windows) / np.maximum(gap_n, 1)
+    gap_var = np.bincount(gap_rows, weights=gaps ** 2, minlength=windows) / np.maximum(gap_n, 1) - gap_mean ** 2
+    irregularity = np.where(gap_n > 0, np.sqrt(np.maximum(gap_var, 0.0)) / np.maximum(gap_mean, 1e-9), np.inf)
+    
+    triggered = (peak_counts >= SHAKE_MIN_PEAKS) & (band_ratio >= SHAKE_MIN_BAND_RATIO) & (irregularity <= SHAKE_MAX_IRREGULARITY)
+    return {
+        "sos_triggered": triggered,
+        "peaks": peak_counts,
+        "dominant_hz": dominant_hz,
+        "band_ratio": band_ratio,
+        "irregularity": irregularity,
+        "peak_ms2": np.abs(signal).max(axis=1),
+    }
+
+async def read_body_limited(request: Request, limit: int) -> bytes:
+    """Request body, refused with 413 once it is known or seen to exceed limit bytes"""
+    too_large = HTTPException(status_code=413, detail=f"Request body exceeds {limit} bytes")
+    try:
+        declared = int(request.headers.get("content-length", "0"))
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid Content-Length")
+    if declared > limit:
+        raise too_large
+    body = bytearray()
+    async for data in request.stream():
+        body += data
+        if len(body) > limit:
+            raise too_large
+    return bytes(body)
+
+@api_router.post("/shake-detection/batch")
+async def detect_shake_batch(request: Request):
+    """Detect the SOS shake rhythm in packed raw accelerometer windows from many devices"""
+    body = await read_body_limited(request, SHAKE_MAX_BODY_BYTES)
+    try:
+        device_ids, signals = parse_shake_windows(body)
+    except (ValueError, struct.error) as e:
+        raise HTTPException(status_code=400, detail=f"Invalid accelerometer batch: {e}")
+    
+    result = await asyncio.to_thread(detect_sos_shakes, signals)
+    columns = {k: v.tolist() for k, v in result.items()}
+    return ORJSONResponse({"results": [
+        {
+            "device_id": device_id,
+            "sos_triggered": columns["sos_triggered"][i],
+            "peaks": columns["peaks"][i],
+            "dominant_hz": round(columns["dominant_hz"][i], 2),
+            "band_ratio": round(columns["band_ratio"][i], 3),
+            "shake_intensity": round(columns["peak_ms2"][i], 2),
+        }
+        for i, device_id in enumerate(device_ids)
+    ]})
+
 # Routes for Feature 5: Route Deviation Detection
+ACTIVE_ROUTE_CACHE_SIZE = int(os.environ.get("ACTIVE_ROUTE_CACHE_SIZE", "100000"))
+ROUTE_SEGMENT_CELL_M = 250.0  # minimum segment-index cell size in meters
+LOCATION_FLUSH_INTERVAL = float(os.environ.get("LOCATION_FLUSH_INTERVAL", "1.0"))  # seconds
+BULK_LOCATION_MAX_FIXES = 10000
+ROUTE_BATCH_CHUNK = 256  # fixes per distance matrix
+ROUTE_IDLE_TTL_S = float(os.environ.get("ROUTE_IDLE_TTL_S", "1800"))  # no fixes for this long expires a route
+ROUTE_ARCHIVE_INTERVAL_S = float(os.environ.get("ROUTE_ARCHIVE_INTERVAL_S", "30"))
+ROUTE_ARCHIVE_BATCH = 1000
+TRACE_PRECISION = 1e5  # polyline coordinate precision, about 1 m
+TRACE_SEGMENT_FIXES = int(os.environ.get("TRACE_SEGMENT_FIXES", "64"))  # fixes per appended segment
+TRACE_SEGMENT_MAX_AGE_S = float(os.environ.get("TRACE_SEGMENT_MAX_AGE_S", "15"))
+TRACE_CHUNK_FIXES = 2000  # fixes per location_traces document
+TRACE_FLUSH_MAX_ATTEMPTS = 5  # flushes a route's fixes survive on transient database errors
+TRACE_REPLAY_BATCH = 16  # chunks per cursor batch while streaming a replay
+
+class RouteTrack:
+    """Planned route pre-projected to local meters with a grid index over its segments.
+
+    Coordinates are projected once (equirectangular around the route's first vertex,
+    accurate to well under a meter at city scale), so a deviation check is a grid
+    lookup plus point-to-segment distances over the few segments near the position.
+    """
+
+    def __init__(self, route: Dict[str, Any]):
+        self.id = route["id"]
+        self.status = route.get("status", "active")
+        self.user_id = route.get("user_id")
+        self.touched = False  # received fixes since the archiver last recorded last_seen_at
+        self.deviation_threshold = float(route.get("deviation_threshold", 500))
+        points = route["planned_route"] or [route["current_location"]]
+        self.lat0, self.lng0 = points[0]["lat"], points[0]["lng"]
+        self.cos_lat0 = math.cos(math.radians(self.lat0))
+        xs, ys = self.project(np.array([p["lat"] for p in points]), np.array([p["lng"] for p in points]))
+        if len(points) == 1:
+            xs, ys = np.repeat(xs, 2), np.repeat(ys, 2)
+        self.ax, self.ay, self.bx, self.by = xs[:-1], ys[:-1], xs[1:], ys[1:]
+        self.cell_m = max(self.deviation_threshold, ROUTE_SEGMENT_CELL_M)
+        self.cells: Dict[Tuple[int, int], List[int]] = {}
+        for i in range(len(self.ax)):
+            x0, x1 = sorted((self.ax[i], self.bx[i]))
+            y0, y1 = sorted((self.ay[i], self.by[i]))
+            for cx in range(math.floor(x0 / self.cell_m), math.floor(x1 / self.cell_m) + 1):
+                for cy in range(math.floor(y0 / self.cell_m), math.floor(y1 / self.cell_m) + 1):
+                    self.cells.setdefault((cx, cy), []).append(i)
+
+    def project(self, lat, lng):
+        x = np.radians(lng - self.lng0) * EARTH_RADIUS_M * self.cos_lat0
+        y = np.radians(lat - self.lat0) * EARTH_RADIUS_M
+        return x, y
+
+    def _distances(self, x: float, y: float, segments) -> np.ndarray:
+        ax, ay, bx, by = self.ax[segments], self.ay[segments], self.bx[segments], self.by[segments]
+        dx, dy = bx - ax, by - ay
+        length_sq = dx * dx + dy * dy
+        t = np.clip(((x - ax) * dx + (y - ay) * dy) / np.maximum(length_sq, 1e-9), 0.0, 1.0)
+        return np.hypot(ax + t * dx - x, ay + t * dy - y)
+
+    def distance_to_route(self, lat: float, lng: float) -> float:
+        """Distance in meters from a position to the nearest planned-route segment"""
+        x, y = self.project(lat, lng)
+        cx, cy = math.floor(x / self.cell_m), math.floor(y / self.cell_m)
+        # Cells are at least deviation_threshold wide, so every segment within the
+        # threshold is registered in the 3x3 neighbourhood of the position's cell
+        nearby = {i for dx in (-1, 0, 1) for dy in (-1, 0, 1) for i in self.cells.get((cx + dx, cy + dy), ())}
+        if nearby:
+            distance = float(self._distances(x, y, np.fromiter(nearby, dtype=np.int64)).min())
+            if distance <= self.deviation_threshold:
+                return distance
+        # Off route: one vectorized pass over all segments gives the exact distance
+        return float(self._distances(x, y, slice(None)).min())
+
+    @property
+    def active(self) -> bool:
+        return self.status == "active"
+
+    def touch(self):
+        self.touched = True
+
+    def distances_to_route(self, lats: np.ndarray, lngs: np.ndarray) -> np.ndarray:
+        """Vectorized distance_to_route for a batch of consecutive fixes"""
+        xs, ys = self.project(lats, lngs)
+        result = np.empty(len(xs))
+        for start in range(0, len(xs), ROUTE_BATCH_CHUNK):
+            px, py = xs[start:start + ROUTE_BATCH_CHUNK], ys[start:start + ROUTE_BATCH_CHUNK]
+            # Consecutive GPS fixes are close together, so one neighbourhood serves the chunk
+            cx0, cx1 = math.floor(px.min() / self.cell_m) - 1, math.floor(px.max() / self.cell_m) + 1
+            cy0, cy1 = math.floor(py.min() / self.cell_m) - 1, math.floor(py.max() / self.cell_m) + 1
+            if (cx1 - cx0 + 1) * (cy1 - cy0 + 1) > len(self.cells):
+                segments = np.arange(len(self.ax))
+            else:
+                segments = np.fromiter({i for cx in range(cx0, cx1 + 1) for cy in range(cy0, cy1 + 1)
+                                        for i in self.cells.get((cx, cy), ())}, dtype=np.int64)
+            distances = np.full(len(px), np.inf)
+            if segments.size:
+                distances = self._distances(px[:, None], py[:, None], segments).min(axis=1)
+            off_route = np.flatnonzero(distances > self.deviation_threshold)
+            if off_route.size:
+                distances[off_route] = self._distances(px[off_route, None], py[off_route, None], slice(None)).min(axis=1)
+            result[start:start + len(px)] = distances
+        return result
+
+class ActiveRouteCache:
+    """LRU of RouteTrack objects so location updates avoid a database round trip"""
+
+    def __init__(self, max_routes: int = ACTIVE_ROUTE_CACHE_SIZE):
+        self.max_routes = max_routes
+        self.routes: "OrderedDict[str, RouteTrack]" = OrderedDict()
+
+    def put(self, route: Dict[str, Any]) -> RouteTrack:
+        track = RouteTrack(route)
+        self.routes[track.id] = track
+        self.routes.move_to_end(track.id)
+        while len(self.routes) > self.max_routes:
+            self.routes.popitem(last=False)
+        return track
+
+    async def get(self, route_id: str) -> Optional[RouteTrack]:
+        """Live track for a route; stopped, completed and expired routes are never returned"""
+        track = self.routes.get(route_id)
+        if track is not None:
+            self.routes.move_to_end(route_id)
+            return track
+        # Cold miss (e.g. after a restart): load once, then serve from memory
+        route = await db.active_routes.find_one({"id": route_id, "is_active": True}, {"_id": 0})
+        return self.put(route) if route else None
+
+    def touched_ids(self) -> List[str]:
+        ids = [route_id for route_id, track in self.routes.items() if track.touched]
+        for route_id in ids:
+            self.routes[route_id].touched = False
+        return ids
+
+    def evict(self, route_id: str):
+        self.routes.pop(route_id, None)
+
+    def end(self, route_id: str, status: str):
+        """Evict an ended route; open live channels holding the track see the new status"""
+        track = self.routes.pop(route_id, None)
+        if track is not None:
+            track.status = status
+
+active_routes_cache = ActiveRouteCache()
+
+def location_event(verdict: Dict[str, Any], timestamp: datetime, origin: Optional[str] = None) -> Dict[str, Any]:
+    return {
+        "event": "location",
+        "route_id": verdict["route_id"],
+        "location": verdict["current_location"],
+        "timestamp": timestamp.isoformat(),
+        "deviation_detected": verdict["deviation_detected"],
+        "deviation_distance_m": verdict["deviation_distance_m"],
+        "origin": origin,
+    }
+
+def check_route_deviation(track: RouteTrack, current_location: Dict[str, float]) -> Dict[str, Any]:
+    """Deviation verdict for one position against a cached route"""
+    distance = track.distance_to_route(current_location["lat"], current_location["lng"])
+    deviation_detected = distance > track.deviation_threshold
+    return {
+        "route_id": track.id,
+        "current_location": current_location,
+        "deviation_detected": deviation_detected,
+        "deviation_distance_m": round(distance, 1),
+        "message": "Route deviation detected! Are you safe?" if deviation_detected else "On track",
+        "requires_response": deviation_detected
+    }
+
+def _polyline_append(value: int, out: List[str]):
+    value = ~(value << 1) if value < 0 else value << 1
+    while value >= 0x20:
+        out.append(chr((0x20 | (value & 0x1f)) + 63))
+        value >>= 5
+    out.append(chr(value + 63))
+
+def epoch_ms(at: datetime) -> int:
+    return int(as_utc(at).replace(tzinfo=timezone.utc).timestamp() * 1000)
+
+def encode_trace(fixes: List[Dict[str, Any]]) -> str:
+    """Polyline-encode time-ordered fixes.
+
+    Each fix is three zigzag varints in the polyline alphabet: the millisecond delta
+    (shifted left, with the deviation flag in the low bit) and the lat/lng deltas at
+    TRACE_PRECISION. The first fix is a delta from zero, so a segment stands alone.
+    """
+    out: List[str] = []
+    prev_t = prev_lat = prev_lng = 0
+    for fix in fixes:
+        t = epoch_ms(fix["timestamp"])
+        lat, lng = round(fix["lat"] * TRACE_PRECISION), round(fix["lng"] * TRACE_PRECISION)
+        _polyline_append((t - prev_t) * 2 + bool(fix["deviation_detected"]), out)
+        _polyline_append(lat - prev_lat, out)
+        _polyline_append(lng - prev_lng, out)
+        prev_t, prev_lat, prev_lng = t, lat, lng
+    return "".join(out)
+
+def decode_trace(encoded: str) -> Iterator[Tuple[int, float, float, bool]]:
+    """Yield (epoch ms, lat, lng, deviation_detected) from an encode_trace segment"""
+    values = [0, 0, 0]
+    deviated = False
+    field = shift = chunk = 0
+    for char in encoded:
+        byte = ord(char) - 63
+        chunk |= (byte & 0x1f) << shift
+        shift += 5
+        if byte >= 0x20:
+            continue
+        delta = ~(chunk >> 1) if chunk & 1 else chunk >> 1
+        chunk = shift = 0
+        if field == 0:
+            # The deviation flag belongs to this fix only; just the time part is a delta
+            deviated = bool(delta & 1)
+            delta >>= 1
+        values[field] += delta
+        field += 1
+        if field == 3:
+            field = 0
+            yield values[0], values[1] / TRACE_PRECISION, values[2] / TRACE_PRECISION, deviated
+
+class LocationWriteBuffer:
+    """Write-behind buffer that stores location history as compact per-route traces.
+
+    Fixes are held per route and appended to the route's open location_traces chunk
+    as one polyline-encoded segment once TRACE_SEGMENT_FIXES accumulate or the oldest
+    has waited TRACE_SEGMENT_MAX_AGE_S (checked every LOCATION_FLUSH_INTERVAL seconds).
+    A chunk takes at most TRACE_CHUNK_FIXES fixes; when a segment does not fit the
+    chunk is closed and a new one is started, so chunks stay in time order.
+
+    Each flush is a single unordered bulk_write for every due route. On a transient
+    database error the fixes are requeued for up to TRACE_FLUSH_MAX_ATTEMPTS flushes;
+    a write that failed mid-flight may then be stored twice.
+    """
+
+    def __init__(self, flush_interval: float = LOCATION_FLUSH_INTERVAL, segment_fixes: int = TRACE_SEGMENT_FIXES,
+                 max_age_s: float = TRACE_SEGMENT_MAX_AGE_S, chunk_fixes: int = TRACE_CHUNK_FIXES):
+        self.flush_interval = flush_interval
+        self.segment_fixes = segment_fixes
+        self.max_age_s = max_age_s
+        self.chunk_fixes = chunk_fixes
+        self.pending: Dict[str, List[Dict[str, Any]]] = {}
+        self.pending_since: Dict[str, float] = {}
+        self.pending_count = 0
+        self.attempts: Dict[str, int] = {}
+        self._flush_lock = asyncio.Lock()
+        self._task: Optional[asyncio.Task] = None
+
+    def stage(self, fixes: List[Dict[str, Any]]):
+        """Queue fixes for their routes; timestamps are normalized to aware UTC so any mix sorts"""
+        now = time.monotonic()
+        for fix in fixes:
+            fix = dict(fix, timestamp=as_utc(fix["timestamp"]).replace(tzinfo=timezone.utc))
+            route_fixes = self.pending.setdefault(fix["route_id"], [])
+            if not route_fixes:
+                self.pending_since[fix["route_id"]] = now
+            route_fixes.append(fix)
+        self.pending_count += len(fixes)
+
+    def _operations(self, route_id: str, fixes: List[Dict[str, Any]]) -> List[Any]:
+        """Write operations appending a route's fixes to its trace"""
+        fixes.sort(key=lambda fix: fix["timestamp"])
+        pieces = [fixes[start:start + self.chunk_fixes] for start in range(0, len(fixes), self.chunk_fixes)]
+        spans = [(as_utc(piece[0]["timestamp"]), as_utc(piece[-1]["timestamp"])) for piece in pieces]
+        if len(pieces) == 1:
+            # Append to the open chunk if the segment fits, otherwise start a new one (closed after the write)
+            (first, last), = spans
+            return [UpdateOne(
+                {"route_id": route_id, "closed": False, "count": {"$lte": self.chunk_fixes - len(fixes)}},
+                {"$push": {"segments": encode_trace(fixes)}, "$inc": {"count": len(fixes)},
+                 "$min": {"start": first}, "$max": {"end": last}},
+                upsert=True,
+            )]
+        # More than a chunk of fixes: close the open chunk and write whole new ones
+        operations: List[Any] = [UpdateMany({"route_id": route_id, "closed": False, "start": {"$lt": spans[0][0]}},
+                                            {"$set": {"closed": True}})]
+        for i, (piece, (first, last)) in enumerate(zip(pieces, spans)):
+            operations.append(InsertOne({
+                "route_id": route_id, "start": first, "end": last, "count": len(piece),
+                "closed": i < len(pieces) - 1, "segments": [encode_trace(piece)],
+            }))
+        return operations
+
+    def _requeue(self, batches: List[Tuple[str, List[Dict[str, Any]], float]], error: Exception):
+        dropped = 0
+        for route_id, fixes, since in batches:
+            self.attempts[route_id] = self.attempts.get(route_id, 0) + 1
+            if self.attempts[route_id] >= TRACE_FLUSH_MAX_ATTEMPTS:
+                del self.attempts[route_id]
+                dropped += len(fixes)
+                continue
+            self.pending[route_id] = fixes + self.pending.get(route_id, [])
+            self.pending_since[route_id] = min(since, self.pending_since.get(route_id, since))
+            self.pending_count += len(fixes)
+        logger.warning(f"Location trace flush failed, requeued {sum(len(f) for _, f, _ in batches) - dropped} fixes: {error}")
+        if dropped:
+            logger.error(f"Dropped {dropped} location fixes after {TRACE_FLUSH_MAX_ATTEMPTS} failed flushes")
+
+    async def flush(self, force: bool = False):
+        async with self._flush_lock:
+            now = time.monotonic()
+            due = [route_id for route_id, fixes in self.pending.items()
+                   if force or len(fixes) >= self.segment_fixes or now - self.pending_since[route_id] >= self.max_age_s]
+            if not due:
+                return
+            batches, operations, owners = [], [], []
+            for route_id in due:
+                fixes = self.pending.pop(route_id)
+                self.pending_count -= len(fixes)
+                batches.append((route_id, fixes, self.pending_since.pop(route_id)))
+                route_operations = self._operations(route_id, fixes)
+                operations += route_operations
+                owners += [route_id] * len(route_operations)
+            try:
+                result = await db.location_traces.bulk_write(operations, ordered=False)
+                upserted = result.upserted_ids
+            except (AutoReconnect, NetworkTimeout) as e:
+                self._requeue(batches, e)
+                return
+            except BulkWriteError as e:
+                errors = e.details.get("writeErrors", [])
+                if errors:
+                    failed = {owners[error["index"]] for error in errors}
+                    logger.error(f"Dropped location fixes for {len(failed)} route(s): {errors[0].get('errmsg')}")
+                upserted = {doc["index"]: doc["_id"] for doc in e.details.get("upserted", [])}
+            except Exception as e:
+                logger.error(f"Dropped {sum(len(f) for _, f, _ in batches)} location fixes: {e}")
+                return
+            for route_id in due:
+                self.attempts.pop(route_id, None)
+            # Close the chunk each new one replaced
+            newest = {owners[index]: chunk_id for index, chunk_id in sorted(upserted.items())}
+            if newest:
+                try:
+                    await db.location_traces.bulk_write([
+                        UpdateMany({"route_id": route_id, "closed": False, "_id": {"$ne": chunk_id}}, {"$set": {"closed": True}})
+                        for route_id, chunk_id in newest.items()
+                    ], ordered=False)
+                except Exception as e:
+                    logger.error(f"Could not close full location trace chunks: {e}")
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            await self.flush()
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        await self.flush(force=True)
+
+location_buffer = LocationWriteBuffer()
+
+class RouteArchiver:
+    """Background lifecycle sweep that keeps active_routes down to live sessions.
+
+    Every ROUTE_ARCHIVE_INTERVAL_S it records last_seen_at for routes that received
+    fixes (one update_many instead of a write per fix), expires routes idle for
+    longer than ROUTE_IDLE_TTL_S, and moves stopped, completed and expired routes
+    to archived_routes in batches of ROUTE_ARCHIVE_BATCH.
+    """
+
+    def __init__(self, interval_s: float = ROUTE_ARCHIVE_INTERVAL_S, idle_ttl_s: float = ROUTE_IDLE_TTL_S,
+                 batch: int = ROUTE_ARCHIVE_BATCH):
+        self.interval_s = interval_s
+        self.idle_ttl_s = idle_ttl_s
+        self.batch = batch
+        self._task: Optional[asyncio.Task] = None
+
+    async def record_last_seen(self, now: datetime):
+        touched = active_routes_cache.touched_ids()
+        for start in range(0, len(touched), self.batch):
+            ids = touched[start:start + self.batch]
+            await db.active_routes.update_many({"id": {"$in": ids}, "is_active": True}, {"$max": {"last_seen_at": now}})
+            # Routes ended by another worker are dropped from this worker's cache here
+            live = {doc["id"] for doc in await db.active_routes.find(
+                {"id": {"$in": ids}, "is_active": True}, {"_id": 0, "id": 1}).to_list(len(ids))}
+            for route_id in ids:
+                if route_id not in live:
+                    active_routes_cache.end(route_id, "ended")
+
+    async def expire_idle(self, now: datetime) -> int:
+        cutoff = now - timedelta(seconds=self.idle_ttl_s)
+        # Routes stored before the lifecycle fields existed have no last_seen_at and are expired too
+        idle = {"is_active": True, "$or": [{"last_seen_at": {"$lt": cutoff}}, {"last_seen_at": {"$exists": False}}]}
+        expired = 0
+        while True:
+            ids = [doc["id"] for doc in await db.active_routes.find(idle, {"_id": 0, "id": 1}).to_list(self.batch)]
+            if not ids:
+                return expired
+            await db.active_routes.update_many(
+                {"id": {"$in": ids}, "is_active": True},
+                {"$set": {"is_active": False, "status": "expired", "ended_at": now}},
+            )
+            for route_id in ids:
+                active_routes_cache.end(route_id, "expired")
+                publish_route_ended(route_id, "expired")
+            expired += len(ids)
+
+    async def archive_ended(self, now: datetime) -> int:
+        archived = 0
+        while True:
+            routes = await db.active_routes.find({"is_active": False}, {"_id": 0}).to_list(self.batch)
+            if not routes:
+                return archived
+            for route in routes:
+                route["archived_at"] = now
+            try:
+                await db.archived_routes.insert_many(routes, ordered=False)
+            except BulkWriteError as e:
+                # Duplicates are routes archived by an earlier sweep that stopped before deleting them
+                if any(error.get("code") != 11000 for error in e.details.get("writeErrors", [])):
+                    raise
+            await db.active_routes.delete_many({"id": {"$in": [route["id"] for route in routes]}, "is_active": False})
+            archived += len(routes)
+
+    async def sweep(self):
+        now = datetime.utcnow()
+        await self.record_last_seen(now)
+        expired = await self.expire_idle(now)
+        archived = await self.archive_ended(now)
+        if expired or archived:
+            logger.info(f"Route lifecycle: expired {expired} idle route(s), archived {archived}")
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.interval_s)
+            try:
+                await self.sweep()
+            except Exception as e:
+                logger.error(f"Route archiver sweep failed: {e}")
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        try:
+            await self.record_last_seen(datetime.utcnow())
+        except Exception as e:
+            logger.error(f"Could not record route activity on shutdown: {e}")
+
+route_archiver = RouteArchiver()
+
 @api_router.post("/route-tracking")
 async def start_route_tracking(route_data: RouteData):
     """Start tracking a planned route"""
     
-    # Save route to database (demo)
+    # Save route to database and keep the projected route hot in memory
     route_dict = route_data.dict()
     await db.active_routes.insert_one(route_dict)
+    active_routes_cache.put(route_dict)
     
-    return {
-        "route_id": route_data.id,
-        "status": "tracking_started",
-        "message": "Route tracking activated. You will be alerted if you deviate from the planned path."
-    }
+    return ORJSONResponse(RouteTrackingReceipt(
+        route_id=route_data.id,
+        status="tracking_started",
+        message="Route tracking activated. You will be alerted if you deviate from the planned path."
+    ))
+
+def publish_route_ended(route_id: str, status: str):
+    event = {"event": "ended", "route_id": route_id, "status": status}
+    event_bus.publish(f"route:{route_id}", event)
+    event_bus.publish(ROUTE_LIFECYCLE_CHANNEL, event)
+
+async def sync_route_cache():
+    """Drop routes ended on other workers from this worker's cache"""
+    async with event_bus.subscribe(ROUTE_LIFECYCLE_CHANNEL) as events:
+        async for event in events:
+            if event.get("event") == "ended":
+                active_routes_cache.end(event["route_id"], event["status"])
+
+async def end_route(route_id: str, status: str) -> datetime:
+    """Mark a live route as ended; the archiver moves it to archived_routes later"""
+    ended_at = datetime.utcnow()
+    result = await db.active_routes.update_one(
+        {"id": route_id, "is_active": True},
+        {"$set": {"is_active": False, "status": status, "ended_at": ended_at, "last_seen_at": ended_at}},
+    )
+    if not result.matched_count:
+        route = await db.active_routes.find_one({"id": route_id}, {"_id": 0, "status": 1}) \
+            or await db.archived_routes.find_one({"id": route_id}, {"_id": 0, "status": 1})
+        if route is None:
+            raise HTTPException(status_code=404, detail="Route not found")
+        raise HTTPException(status_code=409, detail=f"Route already {route.get('status', 'ended')}")
+    active_routes_cache.end(route_id, status)
+    publish_route_ended(route_id, status)
+    return ended_at
+
+@api_router.post("/route-tracking/{route_id}/stop")
+async def stop_route_tracking(route_id: str):
+    """Stop tracking a route before reaching the destination"""
+    await end_route(route_id, "stopped")
+    return ORJSONResponse(RouteTrackingReceipt(
+        route_id=route_id,
+        status="tracking_stopped",
+        message="Route tracking stopped."
+    ))
+
+@api_router.post("/route-tracking/{route_id}/complete")
+async def complete_route_tracking(route_id: str):
+    """Finish tracking a route at its destination"""
+    await end_route(route_id, "completed")
+    return ORJSONResponse(RouteTrackingReceipt(
+        route_id=route_id,
+        status="tracking_completed",
+        message="Route tracking completed. Glad you arrived safely."
+    ))
 
 @api_router.post("/location-update")
 async def update_location(route_id: str, current_location: Dict[str, float]):
     """Update current location and check for deviation"""
     
-    # Get route from database (demo)
-    route = await db.active_routes.find_one({"id": route_id})
+    track = await active_routes_cache.get(route_id)
     
-    if not route:
+    if not track:
         raise HTTPException(status_code=404, detail="Route not found")
     
-    # Simple deviation calculation (demo)
-    planned_route = route["planned_route"]
-    deviation_detected = False
-    
-    # Check if current location is too far from planned route
-    for point in planned_route:
-        lat_diff = abs(point["lat"] - current_location["lat"])
-        lng_diff = abs(point["lng"] - current_location["lng"])
-        if lat_diff < 0.01 and lng_diff < 0.01:  # Within acceptable range
-            deviation_detected = False
-            break
-        else:
-            deviation_detected = True
+    track.touch()
+    verdict = check_route_deviation(track, current_location)
+    timestamp = datetime.utcnow()
+    location_buffer.stage([{
+        "route_id": route_id,
+        "lat": current_location["lat"],
+        "lng": current_location["lng"],
+        "timestamp": timestamp,
+        "deviation_detected": verdict["deviation_detected"],
+    }])
+    event_bus.publish(f"route:{route_id}", location_event(verdict, timestamp))
+    return verdict
+
+@api_router.post("/location-update/bulk")
+async def bulk_update_location(update: BulkLocationUpdate):
+    """Check a batch of timestamped fixes for one or more routes"""
+    if len(update.fixes) > BULK_LOCATION_MAX_FIXES:
+        raise HTTPException(status_code=413, detail=f"At most {BULK_LOCATION_MAX_FIXES} fixes per batch")
+    
+    fixes_by_route: Dict[str, List[int]] = {}
+    for i, fix in enumerate(update.fixes):
+        fixes_by_route.setdefault(fix.route_id, []).append(i)
+    
+    results: List[Optional[Dict[str, Any]]] = [None] * len(update.fixes)
+    staged = []
+    for route_id, positions in fixes_by_route.items():
+        track = await active_routes_cache.get(route_id)
+        if track is None:
+            for i in positions:
+                results[i] = {"route_id": route_id, "timestamp": update.fixes[i].timestamp, "error": "Route not found"}
+            continue
+        track.touch()
+        fixes = [update.fixes[i] for i in positions]
+        distances = track.distances_to_route(np.array([f.lat for f in fixes]), np.array([f.lng for f in fixes]))
+        # Subscribers only need the latest position of each route in the batch
+        latest = max(range(len(fixes)), key=lambda j: fixes[j].timestamp)
+        event_bus.publish(f"route:{route_id}", location_event({
+            "route_id": route_id,
+            "current_location": {"lat": fixes[latest].lat, "lng": fixes[latest].lng},
+            "deviation_detected": bool(distances[latest] > track.deviation_threshold),
+            "deviation_distance_m": round(float(distances[latest]), 1),
+        }, fixes[latest].timestamp))
+        for i, fix, distance in zip(positions, fixes, distances.tolist()):
+            deviation_detected = distance > track.deviation_threshold
+            results[i] = {
+                "route_id": route_id,
+                "timestamp": fix.timestamp,
+                "deviation_detected": deviation_detected,
+                "deviation_distance_m": round(distance, 1),
+            }
+            staged.append({
+                "route_id": route_id,
+                "lat": fix.lat,
+                "lng": fix.lng,
+                "timestamp": fix.timestamp,
+                "deviation_detected": deviation_detected,
+            })
+    location_buffer.stage(staged)
+    
+    # orjson encodes the datetimes directly; jsonable_encoder would dominate large batches
+    return ORJSONResponse({
+        "accepted": len(staged),
+        "rejected": len(results) - len(staged),
+        "results": results
+    })
+
+async def iter_trace(route_id: str, since: Optional[datetime], until: Optional[datetime]) -> AsyncIterator[bytes]:
+    """NDJSON lines for a route's stored trace, one chunk in memory at a time"""
+    query: Dict[str, Any] = {"route_id": route_id}
+    if since is not None:
+        query["end"] = {"$gte": since}
+    if until is not None:
+        query["start"] = {"$lte": until}
+    since_ms = epoch_ms(since) if since is not None else None
+    until_ms = epoch_ms(until) if until is not None else None
+    
+    def lines(fixes: Iterator[Tuple[int, float, float, bool]]) -> bytes:
+        out = []
+        for t, lat, lng, deviated in fixes:
+            if (since_ms is None or t >= since_ms) and (until_ms is None or t <= until_ms):
+                out.append(orjson.dumps({
+                    "timestamp": datetime.utcfromtimestamp(t / 1000), "lat": lat, "lng": lng, "deviation_detected": deviated,
+                }))
+        return b"".join(line + b"\n" for line in out)
+    
+    cursor = db.location_traces.find(query, {"_id": 0, "segments": 1}).sort("start", ASCENDING).batch_size(TRACE_REPLAY_BATCH)
+    async for chunk in cursor:
+        for segment in chunk["segments"]:
+            body = lines(decode_trace(segment))
+            if body:
+                yield body
+    # Fixes this worker has not written yet
+    pending = sorted(location_buffer.pending.get(route_id, ()), key=lambda fix: fix["timestamp"])
+    if pending:
+        yield lines(decode_trace(encode_trace(pending)))
+
+@api_router.get("/route-tracking/{route_id}/trace")
+async def replay_route_trace(route_id: str, since: Optional[datetime] = None, until: Optional[datetime] = None):
+    """Stream a route's location history as NDJSON, oldest fix first"""
+    route = await db.active_routes.find_one({"id": route_id}, {"_id": 0, "id": 1}) \
+        or await db.archived_routes.find_one({"id": route_id}, {"_id": 0, "id": 1})
+    if route is None:
+        raise HTTPException(status_code=404, detail="Route not found")
+    return StreamingResponse(iter_trace(route_id, as_utc(since) if since else None, as_utc(until) if until else None),
+                             media_type="application/x-ndjson")
+
+@api_router.websocket("/route-tracking/{route_id}/live")
+async def live_route_tracking(websocket: WebSocket, route_id: str):
+    """Live tracking channel: the client streams positions, the server pushes events.
+
+    Client messages: {"lat": float, "lng": float, "timestamp"?: str}
+    Server events are only sent when something changes:
+      {"event": "deviation", ...verdict}   on leaving or rejoining the planned route
+      {"event": "risk", "risk_level", ...} when the area risk level changes (same fields as /api/risk-analysis)
+      {"event": "error", "detail"}         for malformed messages
+    Events from other workers and clients arrive through the event bus:
+      {"event": "location", ...}           positions for this route sent elsewhere
+      {"event": "sos", ...}                SOS alerts raised by the route's user
+      {"event": "ended", "status"}         once the route is stopped, completed or expired
+    """
+    await websocket.accept()
+    track = await active_routes_cache.get(route_id)
+    if track is None:
+        await websocket.send_json({"event": "error", "detail": "Route not found"})
+        await websocket.close(code=4404)
+        return
+    
+    origin = uuid.uuid4().hex
+    
+    async def receive_positions():
+        deviated = False
+        risk_level = None
+        while True:
+            frame = await websocket.receive()
+            if frame["type"] == "websocket.disconnect":
+                raise WebSocketDisconnect(frame.get("code", 1000))
+            if not track.active:
+                await websocket.send_json({"event": "ended", "route_id": route_id, "status": track.status})
+                return
+            try:
+                message = json.loads(frame.get("text") or frame.get("bytes") or "")
+                location = {"lat": float(message["lat"]), "lng": float(message["lng"])}
+                timestamp = datetime.fromisoformat(message["timestamp"]) if message.get("timestamp") else datetime.utcnow()
+            except (KeyError, TypeError, ValueError):
+                await websocket.send_json({"event": "error", "detail": "Expected {lat, lng, timestamp?}"})
+                continue
+            
+            track.touch()
+            verdict = check_route_deviation(track, location)
+            if verdict["deviation_detected"] != deviated:
+                deviated = verdict["deviation_detected"]
+                await websocket.send_json({"event": "deviation", **verdict})
+            
+            nearby = [incident for incident, _ in incident_index.query(location["lat"], location["lng"], RISK_TILE_RADIUS_M)]
+            weighted = risk_aggregates.weighted_counts(np.array([location["lat"]]), np.array([location["lng"]]), RISK_TILE_RADIUS_M, as_utc(timestamp))
+            risk_score = incident_risk_score(float(weighted[0]))
+            if get_risk_level(risk_score) != risk_level:
+                risk_level = get_risk_level(risk_score)
+                await websocket.send_json({
+                    "event": "risk",
+                    "location": location,
+                    "risk_score": risk_score,
+                    "risk_level": risk_level,
+                    "incident_count": len(nearby),
+                    "recent_incidents": most_recent_incidents(nearby),
+                    "recommendations": get_safety_recommendations(risk_level)
+                })
+            
+            location_buffer.stage([{
+                "route_id": route_id,
+                "lat": location["lat"],
+                "lng": location["lng"],
+                "timestamp": timestamp,
+                "deviation_detected": verdict["deviation_detected"],
+            }])
+            event_bus.publish(f"route:{route_id}", location_event(verdict, timestamp, origin))
+    
+    async def forward_events(events: EventSubscription):
+        async for event in events:
+            if event.get("origin") == origin:
+                continue
+            await websocket.send_json({k: v for k, v in event.items() if k != "origin"})
+            if event.get("event") == "ended":
+                return
     
+    channels = [f"route:{route_id}"] + ([f"user:{track.user_id}"] if track.user_id else [])
+    async with event_bus.subscribe(*channels) as events:
+        tasks = [asyncio.create_task(receive_positions()), asyncio.create_task(forward_events(events))]
+        done, pending = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+        for task in pending:
+            task.cancel()
+        try:
+            for task in done:
+                task.result()
+            await websocket.close()
+        except WebSocketDisconnect:
+            pass
+
+# Emergency SOS endpoints
+NOTIFICATION_WORKERS = int(os.environ.get("NOTIFICATION_WORKERS", "8"))
+NOTIFICATION_QUEUE_SIZE = 10000
+NOTIFICATION_MAX_ATTEMPTS = 5
+NOTIFICATION_BACKOFF_S = 0.5  # doubled on every retry, with jitter
+NOTIFICATION_DEDUP_SIZE = 100000
+
+class NotificationError(Exception):
+    def __init__(self, message: str, retryable: bool = True):
+        super().__init__(message)
+        self.retryable = retryable
+
+class NotificationProvider(abc.ABC):
+    """Delivery channel for SOS notifications.
+
+    The dispatcher claims idempotency_key in notification_log before every attempt,
+    so a job is only handed to one worker at a time. Implementations must raise
+    NotificationError(retryable=False) for permanent failures and for any failure
+    after which the message may already have been delivered, so a retry never
+    reaches the same contact twice through the same provider.
+    """
+    name = "base"
+
+    @abc.abstractmethod
+    async def send(self, contact: Dict[str, Any], alert: Dict[str, Any], idempotency_key: str):
+        ...
+
+    async def close(self):
+        pass
+
+def emergency_message(alert: Dict[str, Any]) -> str:
+    location = alert["user_location"]
+    return (f"EMERGENCY: SOS alert ({alert['alert_type']}) at {alert['timestamp']:%H:%M} UTC. "
+            f"Location: https://maps.google.com/?q={location.get('lat')},{location.get('lng')}")
+
+class LocalStubProvider(NotificationProvider):
+    """Logs notifications and keeps them in memory; used when no provider is configured"""
+    name = "local"
+
+    def __init__(self):
+        self.sent: List[Dict[str, Any]] = []
+
+    async def send(self, contact, alert, idempotency_key):
+        self.sent.append({"to": contact["phone"], "body": emergency_message(alert), "key": idempotency_key})
+        logger.warning(f"🚨 EMERGENCY ALERT SENT 🚨 to {contact['name']} ({contact['phone']}): {emergency_message(alert)}")
+
+class TwilioSMSProvider(NotificationProvider):
+    """SMS through the Twilio REST API over one pooled HTTP client"""
+    name = "twilio"
+
+    def __init__(self, account_sid: str, auth_token: str, from_number: str):
+        self.from_number = from_number
+        self.client = httpx.AsyncClient(
+            base_url=f"https://api.twilio.com/2010-04-01/Accounts/{account_sid}",
+            auth=(account_sid, auth_token),
+            timeout=httpx.Timeout(10.0, connect=5.0),
+            limits=httpx.Limits(max_connections=NOTIFICATION_WORKERS, max_keepalive_connections=NOTIFICATION_WORKERS),
+        )
+
+    async def send(self, contact, alert, idempotency_key):
+        # The Messages API has no idempotency support, so only failures that happened
+        # before the request reached Twilio are safe to retry
+        try:
+            response = await self.client.post(
+                "/Messages.json",
+                data={"To": contact["phone"], "From": self.from_number, "Body": emergency_message(alert)},
+            )
+        except (httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout) as e:
+            raise NotificationError(f"Twilio request failed: {e}")
+        except httpx.HTTPError as e:
+            raise NotificationError(f"Twilio request failed and may have been delivered: {e}", retryable=False)
+        if response.status_code >= 400:
+            retryable = response.status_code == 429 or response.status_code >= 500
+            raise NotificationError(f"Twilio returned {response.status_code}: {response.text[:200]}", retryable=retryable)
+
+    async def close(self):
+        await self.client.aclose()
+
+def configured_notification_providers() -> List[NotificationProvider]:
+    sid, token, number = (os.environ.get(k) for k in ("TWILIO_ACCOUNT_SID", "TWILIO_AUTH_TOKEN", "TWILIO_PHONE_NUMBER"))
+    if os.environ.get("NOTIFICATION_PROVIDER", "twilio" if sid and token and number else "local") == "twilio":
+        return [TwilioSMSProvider(sid, token, number)]
+    return [LocalStubProvider()]
+
+class NotificationDispatcher:
+    """Queue-backed SOS fan-out.
+
+    The SOS endpoint only enqueues the alert on the bounded alert queue. Fan-out
+    workers expand each alert into one job per (contact, provider) on a separate
+    job queue, which delivery workers drain in parallel, retrying retryable failures
+    with exponential backoff. Workers never put into the queue they consume, so a
+    full queue cannot block them. Every attempt first claims its idempotency key in
+    notification_log, so a job re-enqueued on this or another worker is never sent
+    twice; delivered keys are also remembered in memory as a fast path.
+    """
+
+    def __init__(self, providers: List[NotificationProvider], workers: int = NOTIFICATION_WORKERS):
+        self.providers = providers
+        self.workers = workers
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=NOTIFICATION_QUEUE_SIZE)
+        # Unbounded: its size is bounded by queued alerts x contacts x providers
+        self.jobs: asyncio.Queue = asyncio.Queue()
+        self.delivered: "OrderedDict[str, bool]" = OrderedDict()
+        self._tasks: List[asyncio.Task] = []
+        self._retries: set = set()
+
+    async def enqueue_alert(self, alert: Dict[str, Any]):
+        await self.queue.put(alert)
+
+    def depth(self) -> int:
+        return self.queue.qsize() + self.jobs.qsize() + len(self._retries)
+
+    def _mark_delivered(self, key: str):
+        self.delivered[key] = True
+        while len(self.delivered) > NOTIFICATION_DEDUP_SIZE:
+            self.delivered.popitem(last=False)
+
+    async def _fan_out(self, alert: Dict[str, Any]):
+        contacts = await contact_cache.get(alert.get("user_id") or DEFAULT_CONTACT_OWNER)
+        if not contacts:
+            logger.warning(f"SOS alert {alert['id']} has no emergency contacts to notify")
+        for contact in contacts:
+            for provider in self.providers:
+                key = f"{alert['id']}:{contact['id']}:{provider.name}"
+                self.jobs.put_nowait((alert, contact, provider, key, 1))
+
+    async def _retry_later(self, job: Tuple, delay: float):
+        await asyncio.sleep(delay)
+        self.jobs.put_nowait(job)
+
+    def _schedule_retry(self, job: Tuple, delay: float):
+        task = asyncio.create_task(self._retry_later(job, delay))
+        self._retries.add(task)
+        task.add_done_callback(self._retries.discard)
+
+    async def _claim(self, key: str, alert, contact, provider: NotificationProvider, attempt: int) -> bool:
+        """Atomically mark key as sending; False if another attempt or worker already owns it"""
+        try:
+            # A new key is inserted; an existing one only matches once released for a retry.
+            # Any other state makes the upsert collide with the unique key index.
+            await db.notification_log.update_one(
+                {"key": key, "status": "retrying"},
+                {"$set": {"alert_id": alert["id"], "contact_id": contact["id"], "provider": provider.name,
+                          "status": "sending", "attempts": attempt, "updated_at": datetime.utcnow()}},
+                upsert=True,
+            )
+        except DuplicateKeyError:
+            return False
+        except Exception as e:
+            # An SOS must still go out when the log is unreachable; the in-memory set deduplicates locally
+            logger.error(f"Could not claim notification {key}, sending anyway: {e}")
+        return True
+
+    async def _deliver(self, alert, contact, provider: NotificationProvider, key: str, attempt: int):
+        if key in self.delivered:
+            return
+        if not await self._claim(key, alert, contact, provider, attempt):
+            logger.info(f"Notification {key} is already claimed, skipping")
+            return
+        try:
+            await provider.send(contact, alert, key)
+        except NotificationError as e:
+            if e.retryable and attempt < NOTIFICATION_MAX_ATTEMPTS:
+                delay = NOTIFICATION_BACKOFF_S * 2 ** (attempt - 1) * random.uniform(0.8, 1.2)
+                logger.warning(f"Notification {key} attempt {attempt} failed, retrying in {delay:.1f}s: {e}")
+                await self._log(key, alert, contact, provider, "retrying", attempt, str(e))
+                self._schedule_retry((alert, contact, provider, key, attempt + 1), delay)
+            else:
+                logger.error(f"Notification {key} failed permanently after {attempt} attempt(s): {e}")
+                await self._log(key, alert, contact, provider, "failed", attempt, str(e))
+            return
+        self._mark_delivered(key)
+        await self._log(key, alert, contact, provider, "delivered", attempt)
+
+    async def _log(self, key, alert, contact, provider, status, attempts, error=None):
+        try:
+            await db.notification_log.update_one(
+                {"key": key},
+                {"$set": {"alert_id": alert["id"], "contact_id": contact["id"], "provider": provider.name,
+                          "status": status, "attempts": attempts, "error": error, "updated_at": datetime.utcnow()}},
+                upsert=True,
+            )
+        except Exception as e:
+            logger.error(f"Could not record notification {key}: {e}")
+
+    async def _fan_out_worker(self):
+        while True:
+            alert = await self.queue.get()
+            try:
+                await self._fan_out(alert)
+            except Exception as e:
+                logger.error(f"Notification fan-out failed for alert {alert.get('id')}: {e}")
+            finally:
+                self.queue.task_done()
+
+    async def _delivery_worker(self):
+        while True:
+            job = await self.jobs.get()
+            try:
+                await self._deliver(*job)
+            except Exception as e:
+                logger.error(f"Notification job failed: {e}")
+            finally:
+                self.jobs.task_done()
+
+    def start(self):
+        if not self._tasks:
+            self._tasks = [asyncio.create_task(self._fan_out_worker()) for _ in range(self.workers)]
+            self._tasks += [asyncio.create_task(self._delivery_worker()) for _ in range(self.workers)]
+
+    async def stop(self, timeout: float = 5.0):
+        try:
+            await asyncio.wait_for(self.drain(), timeout)
+        except asyncio.TimeoutError:
+            logger.error(f"Shutting down with {self.depth()} notification jobs pending")
+        for task in self._tasks + list(self._retries):
+            task.cancel()
+        self._tasks = []
+        for provider in self.providers:
+            await provider.close()
+
+    async def drain(self):
+        """Wait until every queued alert has been fanned out and every job delivered or scheduled for retry"""
+        await self.queue.join()
+        await self.jobs.join()
+
+notification_dispatcher = NotificationDispatcher(configured_notification_providers())
+
+SOS_COALESCE_WINDOW_S = float(os.environ.get("SOS_COALESCE_WINDOW_S", "120"))
+
+def sos_evidence(alert: SOSAlert) -> Dict[str, Any]:
     return {
-        "route_id": route_id,
-        "current_location": current_location,
-        "deviation_detected": deviation_detected,
-        "message": "Route deviation detected! Are you safe?" if deviation_detected else "On track",
-        "requires_response": deviation_detected
+        "alert_type": alert.alert_type,
+        "confidence": alert.confidence,
+        "timestamp": alert.timestamp,
+        "user_location": alert.user_location,
+        "audio_analysis": alert.audio_analysis,
     }
 
-# Emergency SOS endpoints
+class SOSCoalescer:
+    """Merges triggers from one user/device into a single active alert.
+
+    Voice, gesture, shake and deviation detectors can all fire within seconds of each
+    other (and the shake handler repeatedly). Any trigger arriving within
+    SOS_COALESCE_WINDOW_S of the previous one for the same key is attached to the
+    active alert as evidence instead of creating and notifying a new alert. The alert
+    keeps the location of its first trigger; later locations are only appended to
+    the evidence. Anonymous triggers have no key and always raise a new alert, so
+    unrelated callers behind one NAT address are never merged.
+
+    The window is shared by every worker through one sos_coalesce document per key
+    ({_id: key, alert_id, last_triggered_at}), claimed atomically: a trigger either
+    extends an in-window document or replaces a stale one, and a concurrent insert
+    for the same key fails on _id and retries as a merge. The in-memory map is only
+    a fast path for keys this worker has seen recently.
+    """
+
+    def __init__(self, window_s: float = SOS_COALESCE_WINDOW_S):
+        self.window_s = window_s
+        self.active: Dict[str, Tuple[str, float]] = {}  # key -> (alert_id, last trigger monotonic time)
+        self.locks: Dict[str, asyncio.Lock] = {}
+
+    def _sweep(self, now: float):
+        expired = [key for key, (_, last) in self.active.items() if now - last > self.window_s]
+        for key in expired:
+            del self.active[key]
+            lock = self.locks.get(key)
+            if lock is not None and not lock.locked():
+                del self.locks[key]
+
+    async def submit(self, key: Optional[str], alert: SOSAlert) -> Tuple[str, bool]:
+        """Persist or merge a trigger; returns (alert_id, merged)"""
+        if key is None:
+            return await self._create(alert), False
+        now = asyncio.get_running_loop().time()
+        if len(self.active) > 1000:
+            self._sweep(now)
+        lock = self.locks.setdefault(key, asyncio.Lock())
+        async with lock:
+            triggered_at = datetime.utcnow()
+            cutoff = triggered_at - timedelta(seconds=self.window_s)
+            current = self.active.get(key)
+            if current is not None and now - current[1] <= self.window_s:
+                # Fast path: extend the shared window and merge in parallel
+                extended, _ = await asyncio.gather(
+                    db.sos_coalesce.update_one({"_id": key, "alert_id": current[0], "last_triggered_at": {"$gte": cutoff}},
+                                               {"$max": {"last_triggered_at": triggered_at}}),
+                    self._merge(current[0], alert),
+                )
+                if extended.matched_count:
+                    self.active[key] = (current[0], now)
+                else:
+                    del self.active[key]
+                return current[0], True
+            
+            # Stored before the window is claimed, so a merge from another worker always finds it
+            alert_dict = await self._store(alert)
+            alert_id = await self._claim(key, alert.id, triggered_at, cutoff)
+            self.active[key] = (alert_id, now)
+            if alert_id != alert.id:
+                await db.sos_alerts.delete_one({"id": alert.id})
+                await self._merge(alert_id, alert)
+                return alert_id, True
+        await notification_dispatcher.enqueue_alert(alert_dict)
+        return alert.id, False
+
+    async def _claim(self, key: str, alert_id: str, triggered_at: datetime, cutoff: datetime) -> str:
+        """Id of the alert that owns key's window: an open one, or alert_id as the new owner"""
+        while True:
+            window = await db.sos_coalesce.find_one_and_update(
+                {"_id": key, "last_triggered_at": {"$gte": cutoff}},
+                {"$max": {"last_triggered_at": triggered_at}},
+                projection={"alert_id": 1},
+            )
+            if window is not None:
+                return window["alert_id"]
+            try:
+                await db.sos_coalesce.update_one(
+                    {"_id": key, "last_triggered_at": {"$lt": cutoff}},
+                    {"$set": {"alert_id": alert_id, "last_triggered_at": triggered_at}},
+                    upsert=True,
+                )
+                return alert_id
+            except DuplicateKeyError:
+                continue  # another worker opened the window first
+
+    async def _merge(self, alert_id: str, alert: SOSAlert):
+        await db.sos_alerts.update_one(
+            {"id": alert_id},
+            {"$push": {"evidence": sos_evidence(alert)}, "$inc": {"trigger_count": 1},
+             "$max": {"confidence": alert.confidence},
+             "$set": {"last_triggered_at": alert.timestamp}},
+        )
+
+    async def _store(self, alert: SOSAlert) -> Dict[str, Any]:
+        alert.evidence = [sos_evidence(alert)]
+        alert_dict = alert.dict()
+        await db.sos_alerts.insert_one(alert_dict)
+        return alert_dict
+
+    async def _create(self, alert: SOSAlert) -> str:
+        alert_dict = await self._store(alert)
+        # Contacts are notified in parallel by the dispatcher workers
+        await notification_dispatcher.enqueue_alert(alert_dict)
+        return alert.id
+
+sos_coalescer = SOSCoalescer()
+
+def sos_coalesce_key(alert: SOSAlert) -> Optional[str]:
+    """Namespaced identity a trigger is coalesced under, or None for anonymous triggers"""
+    if alert.user_id:
+        return f"user:{alert.user_id}"
+    if alert.device_id:
+        return f"device:{alert.device_id}"
+    return None
+
 @api_router.post("/emergency-sos")
 async def trigger_emergency_sos(alert_data: SOSAlert):
     """Trigger emergency SOS alert"""
     
-    # Save SOS alert to database
-    alert_dict = alert_data.dict()
-    await db.sos_alerts.insert_one(alert_dict)
-    
-    # Demo: Simulate sending alerts to emergency contacts
-    await send_emergency_notifications(alert_data)
+    alert_id, merged = await sos_coalescer.submit(sos_coalesce_key(alert_data), alert_data)
     
-    return {
-        "alert_id": alert_data.id,
-        "status": "alert_sent",
-        "message": "Emergency alert sent to your contacts and authorities",
-        "timestamp": alert_data.timestamp
+    # Live channels and dashboards on every worker learn about the alert through the bus
+    event = {
+        "event": "sos",
+        "alert_id": alert_id,
+        "status": "alert_updated" if merged else "alert_sent",
+        "alert_type": alert_data.alert_type,
+        "user_id": alert_data.user_id,
+        "user_location": alert_data.user_location,
+        "timestamp": alert_data.timestamp.isoformat(),
     }
-
-async def send_emergency_notifications(alert: SOSAlert):
-    """Send notifications to emergency contacts (demo)"""
-    # This would integrate with Twilio, email services, etc.
-    print(f"🚨 EMERGENCY ALERT SENT 🚨")
-    print(f"Type: {alert.alert_type}")
-    print(f"Location: {alert.user_location}")
-    print(f"Time: {alert.timestamp}")
+    event_bus.publish(SOS_CHANNEL, event)
+    if alert_data.user_id:
+        event_bus.publish(f"user:{alert_data.user_id}", event)
+    
+    if merged:
+        return ORJSONResponse(SOSAlertReceipt(
+            alert_id=alert_id,
+            status="alert_updated",
+            message="Your emergency alert is already active; this signal was added to it",
+            timestamp=alert_data.timestamp
+        ))
+    return ORJSONResponse(SOSAlertReceipt(
+        alert_id=alert_id,
+        status="alert_sent",
+        message="Emergency alert sent to your contacts and authorities",
+        timestamp=alert_data.timestamp
+    ))
 
 # Contact management
+DEFAULT_CONTACT_OWNER = "default"
+CONTACTS_PER_OWNER_MAX = 1000
+CONTACT_CACHE_TTL_S = 60.0  # bounds staleness when another worker adds a contact
+CONTACT_PAGE_SIZE = 50
+CONTACT_PROJECTION = {"_id": 0, "id": 1, "name": 1, "phone": 1, "relation": 1, "priority": 1, "owner_id": 1}
+
+def contact_owner_filter(owner_id: str) -> Dict[str, Any]:
+    # Contacts stored before owner_id existed belong to the default owner
+    if owner_id == DEFAULT_CONTACT_OWNER:
+        return {"owner_id": {"$in": [owner_id, None]}}
+    return {"owner_id": owner_id}
+
+class ContactCache:
+    """Per-owner, priority-ordered contact lists held in memory.
+
+    Lists are loaded with one indexed (owner_id, priority, id) query, served as plain
+    dicts, and dropped when the owner adds a contact or after CONTACT_CACHE_TTL_S.
+    """
+
+    def __init__(self, ttl_s: float = CONTACT_CACHE_TTL_S):
+        self.ttl_s = ttl_s
+        self.entries: Dict[str, Tuple[float, List[Dict[str, Any]], List[Tuple[int, str]]]] = {}
+
+    async def _load(self, owner_id: str):
+        contacts = await db.emergency_contacts.find(contact_owner_filter(owner_id), CONTACT_PROJECTION) \
+            .sort([("priority", 1), ("id", 1)]).to_list(CONTACTS_PER_OWNER_MAX)
+        for contact in contacts:
+            contact.setdefault("owner_id", DEFAULT_CONTACT_OWNER)
+        entry = (asyncio.get_running_loop().time(), contacts, [(c["priority"], c["id"]) for c in contacts])
+        self.entries[owner_id] = entry
+        return entry
+
+    async def _entry(self, owner_id: str):
+        entry = self.entries.get(owner_id)
+        if entry is None or asyncio.get_running_loop().time() - entry[0] > self.ttl_s:
+            entry = await self._load(owner_id)
+        return entry
+
+    async def get(self, owner_id: str) -> List[Dict[str, Any]]:
+        return (await self._entry(owner_id))[1]
+
+    async def page(self, owner_id: str, after: Optional[Tuple[int, str]], limit: int) -> Tuple[List[Dict[str, Any]], Optional[Tuple[int, str]]]:
+        """Contacts strictly after the (priority, id) cursor, plus the next cursor"""
+        _, contacts, keys = await self._entry(owner_id)
+        start = bisect.bisect_right(keys, after) if after else 0
+        page = contacts[start:start + limit]
+        return page, (keys[start + limit - 1] if start + limit < len(contacts) else None)
+
+    def invalidate(self, owner_id: str):
+        self.entries.pop(owner_id, None)
+
+contact_cache = ContactCache()
+
+def encode_contact_cursor(key: Tuple[int, str]) -> str:
+    return base64.urlsafe_b64encode(f"{key[0]}:{key[1]}".encode()).decode()
+
+def decode_contact_cursor(cursor: str) -> Tuple[int, str]:
+    try:
+        priority, contact_id = base64.urlsafe_b64decode(cursor.encode()).decode().split(":", 1)
+        return int(priority), contact_id
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
 @api_router.post("/emergency-contacts")
 async def add_emergency_contact(contact: EmergencyContact):
     """Add emergency contact"""
     contact_dict = contact.dict()
     await db.emergency_contacts.insert_one(contact_dict)
+    contact_cache.invalidate(contact.owner_id)
     return {"message": "Emergency contact added successfully", "contact_id": contact.id}
 
 @api_router.get("/emergency-contacts")
-async def get_emergency_contacts():
-    """Get all emergency contacts"""
-    contacts = await db.emergency_contacts.find().to_list(100)
-    return [EmergencyContact(**contact) for contact in contacts]
+async def get_emergency_contacts(owner_id: str = DEFAULT_CONTACT_OWNER, limit: int = CONTACT_PAGE_SIZE, cursor: Optional[str] = None):
+    """Get a user's emergency contacts in priority order.
+
+    Pages are limited to `limit` contacts; when more remain, the X-Next-Cursor
+    response header holds the cursor for the next page.
+    """
+    limit = min(max(limit, 1), CONTACTS_PER_OWNER_MAX)
+    contacts, next_key = await contact_cache.page(owner_id, decode_contact_cursor(cursor) if cursor else None, limit)
+    headers = {"X-Next-Cursor": encode_contact_cursor(next_key)} if next_key else {}
+    return ORJSONResponse(contacts, headers=headers)
+
+# Metrics
+EVENT_LOOP_LAG_INTERVAL_S = 0.25
+EVENT_LOOP_LAG_BUCKETS_S = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+METRICS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+class HTTPMetrics:
+    """Per-route request counters and latency histograms, plus in-flight gauges"""
+
+    def __init__(self):
+        self.requests: Dict[Tuple[str, str, int], int] = {}
+        self.latency: Dict[Tuple[str, str], Histogram] = {}
+        self.in_flight = 0
+        self.websockets_open = 0
+
+    def observe(self, method: str, route: str, status: int, elapsed_s: float):
+        key = (method, route, status)
+        self.requests[key] = self.requests.get(key, 0) + 1
+        histogram = self.latency.get((method, route))
+        if histogram is None:
+            histogram = self.latency[(method, route)] = Histogram()
+        histogram.observe(elapsed_s)
+
+http_metrics = HTTPMetrics()
+
+class MetricsMiddleware:
+    """Plain ASGI middleware timing every request against its route template.
+
+    Labels use the matched route's path template (e.g. /api/risk-tiles/{z}/{x}/{tile})
+    rather than the raw URL, so label cardinality stays bounded.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "websocket":
+            http_metrics.websockets_open += 1
+            try:
+                await self.app(scope, receive, send)
+            finally:
+                http_metrics.websockets_open -= 1
+            return
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        
+        status = 500
+        
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+        
+        start = time.perf_counter()
+        http_metrics.in_flight += 1
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            http_metrics.in_flight -= 1
+            route = scope.get("route")
+            http_metrics.observe(scope["method"], route.path if route is not None else "unmatched", status, time.perf_counter() - start)
+
+class EventLoopLagMonitor:
+    """Samples how late the event loop wakes a sleeping task; sustained lag means blocking work on the loop"""
+
+    def __init__(self, interval_s: float = EVENT_LOOP_LAG_INTERVAL_S):
+        self.interval_s = interval_s
+        self.histogram = Histogram(EVENT_LOOP_LAG_BUCKETS_S)
+        self.last_s = 0.0
+        self.max_s = 0.0
+        self._task: Optional[asyncio.Task] = None
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            expected = loop.time() + self.interval_s
+            await asyncio.sleep(self.interval_s)
+            self.last_s = max(loop.time() - expected, 0.0)
+            self.max_s = max(self.max_s, self.last_s)
+            self.histogram.observe(self.last_s)
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+loop_lag_monitor = EventLoopLagMonitor()
+
+# Admission control
+# Reverse proxies (comma-separated addresses or CIDRs) whose X-Forwarded-For is believed
+TRUSTED_PROXIES = tuple(ipaddress.ip_network(network.strip(), strict=False)
+                        for network in os.environ.get("TRUSTED_PROXIES", "").split(",") if network.strip())
+# Behind an ingress every request comes from the proxy, so per-client buckets are only
+# meaningful once TRUSTED_PROXIES is configured; set ADMISSION_CONTROL=on to force it
+ADMISSION_CONTROL = os.environ.get("ADMISSION_CONTROL", "on" if TRUSTED_PROXIES else "off") != "off"
+ADMISSION_MAX_IN_FLIGHT = int(os.environ.get("ADMISSION_MAX_IN_FLIGHT", "256"))
+ADMISSION_RESERVED_CRITICAL = int(os.environ.get("ADMISSION_RESERVED_CRITICAL", "64"))  # slots only critical routes may use
+ADMISSION_LOW_MAX_IN_FLIGHT = int(os.environ.get("ADMISSION_LOW_MAX_IN_FLIGHT", "96"))
+ADMISSION_LOW_SHED_LAG_S = float(os.environ.get("ADMISSION_LOW_SHED_LAG_S", "0.1"))  # event loop lag that sheds low priority
+ADMISSION_CLIENTS_MAX = int(os.environ.get("ADMISSION_CLIENTS_MAX", "100000"))  # token buckets kept, least recently used evicted first
+ADMISSION_RATES = {  # per-client token buckets: (requests per second, burst)
+    "normal": (float(os.environ.get("ADMISSION_NORMAL_RATE", "20")), 40),
+    "low": (float(os.environ.get("ADMISSION_LOW_RATE", "10")), 20),
+    "tiles": (float(os.environ.get("ADMISSION_TILE_RATE", "50")), 200),  # one map pan fetches dozens of tiles
+}
+ADMISSION_PRIORITIES = ("critical", "normal", "low")
+ADMISSION_CRITICAL_PATHS = re.compile(r"^/api/(emergency-sos|location-update(/bulk)?|route-tracking(/[^/]+/(stop|complete))?)$")
+ADMISSION_LOW_PATHS = re.compile(r"^/api/(risk-analysis|risk-tiles/|safety-route|safety-chat|incidents/import|route-tracking/[^/]+/trace)")
+ADMISSION_TILE_PATHS = re.compile(r"^/api/risk-tiles/")  # low priority, but rate limited in their own bucket
+
+def admission_priority(path: str) -> Optional[str]:
+    """Priority class of an API path; None for paths outside /api (metrics, docs)"""
+    if not path.startswith("/api/"):
+        return None
+    if ADMISSION_CRITICAL_PATHS.match(path):
+        return "critical"
+    if ADMISSION_LOW_PATHS.match(path):
+        return "low"
+    return "normal"
+
+def is_trusted_proxy(address: str) -> bool:
+    try:
+        ip = ipaddress.ip_address(address)
+    except ValueError:
+        return False
+    return any(ip in network for network in TRUSTED_PROXIES)
+
+def admission_client(scope) -> str:
+    """Address a request is rate limited as.
+
+    X-Forwarded-For is only believed when the peer is one of TRUSTED_PROXIES, and then
+    only up to the nearest hop that is not a trusted proxy: hops further left were
+    written by the client and can be anything.
+    """
+    client = scope.get("client")
+    peer = client[0] if client else "anonymous"
+    if not is_trusted_proxy(peer):
+        return peer
+    hops = [hop.strip() for name, value in scope.get("headers", ()) if name == b"x-forwarded-for"
+            for hop in value.decode("latin-1").split(",")]
+    for hop in reversed(hops):
+        if hop and not is_trusted_proxy(hop):
+            return hop
+    return peer
+
+class AdmissionController:
+    """Priority classes, reserved concurrency and per-client token buckets.
+
+    Critical routes (SOS, location updates, route lifecycle) are always admitted and
+    are never rate limited. Other routes may only use ADMISSION_MAX_IN_FLIGHT minus
+    the ADMISSION_RESERVED_CRITICAL slots, so a spike of chat or risk lookups cannot
+    take the capacity SOS traffic needs. Low-priority routes are additionally capped
+    at ADMISSION_LOW_MAX_IN_FLIGHT and refused while the event loop is lagging.
+    """
+
+    def __init__(self):
+        self.in_flight = {priority: 0 for priority in ADMISSION_PRIORITIES}
+        self.admitted = {priority: 0 for priority in ADMISSION_PRIORITIES}
+        self.shed: Dict[Tuple[str, str], int] = {}
+        self.buckets: "OrderedDict[Tuple[str, str], List[float]]" = OrderedDict()
+
+    def _retry_after(self, client: str, bucket_name: str, now: float) -> float:
+        """Take a token from the client's bucket; returns 0, or seconds until a token is available"""
+        rate, burst = ADMISSION_RATES[bucket_name]
+        key = (client, bucket_name)
+        bucket = self.buckets.get(key)
+        if bucket is None:
+            bucket = self.buckets[key] = [float(burst), now]
+            while len(self.buckets) > ADMISSION_CLIENTS_MAX:
+                self.buckets.popitem(last=False)
+        else:
+            self.buckets.move_to_end(key)
+            bucket[0] = min(float(burst), bucket[0] + (now - bucket[1]) * rate)
+            bucket[1] = now
+        if bucket[0] >= 1.0:
+            bucket[0] -= 1.0
+            return 0.0
+        return (1.0 - bucket[0]) / rate
+
+    def admit(self, client: str, priority: str, bucket_name: Optional[str] = None) -> Optional[Tuple[int, str, float]]:
+        """Reserve a slot, or return (status, reason, retry after seconds) for a shed request.
+
+        bucket_name selects the client's token bucket; it defaults to the priority.
+        """
+        if priority != "critical":
+            total = sum(self.in_flight.values())
+            if total >= ADMISSION_MAX_IN_FLIGHT - ADMISSION_RESERVED_CRITICAL:
+                return self._shed(priority, 503, "overloaded", 1.0)
+            if priority == "low":
+                if self.in_flight["low"] >= ADMISSION_LOW_MAX_IN_FLIGHT:
+                    return self._shed(priority, 503, "overloaded", 1.0)
+                if loop_lag_monitor.last_s > ADMISSION_LOW_SHED_LAG_S:
+                    return self._shed(priority, 503, "event_loop_lag", 1.0)
+            retry_after = self._retry_after(client, bucket_name or priority, time.monotonic())
+            if retry_after:
+                return self._shed(priority, 429, "rate_limited", retry_after)
+        self.in_flight[priority] += 1
+        self.admitted[priority] += 1
+        return None
+
+    def _shed(self, priority: str, status: int, reason: str, retry_after: float) -> Tuple[int, str, float]:
+        key = (priority, reason)
+        self.shed[key] = self.shed.get(key, 0) + 1
+        return status, reason, retry_after
+
+    def release(self, priority: str):
+        self.in_flight[priority] -= 1
+
+admission = AdmissionController()
+
+class AdmissionControlMiddleware:
+    """Plain ASGI middleware that sheds HTTP requests the AdmissionController refuses.
+
+    Sits inside CORS so refused requests still carry CORS headers; WebSockets and
+    paths outside /api pass straight through.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        priority = admission_priority(scope["path"]) if scope["type"] == "http" and ADMISSION_CONTROL else None
+        if priority is None:
+            await self.app(scope, receive, send)
+            return
+        
+        bucket_name = "tiles" if ADMISSION_TILE_PATHS.match(scope["path"]) else None
+        rejection = admission.admit(admission_client(scope), priority, bucket_name)
+        if rejection is not None:
+            status, reason, retry_after = rejection
+            detail = "Rate limit exceeded" if status == 429 else "Server busy, please retry"
+            response = ORJSONResponse({"detail": detail, "reason": reason}, status_code=status,
+                                      headers={"Retry-After": str(max(1, math.ceil(retry_after)))})
+            await response(scope, receive, send)
+            return
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            admission.release(priority)
+
+def render_metrics() -> str:
+    lines = [
+        "# HELP http_requests_total HTTP requests by method, route template and status.",
+        "# TYPE http_requests_total counter",
+    ]
+    for (method, route, status), count in sorted(http_metrics.requests.items()):
+        lines.append(f'http_requests_total{{method="{method}",route="{route}",status="{status}"}} {count}')
+    lines += ["# HELP http_request_duration_seconds HTTP request latency.", "# TYPE http_request_duration_seconds histogram"]
+    for (method, route), histogram in sorted(http_metrics.latency.items()):
+        lines += histogram.exposition("http_request_duration_seconds", f'method="{method}",route="{route}"')
+    lines += [
+        "# HELP http_requests_in_flight HTTP requests currently being served.",
+        "# TYPE http_requests_in_flight gauge",
+        f"http_requests_in_flight {http_metrics.in_flight}",
+        "# HELP websocket_connections_open Open WebSocket connections.",
+        "# TYPE websocket_connections_open gauge",
+        f"websocket_connections_open {http_metrics.websockets_open}",
+    ]
+    
+    with mongo_monitor._lock:
+        mongo_stats = sorted((key, stat["seconds"], stat["failed"], stat["slow"]) for key, stat in mongo_monitor.stats.items())
+    lines += ["# HELP mongo_command_duration_seconds MongoDB command latency by collection and operation.",
+              "# TYPE mongo_command_duration_seconds histogram"]
+    for (collection, operation), histogram, _, _ in mongo_stats:
+        lines += histogram.exposition("mongo_command_duration_seconds", f'collection="{collection}",operation="{operation}"')
+    lines += ["# HELP mongo_command_failures_total Failed MongoDB commands.", "# TYPE mongo_command_failures_total counter"]
+    lines += [f'mongo_command_failures_total{{collection="{c}",operation="{o}"}} {failed}' for (c, o), _, failed, _ in mongo_stats]
+    lines += [f"# HELP mongo_slow_commands_total MongoDB commands slower than {MONGO_SLOW_QUERY_MS:g} ms.",
+              "# TYPE mongo_slow_commands_total counter"]
+    lines += [f'mongo_slow_commands_total{{collection="{c}",operation="{o}"}} {slow}' for (c, o), _, _, slow in mongo_stats]
+    
+    lines += ["# HELP event_loop_lag_seconds How late the event loop ran a timer.", "# TYPE event_loop_lag_seconds histogram"]
+    lines += loop_lag_monitor.histogram.exposition("event_loop_lag_seconds")
+    lines += [
+        "# HELP event_loop_lag_max_seconds Worst event loop lag since start.",
+        "# TYPE event_loop_lag_max_seconds gauge",
+        f"event_loop_lag_max_seconds {loop_lag_monitor.max_s}",
+        "# HELP location_fixes_pending Location fixes waiting to be flushed to Mongo.",
+        "# TYPE location_fixes_pending gauge",
+        f"location_fixes_pending {location_buffer.pending_count}",
+        "# HELP event_bus_pending Events waiting to be published.",
+        "# TYPE event_bus_pending gauge",
+        f"event_bus_pending {len(event_bus.pending)}",
+        "# HELP event_bus_published_total Events published to the event bus.",
+        "# TYPE event_bus_published_total counter",
+        f"event_bus_published_total {event_bus.published}",
+        "# HELP event_bus_dropped_total Events dropped by the bus or by slow subscribers.",
+        "# TYPE event_bus_dropped_total counter",
+        f"event_bus_dropped_total {event_bus.dropped}",
+        "# HELP notification_queue_depth SOS notification jobs waiting for a worker.",
+        "# TYPE notification_queue_depth gauge",
+        f"notification_queue_depth {notification_dispatcher.depth()}",
+        "# HELP risk_cache_requests_total /api/risk-analysis lookups by cache outcome.",
+        "# TYPE risk_cache_requests_total counter",
+        f'risk_cache_requests_total{{result="hit"}} {risk_cache.hits}',
+        f'risk_cache_requests_total{{result="miss"}} {risk_cache.misses}',
+        f'risk_cache_requests_total{{result="shared"}} {risk_cache.shared}',
+        "# HELP risk_cache_entries Cached /api/risk-analysis results.",
+        "# TYPE risk_cache_entries gauge",
+        f"risk_cache_entries {len(risk_cache.entries)}",
+    ]
+    
+    lines += ["# HELP admission_requests_admitted_total Requests admitted by priority class.",
+              "# TYPE admission_requests_admitted_total counter"]
+    lines += [f'admission_requests_admitted_total{{priority="{p}"}} {count}' for p, count in admission.admitted.items()]
+    lines += ["# HELP admission_requests_shed_total Requests refused by priority class and reason.",
+              "# TYPE admission_requests_shed_total counter"]
+    lines += [f'admission_requests_shed_total{{priority="{p}",reason="{reason}"}} {count}'
+              for (p, reason), count in sorted(admission.shed.items())]
+    lines += ["# HELP admission_in_flight Admitted requests currently being served by priority class.",
+              "# TYPE admission_in_flight gauge"]
+    lines += [f'admission_in_flight{{priority="{p}"}} {count}' for p, count in admission.in_flight.items()]
+    return "\n".join(lines) + "\n"
+
+@app.get("/metrics", include_in_schema=False)
+async def metrics():
+    """Prometheus scrape endpoint; served outside /api so it stays off the public ingress"""
+    return Response(content=render_metrics(), media_type=METRICS_CONTENT_TYPE)
 
 # Include the router in the main app
 app.include_router(api_router)
 
+app.add_middleware(AdmissionControlMiddleware)
 app.add_middleware(
     CORSMiddleware,
     allow_credentials=True,
     allow_origins=["*"],
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor"],
 )
+app.add_middleware(MetricsMiddleware)
 
 # Configure logging
 logging.basicConfig(
@@ -346,6 +3890,49 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+async def ensure_indexes():
+    """Create missing declared indexes and rebuild ones whose options changed"""
+    for collection_name, models in REQUIRED_INDEXES.items():
+        collection = db[collection_name]
+        try:
+            existing = await collection.index_information()
+            for model in models:
+                spec = model.document
+                current = existing.get(spec["name"])
+                if current is not None and bool(current.get("unique")) == bool(spec.get("unique")):
+                    continue
+                if current is not None:
+                    logger.warning(f"Rebuilding index {collection_name}.{spec['name']} with new options")
+                    await collection.drop_index(spec["name"])
+                await collection.create_indexes([model])
+                logger.info(f"Created index {collection_name}.{spec['name']}")
+        except Exception as e:
+            logger.error(f"Index reconciliation failed for {collection_name}: {e}")
+
+@app.on_event("startup")
+async def startup_services():
+    await event_bus.start()
+    asyncio.create_task(sync_route_cache())
+    await ensure_indexes()
+    await load_incident_index()
+    load_intent_index()
+    asyncio.create_task(risk_tiles.precompute())
+    asyncio.create_task(load_road_graph())
+    location_buffer.start()
+    route_archiver.start()
+    notification_dispatcher.start()
+    load_gesture_model()
+    loop_lag_monitor.start()
+
 @app.on_event("shutdown")
 async def shutdown_db_client():
+    await location_buffer.stop()
+    await route_archiver.stop()
+    await notification_dispatcher.stop()
+    await event_bus.stop()
+    loop_lag_monitor.stop()
+    if gesture_batcher is not None:
+        gesture_batcher.stop()
+    if voice_pool is not None:
+        voice_pool.shutdown(wait=False, cancel_futures=True)
     client.close()
\ No newline at end of file
@@ -8,6 +8,9 @@ import requests
 import sys
 import json
 import io
+import math
+import struct
+import wave
 from datetime import datetime
 import time
 
@@ -62,8 +65,14 @@ class SafeGuardAPITester:
     def test_voice_analysis(self):
         """Test POST /api/voice-analysis endpoint"""
         try:
-            # Create a mock audio file
-            audio_data = b"mock_audio_data_for_testing"
+            # Create a 1 second 16-bit PCM WAV (440 Hz tone)
+            buffer = io.BytesIO()
+            with wave.open(buffer, "wb") as wav:
+                wav.setnchannels(1)
+                wav.setsampwidth(2)
+                wav.setframerate(16000)
+                wav.writeframes(b"".join(struct.pack("<h", int(8000 * math.sin(2 * math.pi * 440 * i / 16000))) for i in range(16000)))
+            audio_data = buffer.getvalue()
             files = {'audio': ('test_voice.wav', io.BytesIO(audio_data), 'audio/wav')}
             
             response = requests.post(f"{self.api_url}/voice-analysis", 
@@ -95,10 +104,12 @@ class SafeGuardAPITester:
     def test_gesture_detection(self):
         """Test POST /api/gesture-detection endpoint"""
         try:
-            gesture_data = {
-                "type": "peace_sign",
-                "timestamp": datetime.now().isoformat()
-            }
+            # Open palm, 21 normalized image-space landmarks (wrist first, then thumb to pinky)
+            fingers = [(0.56, 0.71), (0.5, 0.7), (0.45, 0.71), (0.4, 0.74)]
+            landmarks = [[0.5, 0.95, 0.0], [0.59, 0.89, 0.0], [0.64, 0.84, 0.0], [0.69, 0.8, 0.0], [0.72, 0.77, 0.0]]
+            for x, y in fingers:
+                landmarks += [[x + (x - 0.5) * 0.25 * k, y - 0.08 * k, 0.0] for k in range(4)]
+            gesture_data = {"landmarks": landmarks}
             
             response = requests.post(f"{self.api_url}/gesture-detection", 
                                    json=gesture_data, timeout=10)
@@ -5,6 +5,37 @@ import './App.css';
 const BACKEND_URL = process.env.REACT_APP_BACKEND_URL;
 const API = `${BACKEND_URL}/api`;
 
+// Stable per-browser id so the server can merge near-simultaneous SOS triggers
+const getDeviceId = () => {
+  let deviceId = localStorage.getItem('safeguard_device_id');
+  if (!deviceId) {
+    deviceId = (window.crypto && window.crypto.randomUUID) ? window.crypto.randomUUID() : `${Date.now()}-${Math.random().toString(16).slice(2)}`;
+    localStorage.setItem('safeguard_device_id', deviceId);
+  }
+  return deviceId;
+};
+
+// MediaPipe hand landmarker, loaded from the CDN on first use
+const MEDIAPIPE_VISION = 'https://cdn.jsdelivr.net/npm/@mediapipe/tasks-vision@0.10.14';
+const HAND_LANDMARKER_MODEL = 'https://storage.googleapis.com/mediapipe-models/hand_landmarker/hand_landmarker/float16/1/hand_landmarker.task';
+const GESTURE_SAMPLE_FRAMES = 30;
+const GESTURE_SAMPLE_INTERVAL_MS = 100;
+let handLandmarkerPromise = null;
+const loadHandLandmarker = () => {
+  if (!handLandmarkerPromise) {
+    handLandmarkerPromise = import(/* webpackIgnore: true */ `${MEDIAPIPE_VISION}/vision_bundle.mjs`)
+      .then(async ({ FilesetResolver, HandLandmarker }) => HandLandmarker.createFromOptions(
+        await FilesetResolver.forVisionTasks(`${MEDIAPIPE_VISION}/wasm`),
+        { baseOptions: { modelAssetPath: HAND_LANDMARKER_MODEL }, runningMode: 'VIDEO', numHands: 1 }
+      ))
+      .catch(error => {
+        handLandmarkerPromise = null;
+        throw error;
+      });
+  }
+  return handLandmarkerPromise;
+};
+
 function App() {
   // Global state for the safety app
   const [userLocation, setUserLocation] = useState({ lat: 28.6139, lng: 77.2090 }); // Delhi demo location
@@ -18,7 +49,7 @@ function App() {
   const [chatMessages, setChatMessages] = useState([]);
   
   const videoRef = useRef(null);
-  const mediaRecorderRef = useRef(null);
+  const endRouteTrackingRef = useRef(null);
 
   // Initialize location and load emergency contacts
   useEffect(() => {
@@ -69,42 +100,55 @@ function App() {
     
     try {
       const stream = await navigator.mediaDevices.getUserMedia({ audio: true });
-      const mediaRecorder = new MediaRecorder(stream);
-      const audioChunks = [];
-      
-      mediaRecorder.ondataavailable = (event) => {
-        audioChunks.push(event.data);
-      };
+      const audioContext = new (window.AudioContext || window.webkitAudioContext)({ sampleRate: 16000 });
+      const source = audioContext.createMediaStreamSource(stream);
+      const processor = audioContext.createScriptProcessor(4096, 1, 1);
+      const socket = new WebSocket(`${API.replace(/^http/, 'ws')}/voice-analysis/live?sample_rate=${audioContext.sampleRate}`);
+      let peakResult = null;
+      let stopped = false;
       
-      mediaRecorder.onstop = async () => {
-        const audioBlob = new Blob(audioChunks, { type: 'audio/wav' });
-        const formData = new FormData();
-        formData.append('audio', audioBlob, 'voice_sample.wav');
-        
-        try {
-          const response = await axios.post(`${API}/voice-analysis`, formData, {
-            headers: { 'Content-Type': 'multipart/form-data' }
-          });
-          
-          handleVoiceAnalysisResult(response.data);
-        } catch (error) {
-          console.error('Voice analysis error:', error);
-          alert('Voice analysis failed. Please try again.');
-        }
-        
+      const stopListening = () => {
+        if (stopped) return;
+        stopped = true;
+        processor.disconnect();
+        source.disconnect();
+        audioContext.close();
         stream.getTracks().forEach(track => track.stop());
+        socket.close();
         setIsVoiceListening(false);
+        if (peakResult) {
+          handleVoiceAnalysisResult(peakResult);
+        } else {
+          alert('Voice analysis failed. Please try again.');
+        }
       };
       
-      mediaRecorder.start();
-      mediaRecorderRef.current = mediaRecorder;
+      // Stream 16-bit PCM; the server answers with a verdict every quarter second
+      processor.onaudioprocess = (event) => {
+        if (socket.readyState !== WebSocket.OPEN) return;
+        const input = event.inputBuffer.getChannelData(0);
+        const pcm = new Int16Array(input.length);
+        for (let i = 0; i < input.length; i++) {
+          pcm[i] = Math.max(-1, Math.min(1, input[i])) * 0x7fff;
+        }
+        socket.send(pcm.buffer);
+      };
       
-      // Record for 3 seconds
-      setTimeout(() => {
-        if (mediaRecorderRef.current && mediaRecorderRef.current.state === 'recording') {
-          mediaRecorderRef.current.stop();
+      socket.onmessage = (messageEvent) => {
+        const result = JSON.parse(messageEvent.data);
+        if (!peakResult || result.analysis.stress_level > peakResult.analysis.stress_level) {
+          peakResult = result;
+        }
+        if (result.trigger_sos) {
+          stopListening();
         }
-      }, 3000);
+      };
+      
+      source.connect(processor);
+      processor.connect(audioContext.destination);
+      
+      // Listen for 3 seconds unless distress is detected sooner
+      setTimeout(stopListening, 3000);
       
     } catch (error) {
       console.error('Microphone access error:', error);
@@ -136,76 +180,104 @@ function App() {
   // Feature 4: Gesture Detection
   const startGestureDetection = async () => {
     setIsGestureActive(true);
+    let stream = null;
     
     try {
-      const stream = await navigator.mediaDevices.getUserMedia({ video: true });
+      stream = await navigator.mediaDevices.getUserMedia({ video: true });
       if (videoRef.current) {
         videoRef.current.srcObject = stream;
         videoRef.current.play();
       }
       
-      // Demo: Simulate gesture detection after 3 seconds
-      setTimeout(() => {
-        const gestureTypes = ['peace_sign', 'open_palm', 'help_gesture'];
-        const randomGesture = gestureTypes[Math.floor(Math.random() * gestureTypes.length)];
-        
-        axios.post(`${API}/gesture-detection`, {
-          type: randomGesture,
-          timestamp: new Date().toISOString()
-        }).then(response => {
-          const { gesture_detected, sos_triggered, message } = response.data;
-          alert(message);
-          
-          if (sos_triggered) {
-            triggerEmergencySOS('gesture', { gesture: gesture_detected });
-          }
-        });
+      // Sample hand landmarks for a few seconds and let the server classify the pose
+      const handLandmarker = await loadHandLandmarker();
+      const frames = [];
+      for (let i = 0; i < GESTURE_SAMPLE_FRAMES; i++) {
+        await new Promise(resolve => setTimeout(resolve, GESTURE_SAMPLE_INTERVAL_MS));
+        const video = videoRef.current;
+        if (!video || video.readyState < 2) continue;
+        const { landmarks } = handLandmarker.detectForVideo(video, performance.now());
+        if (landmarks.length) {
+          frames.push({ landmarks: landmarks[0].map(({ x, y, z }) => [x, y, z]) });
+        }
+      }
+      stream.getTracks().forEach(track => track.stop());
+      setIsGestureActive(false);
+
+      if (!frames.length) {
+        alert('No hand detected. Hold your hand up to the camera and try again.');
+        return;
+      }
+      axios.post(`${API}/gesture-detection`, { frames }).then(response => {
+        const { results, sos_triggered } = response.data;
+        const { gesture_detected, message } = results.find(r => r.sos_triggered) || results[results.length - 1];
+        alert(message);
         
-        // Stop camera after detection
-        stream.getTracks().forEach(track => track.stop());
-        setIsGestureActive(false);
-      }, 3000);
+        if (sos_triggered) {
+          triggerEmergencySOS('gesture', { gesture: gesture_detected });
+        }
+      }).catch(error => {
+        console.error('Gesture detection error:', error);
+        alert(error.response?.data?.detail || 'Gesture detection failed. Please try again.');
+      });
       
     } catch (error) {
-      console.error('Camera access error:', error);
       setIsGestureActive(false);
-      alert('Camera access denied. Please allow camera access for gesture detection.');
+      if (!stream) {
+        console.error('Camera access error:', error);
+        alert('Camera access denied. Please allow camera access for gesture detection.');
+        return;
+      }
+      stream.getTracks().forEach(track => track.stop());
+      console.error('Hand tracking error:', error);
+      alert('Hand tracking could not start. Please check your connection and try again.');
     }
   };
 
   // Shake detection for mobile devices
+  const packShakeWindow = (samples, sampleRate) => {
+    // Record layout: 16-byte device id, uint16 sample rate, uint32 count, then x,y,z float32 triples
+    const buffer = new ArrayBuffer(22 + samples.length * 12);
+    const view = new DataView(buffer);
+    const deviceId = new TextEncoder().encode(getDeviceId()).slice(0, 16);
+    new Uint8Array(buffer, 0, 16).set(deviceId);
+    view.setUint16(16, sampleRate, true);
+    view.setUint32(18, samples.length, true);
+    samples.forEach((sample, i) => {
+      view.setFloat32(22 + i * 12, sample.x || 0, true);
+      view.setFloat32(26 + i * 12, sample.y || 0, true);
+      view.setFloat32(30 + i * 12, sample.z || 0, true);
+    });
+    return buffer;
+  };
+
   const handleShakeDetection = () => {
     if (window.DeviceMotionEvent) {
-      let shakePattern = [];
-      let lastAcceleration = { x: 0, y: 0, z: 0 };
+      let samples = [];
+      let windowStart = performance.now();
+      let sosSent = false;
       
       const handleMotion = (event) => {
         const acceleration = event.accelerationIncludingGravity;
-        const deltaX = Math.abs(acceleration.x - lastAcceleration.x);
-        const deltaY = Math.abs(acceleration.y - lastAcceleration.y);
-        const deltaZ = Math.abs(acceleration.z - lastAcceleration.z);
+        if (!acceleration) return;
+        samples.push({ x: acceleration.x, y: acceleration.y, z: acceleration.z });
         
-        const intensity = (deltaX + deltaY + deltaZ) / 3;
-        
-        if (intensity > 15) { // Threshold for shake detection
-          shakePattern.push(intensity);
-          
-          if (shakePattern.length >= 3) {
-            // Send shake pattern for analysis
-            axios.post(`${API}/shake-detection`, {
-              pattern: shakePattern,
-              intensity: intensity / 20 // Normalize
-            }).then(response => {
-              if (response.data.sos_triggered) {
-                triggerEmergencySOS('shake', { intensity });
-              }
-            });
-            
-            shakePattern = [];
-          }
+        // Ship raw samples in ~2.5 second windows; the server recognizes the SOS rhythm
+        const elapsed = performance.now() - windowStart;
+        if (elapsed >= 2500 && samples.length >= 2) {
+          const sampleRate = Math.max(1, Math.round(samples.length / (elapsed / 1000)));
+          axios.post(`${API}/shake-detection/batch`, packShakeWindow(samples, sampleRate), {
+            headers: { 'Content-Type': 'application/octet-stream' }
+          }).then(response => {
+            const result = response.data.results[0];
+            if (result.sos_triggered && !sosSent) {
+              sosSent = true;
+              triggerEmergencySOS('shake', { intensity: result.shake_intensity });
+            }
+          });
+          samples = [];
+          windowStart = performance.now();
         }
-        
-        lastAcceleration = acceleration;
       };
       
       window.addEventListener('devicemotion', handleMotion);
@@ -215,7 +287,7 @@ function App() {
         window.removeEventListener('devicemotion', handleMotion);
       }, 10000);
       
-      alert('Shake detection active for 10 seconds. Shake your device 3 times rapidly to test.');
+      alert('Shake detection active for 10 seconds. Shake your device firmly back and forth to test.');
     } else {
       alert('Device motion not supported on this device.');
     }
@@ -244,33 +316,73 @@ function App() {
       
       alert(`Route tracking started to ${destination || 'Red Fort'}. You will be alerted if you deviate from the planned path.`);
       
-      // Simulate location updates every 30 seconds
-      const locationUpdateInterval = setInterval(() => {
-        // Simulate slight location changes
-        const newLocation = {
-          lat: userLocation.lat + (Math.random() - 0.5) * 0.01,
-          lng: userLocation.lng + (Math.random() - 0.5) * 0.01
-        };
-        
-        axios.post(`${API}/location-update`, {
-          route_id: response.data.route_id,
-          current_location: newLocation
-        }).then(updateResponse => {
-          if (updateResponse.data.deviation_detected) {
-            const userResponse = confirm(updateResponse.data.message + '\n\nAre you safe? Click OK if you are safe, Cancel to send SOS.');
-            if (!userResponse) {
-              triggerEmergencySOS('deviation', { location: newLocation });
-            }
+      // Stream positions over a live channel; the server pushes deviation and risk events
+      const socket = new WebSocket(`${API.replace(/^http/, 'ws')}/route-tracking/${response.data.route_id}/live`);
+      let lastLocation = userLocation;
+      
+      socket.onmessage = (messageEvent) => {
+        const event = JSON.parse(messageEvent.data);
+        if (event.event === 'deviation' && event.deviation_detected) {
+          const userResponse = confirm(event.message + '\n\nAre you safe? Click OK if you are safe, Cancel to send SOS.');
+          if (!userResponse) {
+            triggerEmergencySOS('deviation', { location: event.current_location });
           }
-        });
-        
+        } else if (event.event === 'risk') {
+          setRiskData(prev => ({ ...prev, ...event }));
+        } else if (event.event === 'ended') {
+          // Expired or ended from another device: release the sensors locally
+          endTracking(null);
+        }
+      };
+      
+      const sendLocation = (newLocation) => {
+        lastLocation = newLocation;
         setUserLocation(newLocation);
-      }, 30000);
+        if (socket.readyState === WebSocket.OPEN) {
+          socket.send(JSON.stringify({ ...newLocation, timestamp: new Date().toISOString() }));
+        }
+      };
       
-      // Stop tracking after 5 minutes (demo)
-      setTimeout(() => {
-        clearInterval(locationUpdateInterval);
+      let watchId = null;
+      let simulationInterval = null;
+      if (navigator.geolocation) {
+        watchId = navigator.geolocation.watchPosition(
+          (position) => sendLocation({ lat: position.coords.latitude, lng: position.coords.longitude }),
+          (error) => console.log('Live location unavailable:', error),
+          { enableHighAccuracy: true, maximumAge: 5000 }
+        );
+      } else {
+        // Demo: simulate slight location changes when geolocation is unavailable
+        simulationInterval = setInterval(() => {
+          sendLocation({
+            lat: lastLocation.lat + (Math.random() - 0.5) * 0.001,
+            lng: lastLocation.lng + (Math.random() - 0.5) * 0.001
+          });
+        }, 5000);
+      }
+      
+      let completionTimer = null;
+      // outcome is 'stop' or 'complete'; null only releases local resources
+      const endTracking = async (outcome) => {
+        if (watchId !== null) navigator.geolocation.clearWatch(watchId);
+        if (simulationInterval !== null) clearInterval(simulationInterval);
+        clearTimeout(completionTimer);
+        socket.close();
+        endRouteTrackingRef.current = null;
         setRouteTracking(null);
+        if (outcome) {
+          try {
+            await axios.post(`${API}/route-tracking/${response.data.route_id}/${outcome}`);
+          } catch (error) {
+            console.log('Route already ended:', error);
+          }
+        }
+      };
+      endRouteTrackingRef.current = endTracking;
+      
+      // Complete tracking after 5 minutes (demo)
+      completionTimer = setTimeout(() => {
+        endTracking('complete');
         alert('Route tracking completed.');
       }, 300000);
       
@@ -288,7 +400,8 @@ function App() {
       user_location: userLocation,
       alert_type: alertType,
       confidence: additionalData.confidence || 0.9,
-      audio_analysis: additionalData
+      audio_analysis: additionalData,
+      device_id: getDeviceId()
     };
     
     try {
@@ -310,7 +423,7 @@ function App() {
     
     try {
       const response = await axios.post(`${API}/safety-chat`, null, {
-        params: { message }
+        params: { message, lat: userLocation.lat, lng: userLocation.lng }
       });
       
       setChatMessages(prev => [...prev, { 
@@ -594,7 +707,7 @@ function App() {
                     <div className="space-y-4">
                       <div className="bg-white/10 rounded-xl p-4">
                         <h3 className="font-semibold mb-3">Safety Recommendations</h3>
-                        {riskData?.recommendations.map((rec, index) => (
+                        {riskData?.recommendations?.map((rec, index) => (
                           <div key={index} className="flex items-start space-x-2 mb-2">
                             <span className="text-green-400">•</span>
                             <span className="text-sm">{rec}</span>
@@ -604,7 +717,7 @@ function App() {
                       
                       <div className="bg-white/10 rounded-xl p-4">
                         <h3 className="font-semibold mb-3">Recent Incidents</h3>
-                        {riskData?.recent_incidents.map((incident, index) => (
+                        {riskData?.recent_incidents?.map((incident, index) => (
                           <div key={index} className="mb-3 text-sm">
                             <div className="flex justify-between">
                               <span className="font-medium capitalize">{incident.type.replace('_', ' ')}</span>
@@ -767,7 +880,7 @@ function App() {
                       {routeTracking && (
                         <button
                           onClick={() => {
-                            setRouteTracking(null);
+                            if (endRouteTrackingRef.current) endRouteTrackingRef.current('stop');
                             alert('Route tracking stopped.');
                           }}
                           className="w-full bg-red-500 hover:bg-red-600 py-3 rounded-xl font-medium transition-all"
@@ -0,0 +1,263 @@
+#!/usr/bin/env python3
+"""
+SafeGuard Women's Safety App - Backend Load Benchmark
+Drives concurrent asyncio load against each endpoint and reports throughput and
+p50/p95/p99 latency. Runs the app in-process (default) or against a local server
+(--url), and saves results as JSON so runs can be compared between commits.
+
+In-process runs use a real MongoDB when --mongo-url is given and mongomock-motor
+otherwise; the stand-in has no real I/O cost, so database-bound numbers are only
+meaningful with a real server.
+"""
+
+import argparse
+import asyncio
+import json
+import math
+import os
+import random
+import subprocess
+import sys
+import time
+import uuid
+from datetime import datetime
+
+import httpx
+
+BACKEND_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "backend")
+CENTER = (28.6139, 77.2090)  # demo location used by the frontend
+HISTOGRAM_BOUNDS_MS = [0.5, 1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000]
+
+def jitter(scale=0.02):
+    return {"lat": CENTER[0] + random.uniform(-scale, scale), "lng": CENTER[1] + random.uniform(-scale, scale)}
+
+def percentile(sorted_values, q):
+    if not sorted_values:
+        return None
+    rank = min(len(sorted_values) - 1, max(0, math.ceil(q / 100 * len(sorted_values)) - 1))
+    return sorted_values[rank]
+
+def summarize(latencies_ms, errors, elapsed_s):
+    latencies_ms.sort()
+    histogram = {f"<={bound}ms": 0 for bound in HISTOGRAM_BOUNDS_MS}
+    histogram["+Inf"] = 0
+    for value in latencies_ms:
+        for bound in HISTOGRAM_BOUNDS_MS:
+            if value <= bound:
+                histogram[f"<={bound}ms"] += 1
+                break
+        else:
+            histogram["+Inf"] += 1
+    return {
+        "requests": len(latencies_ms),
+        "errors": errors,
+        "throughput_rps": len(latencies_ms) / elapsed_s if elapsed_s else 0.0,
+        "p50_ms": percentile(latencies_ms, 50),
+        "p95_ms": percentile(latencies_ms, 95),
+        "p99_ms": percentile(latencies_ms, 99),
+        "max_ms": latencies_ms[-1] if latencies_ms else None,
+        "histogram": histogram,
+    }
+
+class Scenarios:
+    """Request builders per endpoint; setup() creates the state they depend on"""
+
+    def __init__(self, client):
+        self.client = client
+        self.route_id = None
+
+    async def setup(self):
+        start, end = jitter(), jitter()
+        response = await self.client.post("/api/route-tracking", json={
+            "start_location": start, "destination": end, "current_location": start,
+            "planned_route": [start, {"lat": (start["lat"] + end["lat"]) / 2, "lng": (start["lng"] + end["lng"]) / 2}, end],
+        })
+        response.raise_for_status()
+        self.route_id = response.json()["route_id"]
+        await self.client.post("/api/emergency-contacts", json={"name": "Bench", "phone": "+910000000000", "relation": "Friend"})
+
+    def risk_analysis(self):
+        return self.client.get("/api/risk-analysis", params=jitter())
+
+    def risk_analysis_batch(self):
+        return self.client.post("/api/risk-analysis/batch", json={"points": [jitter() for _ in range(100)]})
+
+    def risk_tile(self):
+        z = 14
+        x = int((CENTER[1] + 180) / 360 * 2 ** z) + random.randint(-2, 2)
+        y = int((1 - math.asinh(math.tan(math.radians(CENTER[0]))) / math.pi) / 2 * 2 ** z) + random.randint(-2, 2)
+        return self.client.get(f"/api/risk-tiles/{z}/{x}/{y}.png")
+
+    def location_update(self):
+        return self.client.post("/api/location-update", params={"route_id": self.route_id}, json=jitter(0.01))
+
+    def location_update_bulk(self):
+        fixes = [{"route_id": self.route_id, "timestamp": datetime.utcnow().isoformat(), **jitter(0.01)} for _ in range(200)]
+        return self.client.post("/api/location-update/bulk", json={"fixes": fixes})
+
+    def emergency_sos(self):
+        return self.client.post("/api/emergency-sos", json={
+            "user_location": jitter(), "alert_type": "manual", "device_id": f"bench-{uuid.uuid4()}",
+        })
+
+    def emergency_contacts(self):
+        return self.client.get("/api/emergency-contacts")
+
+    def safety_chat(self):
+        message = random.choice(["Which is the safest route home?", "Is this area safe?", "I need help", "report an incident"])
+        return self.client.post("/api/safety-chat", params={"message": message, **jitter()})
+
+    def safety_route(self):
+        start, end = jitter(), jitter()
+        return self.client.get("/api/safety-route", params={
+            "start_lat": start["lat"], "start_lng": start["lng"], "end_lat": end["lat"], "end_lng": end["lng"],
+        })
+
+SCENARIOS = {
+    "risk-analysis": Scenarios.risk_analysis,
+    "risk-analysis-batch": Scenarios.risk_analysis_batch,
+    "risk-tiles": Scenarios.risk_tile,
+    "location-update": Scenarios.location_update,
+    "location-update-bulk": Scenarios.location_update_bulk,
+    "emergency-sos": Scenarios.emergency_sos,
+    "emergency-contacts": Scenarios.emergency_contacts,
+    "safety-chat": Scenarios.safety_chat,
+    "safety-route": Scenarios.safety_route,
+}
+
+async def run_scenario(scenarios, builder, concurrency, duration_s):
+    latencies_ms, errors = [], 0
+    deadline = time.perf_counter() + duration_s
+
+    async def worker():
+        nonlocal errors
+        while time.perf_counter() < deadline:
+            start = time.perf_counter()
+            try:
+                response = await builder(scenarios)
+                failed = response.status_code >= 400
+            except httpx.HTTPError:
+                failed = True
+            latencies_ms.append((time.perf_counter() - start) * 1000)
+            errors += failed
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return summarize(latencies_ms, errors, time.perf_counter() - started)
+
+def synthetic_incidents(count):
+    types = ["harassment", "stalking", "catcalling", "theft", "inappropriate_behavior"]
+    return [{
+        "location": jitter(0.1), "incident_type": random.choice(types), "description": "benchmark",
+        "severity": random.randint(1, 5), "timestamp": f"2026-{random.randint(1, 9):02d}-{random.randint(1, 28):02d}T{random.randint(0, 23):02d}:00:00",
+    } for _ in range(count)]
+
+async def seed_incidents(client, count, in_process_server):
+    if not count:
+        return
+    incidents = synthetic_incidents(count)
+    if in_process_server is not None:
+        # Load the risk structures directly; inserting through a stand-in database adds nothing to measure
+        in_process_server.register_incidents(incidents)
+        return
+    body = "\n".join(json.dumps(incident) for incident in incidents)
+    response = await client.post("/api/incidents/import", content=body, headers={"content-type": "application/x-ndjson"}, timeout=600)
+    response.raise_for_status()
+
+def load_in_process_app(mongo_url):
+    os.environ["NOTIFICATION_PROVIDER"] = "local"  # never send real SMS from a benchmark
+    # Every request comes from one client, so per-client rate limits would measure only the limiter
+    os.environ.setdefault("ADMISSION_CONTROL", "off")
+    if mongo_url:
+        os.environ["MONGO_URL"] = mongo_url
+        os.environ.setdefault("DB_NAME", "safeguard_benchmark")
+    sys.path.insert(0, BACKEND_DIR)
+    import server
+    if not mongo_url:
+        try:
+            from mongomock_motor import AsyncMongoMockClient
+        except ImportError:
+            sys.exit("In-process runs need --mongo-url or the mongomock-motor package")
+        server.db = AsyncMongoMockClient()["safeguard_benchmark"]
+    return server
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def print_comparison(results, baseline_path):
+    with open(baseline_path) as f:
+        baseline = json.load(f)
+    print(f"\n📊 Compared with {baseline_path} (commit {baseline.get('commit')})")
+    for name, current in results["scenarios"].items():
+        previous = baseline.get("scenarios", {}).get(name)
+        if not previous or not previous.get("p95_ms") or not current.get("p95_ms"):
+            continue
+        rps_change = (current["throughput_rps"] / previous["throughput_rps"] - 1) * 100 if previous["throughput_rps"] else 0.0
+        p95_change = (current["p95_ms"] / previous["p95_ms"] - 1) * 100
+        flag = "⚠️ " if p95_change > 10 or rps_change < -10 else "  "
+        print(f"{flag}{name:<24} throughput {rps_change:+7.1f}%   p95 {p95_change:+7.1f}%")
+
+async def main_async(args):
+    in_process_server = None
+    if args.url:
+        transport, base_url = None, args.url.rstrip("/")
+    else:
+        in_process_server = load_in_process_app(args.mongo_url)
+        transport, base_url = httpx.ASGITransport(app=in_process_server.app), "http://benchmark"
+
+    limits = httpx.Limits(max_connections=args.concurrency * 2, max_keepalive_connections=args.concurrency * 2)
+    async with httpx.AsyncClient(base_url=base_url, transport=transport, limits=limits, timeout=30) as client:
+        lifespan = in_process_server.app.router.lifespan_context(in_process_server.app) if in_process_server else None
+        if lifespan:
+            await lifespan.__aenter__()
+        try:
+            await seed_incidents(client, args.seed_incidents, in_process_server)
+            scenarios = Scenarios(client)
+            await scenarios.setup()
+            results = {
+                "commit": git_commit(),
+                "timestamp": datetime.utcnow().isoformat(),
+                "target": args.url or ("in-process, mongo " + ("server" if args.mongo_url else "stand-in")),
+                "concurrency": args.concurrency,
+                "duration_s": args.duration,
+                "scenarios": {},
+            }
+            print(f"🚀 Benchmarking {results['target']} with {args.concurrency} concurrent clients, {args.duration}s per endpoint")
+            print(f"{'endpoint':<24}{'requests':>10}{'errors':>8}{'req/s':>10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+            print("=" * 82)
+            for name in args.scenarios:
+                summary = await run_scenario(scenarios, SCENARIOS[name], args.concurrency, args.duration)
+                results["scenarios"][name] = summary
+                print(f"{name:<24}{summary['requests']:>10}{summary['errors']:>8}{summary['throughput_rps']:>10.1f}"
+                      f"{summary['p50_ms'] or 0:>10.2f}{summary['p95_ms'] or 0:>10.2f}{summary['p99_ms'] or 0:>10.2f}")
+        finally:
+            if lifespan:
+                await lifespan.__aexit__(None, None, None)
+
+    with open(args.output, "w") as f:
+        json.dump(results, f, indent=2)
+    print(f"\n📄 Results written to {args.output}")
+    if args.compare:
+        print_comparison(results, args.compare)
+    return 0
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", help="benchmark a running server (e.g. http://127.0.0.1:8001) instead of the in-process app")
+    parser.add_argument("--mongo-url", help="MongoDB for in-process runs; defaults to the mongomock-motor stand-in")
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--duration", type=float, default=5.0, help="seconds of load per endpoint")
+    parser.add_argument("--seed-incidents", type=int, default=20000, help="synthetic incidents loaded before the run")
+    parser.add_argument("--scenarios", nargs="+", choices=sorted(SCENARIOS), default=list(SCENARIOS))
+    parser.add_argument("--output", default="benchmark_results.json")
+    parser.add_argument("--compare", metavar="PATH", help="earlier results file to diff against")
+    args = parser.parse_args()
+    random.seed(7)
+    return asyncio.run(main_async(args))
+
+if __name__ == "__main__":
+    sys.exit(main())
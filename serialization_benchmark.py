@@ -0,0 +1,137 @@
+#!/usr/bin/env python3
+"""
+SafeGuard Women's Safety App - Response Serialization Benchmark
+Compares the default FastAPI path (dicts / Pydantic models -> jsonable_encoder -> json)
+with the ORJSONResponse + slotted dataclass path used by the hot endpoints.
+"""
+
+import argparse
+import json
+import os
+import statistics
+import sys
+import time
+import tracemalloc
+import uuid
+from datetime import datetime
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "backend"))
+
+from fastapi.encoders import jsonable_encoder  # noqa: E402
+from starlette.responses import JSONResponse  # noqa: E402
+
+import server  # noqa: E402
+from server import (  # noqa: E402
+    EmergencyContact, ORJSONResponse, RiskAnalysis, RiskPoint, RouteTrackingReceipt, SOSAlertReceipt,
+)
+
+def risk_batch_cases(n=20000):
+    rows = [(28.6 + i * 1e-5, 77.2 + i * 1e-5, (i % 7) / 7, i % 9) for i in range(n)]
+    at = datetime.utcnow()
+
+    def default():
+        return {"radius": 1000, "at": at, "results": [
+            {"lat": lat, "lng": lng, "risk_score": score, "risk_level": server.get_risk_level(score), "incident_count": count}
+            for lat, lng, score, count in rows
+        ]}
+
+    def fast():
+        return {"radius": 1000, "at": at, "results": [
+            RiskPoint(lat, lng, score, server.get_risk_level(score), count) for lat, lng, score, count in rows
+        ]}
+
+    return default, fast
+
+def risk_single_cases():
+    incidents = server.DEMO_INCIDENTS[:3]
+    at = datetime.utcnow()
+    fields = dict(location={"lat": 28.6139, "lng": 77.209}, at=at, risk_score=0.6, risk_level="medium",
+                  incident_count=4, recent_incidents=incidents, recommendations=server.get_safety_recommendations("medium"))
+    return (lambda: dict(fields)), (lambda: RiskAnalysis(**fields))
+
+def sos_cases():
+    alert_id, timestamp = str(uuid.uuid4()), datetime.utcnow()
+    message = "Emergency alert sent to your contacts and authorities"
+    return (
+        lambda: {"alert_id": alert_id, "status": "alert_sent", "message": message, "timestamp": timestamp},
+        lambda: SOSAlertReceipt(alert_id=alert_id, status="alert_sent", message=message, timestamp=timestamp),
+    )
+
+def route_tracking_cases():
+    route_id = str(uuid.uuid4())
+    message = "Route tracking activated. You will be alerted if you deviate from the planned path."
+    return (
+        lambda: {"route_id": route_id, "status": "tracking_started", "message": message},
+        lambda: RouteTrackingReceipt(route_id=route_id, status="tracking_started", message=message),
+    )
+
+def location_bulk_cases(n=10000):
+    route_id, now = str(uuid.uuid4()), datetime.utcnow()
+    verdicts = [(now, i % 50 == 0, float(i % 600)) for i in range(n)]
+
+    def default():
+        return {"accepted": n, "rejected": 0, "results": [
+            {"route_id": route_id, "timestamp": ts, "deviation_detected": dev, "deviation_distance_m": dist}
+            for ts, dev, dist in verdicts
+        ]}
+
+    return default, default
+
+def contacts_cases(n=50):
+    docs = [{"id": str(uuid.uuid4()), "name": f"Contact {i}", "phone": f"+9100000{i:04d}", "relation": "Friend",
+             "priority": i, "owner_id": "default"} for i in range(n)]
+    # The default path is the original handler: one Pydantic model per document
+    return (lambda: [EmergencyContact(**doc) for doc in docs]), (lambda: [dict(doc) for doc in docs])
+
+CASES = {
+    "POST /api/risk-analysis/batch (20k points)": risk_batch_cases,
+    "GET /api/risk-analysis": risk_single_cases,
+    "POST /api/emergency-sos": sos_cases,
+    "POST /api/route-tracking": route_tracking_cases,
+    "POST /api/location-update/bulk (10k fixes)": location_bulk_cases,
+    "GET /api/emergency-contacts (50)": contacts_cases,
+}
+
+def default_response(build):
+    return JSONResponse(jsonable_encoder(build()))
+
+def fast_response(build):
+    return ORJSONResponse(build())
+
+def measure(render, build, repeat, min_seconds=0.25):
+    timings = []
+    while len(timings) < repeat or sum(timings) < min_seconds:
+        start = time.perf_counter()
+        body = render(build).body
+        timings.append(time.perf_counter() - start)
+    tracemalloc.start()
+    render(build)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {"median_ms": statistics.median(timings) * 1000, "peak_kib": peak / 1024, "bytes": len(body)}
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=20, help="minimum timed runs per endpoint")
+    parser.add_argument("--json", metavar="PATH", help="also write the results to a JSON file")
+    args = parser.parse_args()
+
+    results = {}
+    print(f"{'endpoint':<46}{'default ms':>12}{'fast ms':>10}{'speedup':>9}{'default KiB':>13}{'fast KiB':>10}")
+    print("=" * 100)
+    for name, cases in CASES.items():
+        default_build, fast_build = cases()
+        default = measure(default_response, default_build, args.repeat)
+        fast = measure(fast_response, fast_build, args.repeat)
+        results[name] = {"default": default, "fast": fast}
+        print(f"{name:<46}{default['median_ms']:>12.3f}{fast['median_ms']:>10.3f}"
+              f"{default['median_ms'] / fast['median_ms']:>8.1f}x{default['peak_kib']:>13.1f}{fast['peak_kib']:>10.1f}")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"\n📄 Results written to {args.json}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,36 @@
+import os
+import sys
+from pathlib import Path
+
+import pytest
+
+os.environ.setdefault("MONGO_URL", "mongodb://localhost:27017")
+os.environ.setdefault("DB_NAME", "safeguard_test")
+os.environ["NOTIFICATION_PROVIDER"] = "local"
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "backend"))
+
+import server  # noqa: E402
+
+@pytest.fixture
+def db(monkeypatch):
+    """In-memory stand-in for the Mongo database"""
+    from mongomock_motor import AsyncMongoMockClient
+    database = AsyncMongoMockClient()["safeguard_test"]
+    monkeypatch.setattr(server, "db", database)
+    return database
+
+@pytest.fixture
+def index(monkeypatch):
+    """Empty risk index and caches; returns a function that registers incidents at points"""
+    monkeypatch.setattr(server, "incident_index", server.IncidentIndex())
+    monkeypatch.setattr(server, "risk_aggregates", server.RiskAggregates())
+    monkeypatch.setattr(server, "risk_tiles", server.RiskTileCache())
+    monkeypatch.setattr(server, "risk_cache", server.RiskResultCache())
+    server.incident_index.ready = True
+
+    def register(*points, severity=3):
+        server.register_incidents([
+            {"lat": lat, "lng": lng, "type": "theft", "severity": severity, "timestamp": "2025-05-20T18:00:00"}
+            for lat, lng in points
+        ])
+    return register
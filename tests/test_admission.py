@@ -0,0 +1,72 @@
+import ipaddress
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+import pytest
+
+import server
+
+def scope(peer, forwarded=None):
+    headers = [(b"x-forwarded-for", forwarded.encode())] if forwarded else []
+    return {"type": "http", "path": "/api/safety-chat", "client": (peer, 50000), "headers": headers}
+
+@pytest.fixture
+def trusted(monkeypatch):
+    monkeypatch.setattr(server, "TRUSTED_PROXIES", (ipaddress.ip_network("10.0.0.0/8"),))
+
+def test_forwarded_for_is_ignored_from_untrusted_peers(trusted):
+    assert server.admission_client(scope("203.0.113.9", "198.51.100.1")) == "203.0.113.9"
+
+def test_forwarded_for_is_used_from_trusted_proxies(trusted):
+    assert server.admission_client(scope("10.0.0.2", "198.51.100.1")) == "198.51.100.1"
+    assert server.admission_client(scope("10.0.0.2")) == "10.0.0.2"
+
+def test_spoofed_hops_left_of_the_real_client_are_ignored(trusted):
+    assert server.admission_client(scope("10.0.0.2", "1.2.3.4, 198.51.100.1, 10.0.0.7")) == "198.51.100.1"
+
+def test_forwarded_for_is_ignored_without_trusted_proxies():
+    assert server.admission_client(scope("10.0.0.2", "198.51.100.1")) == "10.0.0.2"
+
+def test_rate_limit_spares_critical_routes(monkeypatch):
+    monkeypatch.setattr(server.loop_lag_monitor, "last_s", 0.0)
+    controller = server.AdmissionController()
+    _, burst = server.ADMISSION_RATES["normal"]
+    for _ in range(burst):
+        assert controller.admit("198.51.100.1", "normal") is None
+    status, reason, retry_after = controller.admit("198.51.100.1", "normal")
+    assert (status, reason) == (429, "rate_limited") and retry_after > 0
+    assert controller.admit("198.51.100.2", "normal") is None
+    assert controller.admit("198.51.100.1", "critical") is None
+
+def test_token_buckets_are_capped(monkeypatch):
+    monkeypatch.setattr(server, "ADMISSION_CLIENTS_MAX", 2)
+    controller = server.AdmissionController()
+    for client in ("a", "b", "c"):
+        controller.admit(client, "normal")
+    assert list(controller.buckets) == [("b", "normal"), ("c", "normal")]
+
+def test_map_tiles_have_their_own_larger_bucket(monkeypatch):
+    monkeypatch.setattr(server.loop_lag_monitor, "last_s", 0.0)
+    controller = server.AdmissionController()
+    _, tile_burst = server.ADMISSION_RATES["tiles"]
+    _, low_burst = server.ADMISSION_RATES["low"]
+    assert tile_burst > low_burst
+    for _ in range(tile_burst):
+        assert controller.admit("198.51.100.1", "low", "tiles") is None
+        controller.release("low")
+    assert controller.admit("198.51.100.1", "low", "tiles")[0] == 429
+    assert controller.admit("198.51.100.1", "low") is None
+
+@pytest.mark.parametrize("env, enabled", [
+    ({}, False),
+    ({"TRUSTED_PROXIES": "10.0.0.0/8"}, True),
+    ({"ADMISSION_CONTROL": "on"}, True),
+])
+def test_admission_defaults_to_off_without_trusted_proxies(env, enabled):
+    environment = {k: v for k, v in os.environ.items() if k not in ("TRUSTED_PROXIES", "ADMISSION_CONTROL")}
+    result = subprocess.run([sys.executable, "-c", "import server; print(server.ADMISSION_CONTROL)"],
+                            cwd=Path(server.__file__).parent, env={**environment, **env},
+                            capture_output=True, text=True, check=True)
+    assert result.stdout.strip() == str(enabled)
@@ -0,0 +1,65 @@
+import asyncio
+
+from fastapi.testclient import TestClient
+
+import server
+
+def contact(contact_id, priority, owner_id="u1"):
+    return {"id": contact_id, "name": f"Contact {contact_id}", "phone": "+15550000", "relation": "friend",
+            "priority": priority, "owner_id": owner_id}
+
+def contacts_api(db, monkeypatch):
+    monkeypatch.setattr(server, "ADMISSION_CONTROL", False)
+    monkeypatch.setattr(server, "contact_cache", server.ContactCache())
+    return TestClient(server.app)
+
+def test_cursor_pages_walk_the_priority_order(db, monkeypatch):
+    client = contacts_api(db, monkeypatch)
+    stored = [contact(f"c{i}", priority) for i, priority in enumerate([3, 1, 2, 1, 5, 2, 1])]
+    asyncio.run(db.emergency_contacts.insert_many([*stored, contact("other", 1, owner_id="u2")]))
+
+    pages, cursor = [], None
+    while True:
+        response = client.get("/api/emergency-contacts", params={"owner_id": "u1", "limit": 3, **({"cursor": cursor} if cursor else {})})
+        pages.append([(c["priority"], c["id"]) for c in response.json()])
+        cursor = response.headers.get("x-next-cursor")
+        if cursor is None:
+            break
+
+    assert [len(page) for page in pages] == [3, 3, 1]
+    assert [key for page in pages for key in page] == sorted((c["priority"], c["id"]) for c in stored)
+    assert client.get("/api/emergency-contacts", params={"owner_id": "u1", "cursor": "!!"}).status_code == 400
+
+def test_contacts_without_an_owner_belong_to_the_default_owner(db, monkeypatch):
+    client = contacts_api(db, monkeypatch)
+    legacy = contact("legacy", 1)
+    del legacy["owner_id"]
+    asyncio.run(db.emergency_contacts.insert_many([legacy, contact("mine", 2, owner_id="u1")]))
+
+    assert [c["id"] for c in client.get("/api/emergency-contacts").json()] == ["legacy"]
+    assert client.get("/api/emergency-contacts").json()[0]["owner_id"] == server.DEFAULT_CONTACT_OWNER
+    assert [c["id"] for c in client.get("/api/emergency-contacts", params={"owner_id": "u1"}).json()] == ["mine"]
+
+def test_cached_lists_are_dropped_when_the_owner_adds_a_contact(db, monkeypatch):
+    client = contacts_api(db, monkeypatch)
+    asyncio.run(db.emergency_contacts.insert_one(contact("c1", 2)))
+    assert [c["id"] for c in client.get("/api/emergency-contacts", params={"owner_id": "u1"}).json()] == ["c1"]
+
+    # A write that bypasses the API (another worker) is not seen until the entry is dropped
+    asyncio.run(db.emergency_contacts.insert_one(contact("c2", 3)))
+    assert [c["id"] for c in client.get("/api/emergency-contacts", params={"owner_id": "u1"}).json()] == ["c1"]
+
+    client.post("/api/emergency-contacts", json=contact("c3", 1))
+    assert [c["id"] for c in client.get("/api/emergency-contacts", params={"owner_id": "u1"}).json()] == ["c3", "c1", "c2"]
+
+def test_cached_lists_expire(db):
+    async def run():
+        cache = server.ContactCache(ttl_s=0)
+        await db.emergency_contacts.insert_one(contact("c1", 1))
+        first = await cache.get("u1")
+        await db.emergency_contacts.insert_one(contact("c2", 2))
+        await asyncio.sleep(0.01)
+        return first, await cache.get("u1")
+
+    first, second = asyncio.run(run())
+    assert [c["id"] for c in first] == ["c1"] and [c["id"] for c in second] == ["c1", "c2"]
@@ -0,0 +1,103 @@
+import asyncio
+
+import pytest
+
+import server
+
+async def collect(subscription, count):
+    events = []
+    async for event in subscription:
+        events.append(event)
+        if len(events) == count:
+            return events
+
+def test_default_bus_is_in_process():
+    assert type(server.configured_event_bus("")) is server.InProcessEventBus
+    assert type(server.configured_event_bus("redis://localhost:6379")) is server.RESPEventBus
+    with pytest.raises(ValueError):
+        server.configured_event_bus("amqp://localhost")
+
+def test_in_process_bus_delivers_to_every_subscriber():
+    async def run():
+        bus = server.InProcessEventBus()
+        await bus.start()
+        async with bus.subscribe("sos") as first, bus.subscribe("sos", "route:r1") as second:
+            bus.publish("sos", {"alert_id": "a1"})
+            bus.publish("route:r1", {"route_id": "r1"})
+            bus.publish("sos", {"alert_id": "a2"})
+            received = await asyncio.wait_for(asyncio.gather(collect(first, 2), collect(second, 3)), 1)
+        await bus.stop()
+        return received, bus.published
+
+    (first, second), published = asyncio.run(run())
+    assert first == [{"alert_id": "a1"}, {"alert_id": "a2"}]
+    # Order holds within a channel; a batch is delivered one channel at a time
+    assert [event for event in second if "alert_id" in event] == first
+    assert [event for event in second if "route_id" in event] == [{"route_id": "r1"}]
+    assert published == 3
+
+class PubSubServer:
+    """Just enough of the Redis SUBSCRIBE/PUBLISH protocol for RESPEventBus"""
+
+    def __init__(self):
+        self.channels = {}
+
+    async def handle(self, reader, writer):
+        try:
+            while True:
+                command, *args = await server.read_resp(reader)
+                if command == b"SUBSCRIBE":
+                    for channel in args:
+                        self.channels.setdefault(channel, set()).add(writer)
+                        writer.write(server.resp_command("subscribe", channel, len(self.channels)))
+                elif command == b"UNSUBSCRIBE":
+                    for channel in args:
+                        self.channels.get(channel, set()).discard(writer)
+                elif command == b"PUBLISH":
+                    channel, message = args
+                    receivers = self.channels.get(channel, set())
+                    for receiver in receivers:
+                        receiver.write(server.resp_command("message", channel, message))
+                    writer.write(b":%d\r\n" % len(receivers))
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            for writers in self.channels.values():
+                writers.discard(writer)
+            writer.close()
+
+def test_resp_bus_delivers_across_workers():
+    async def run():
+        broker = PubSubServer()
+        tcp = await asyncio.start_server(broker.handle, "127.0.0.1", 0)
+        url = "redis://127.0.0.1:%d" % tcp.sockets[0].getsockname()[1]
+        workers = [server.RESPEventBus(url), server.RESPEventBus(url)]
+        subscriptions = [worker.subscribe("sos") for worker in workers]
+        for subscription in subscriptions:
+            await subscription.__aenter__()
+        for worker in workers:
+            await worker.start()
+        while len(broker.channels.get(b"safeguard:sos", ())) < 2:
+            await asyncio.sleep(0.01)
+
+        workers[0].publish("sos", {"alert_id": "a1"})
+        workers[0].publish("sos", {"alert_id": "a2"})
+        received = await asyncio.wait_for(asyncio.gather(*(collect(s, 2) for s in subscriptions)), 2)
+
+        for subscription in subscriptions:
+            await subscription.__aexit__(None, None, None)
+        for worker in workers:
+            await worker.stop()
+        tcp.close()
+        await tcp.wait_closed()
+        return received
+
+    for events in asyncio.run(run()):
+        assert events == [{"alert_id": "a1"}, {"alert_id": "a2"}]
+
+def test_buses_must_implement_send():
+    class Incomplete(server.EventBus):
+        pass
+
+    with pytest.raises(TypeError):
+        Incomplete()
@@ -0,0 +1,40 @@
+from fastapi.testclient import TestClient
+
+import server
+
+THUMB_OUT = [(0.35, -0.25), (0.55, -0.45), (0.75, -0.6), (0.9, -0.72)]
+KNUCKLES = [(0.25, -0.95), (0.0, -1.0), (-0.22, -0.95), (-0.42, -0.85)]
+
+def open_palm_frame(wrist=(0.5, 0.8), size=0.12):
+    """An open hand in MediaPipe image coordinates (x right, y down, normalized to the frame)"""
+    palm = [(0.0, 0.0)] + THUMB_OUT
+    for bx, by in KNUCKLES:
+        palm += [(bx, by), (bx * 1.15, by - 0.45), (bx * 1.25, by - 0.75), (bx * 1.3, by - 1.0)]
+    return {"landmarks": [[wrist[0] + x * size, wrist[1] + y * size, 0.0] for x, y in palm]}
+
+class InlineBatcher:
+    def __init__(self):
+        self.model = server.GestureModel.load(None)
+
+    async def classify(self, features):
+        return self.model.predict(features)
+
+def test_frames_of_hand_landmarks_are_classified(monkeypatch):
+    monkeypatch.setattr(server, "ADMISSION_CONTROL", False)
+    monkeypatch.setattr(server, "gesture_batcher", InlineBatcher())
+    client = TestClient(server.app)
+
+    frames = [open_palm_frame(wrist=(0.4 + 0.02 * i, 0.8), size=0.1 + 0.01 * i) for i in range(5)]
+    response = client.post("/api/gesture-detection", json={"frames": frames}).json()
+
+    assert response["sos_triggered"]
+    assert [r["gesture_detected"] for r in response["results"]] == ["open_palm"] * 5
+    assert client.post("/api/gesture-detection", json=frames[0]).json()["gesture_detected"] == "open_palm"
+
+def test_requests_without_landmarks_are_rejected(monkeypatch):
+    monkeypatch.setattr(server, "ADMISSION_CONTROL", False)
+    monkeypatch.setattr(server, "gesture_batcher", InlineBatcher())
+    client = TestClient(server.app)
+
+    assert client.post("/api/gesture-detection", json={"type": "open_palm", "timestamp": "2025-06-01T18:40:00"}).status_code == 422
+    assert client.post("/api/gesture-detection", json={"frames": [{"landmarks": [[0, 0, 0]] * 20}]}).status_code == 422
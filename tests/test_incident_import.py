@@ -0,0 +1,71 @@
+import asyncio
+import gzip
+import json
+
+import pytest
+from fastapi.testclient import TestClient
+
+import server
+
+CSV = (b"latitude,longitude,type,severity,timestamp\n"
+       b"28.61,77.21,theft,3,2025-05-20T18:00:00\n"
+       b"28.62,77.22,assault,5,\n"
+       b"not-a-lat,77.23,theft,2,2025-05-20T18:00:00\n"
+       b"28.63,77.24,harassment,9,2025-05-20T18:00:00\n")
+
+def ndjson(*records):
+    return b"\n".join(json.dumps(record).encode() for record in records) + b"\n"
+
+def upload(body, content_type, **headers):
+    client = TestClient(server.app)
+    return client.post("/api/incidents/import", content=body, headers={"content-type": content_type, **headers})
+
+@pytest.fixture
+def importer(db, index, monkeypatch):
+    monkeypatch.setattr(server, "ADMISSION_CONTROL", False)
+    monkeypatch.setattr(server, "road_graph", None)
+    return db
+
+def stored(db):
+    return asyncio.run(db.incidents.count_documents({}))
+
+def test_csv_rows_are_imported_and_bad_rows_reported(importer):
+    response = upload(CSV, "text/csv").json()
+
+    assert (response["imported"], response["rejected"]) == (2, 2)
+    assert [error.split(":")[0] for error in response["errors"]] == ["line 4", "line 5"]
+    assert stored(importer) == 2 and len(server.incident_index) == 2
+
+def test_gzipped_ndjson_is_imported(importer):
+    body = ndjson(*({"location": {"lat": 28.6 + i / 1000, "lng": 77.2}, "incident_type": "theft", "severity": 2} for i in range(5)))
+    body += b"[1, 2]\n{not json\n"
+
+    response = upload(gzip.compress(body), "application/x-ndjson", **{"content-encoding": "gzip"}).json()
+
+    assert (response["imported"], response["rejected"]) == (5, 2)
+    assert stored(importer) == 5
+
+def test_truncated_gzip_is_rejected(importer):
+    body = gzip.compress(ndjson({"lat": 28.6, "lng": 77.2, "incident_type": "theft"}))
+
+    response = upload(body[:-6], "application/x-ndjson", **{"content-encoding": "gzip"})
+
+    assert response.status_code == 400
+
+def test_overlong_lines_are_rejected(importer):
+    description = "x" * server.INCIDENT_IMPORT_MAX_LINE_BYTES
+    line = json.dumps({"lat": 28.6, "lng": 77.2, "incident_type": "theft", "description": description}).encode()
+
+    assert upload(line + b"\n", "application/x-ndjson").status_code == 413
+    assert upload(gzip.compress(line * 50), "application/x-ndjson", **{"content-encoding": "gzip"}).status_code == 413
+    assert stored(importer) == 0
+
+def test_failed_inserts_are_counted_as_rejected(importer):
+    asyncio.run(importer.incidents.create_index("location.lat", unique=True))
+    record = {"lat": 28.6, "lng": 77.2, "incident_type": "theft"}
+
+    response = upload(ndjson(record, {**record, "lng": 77.3}, {**record, "lat": 28.7}), "application/x-ndjson").json()
+
+    assert (response["imported"], response["rejected"]) == (2, 1)
+    assert "E11000" in response["errors"][0]
+    assert stored(importer) == 2 and len(server.incident_index) == 2
@@ -0,0 +1,39 @@
+from fastapi.testclient import TestClient
+
+import server
+
+ROUTE = [{"lat": 28.6, "lng": 77.2}, {"lat": 28.61, "lng": 77.21}]
+
+def live_route(monkeypatch):
+    routes = server.ActiveRouteCache()
+    routes.put(server.RouteData(id="r1", start_location=ROUTE[0], destination=ROUTE[-1],
+                                planned_route=ROUTE, current_location=ROUTE[0]).dict())
+    monkeypatch.setattr(server, "active_routes_cache", routes)
+    monkeypatch.setattr(server, "location_buffer", server.LocationWriteBuffer())
+    monkeypatch.setattr(server, "event_bus", server.InProcessEventBus())
+
+def test_malformed_messages_get_an_error_and_keep_the_channel_open(index, monkeypatch):
+    live_route(monkeypatch)
+    with TestClient(server.app).websocket_connect("/api/route-tracking/r1/live") as websocket:
+        for malformed in ("not json", "[1, 2]", '{"lat": 28.6}'):
+            websocket.send_text(malformed)
+            assert websocket.receive_json()["event"] == "error"
+        websocket.send_bytes(b"\xff")
+        assert websocket.receive_json()["event"] == "error"
+
+        websocket.send_json({"lat": 28.6, "lng": 77.2})
+        assert websocket.receive_json()["event"] == "risk"
+
+    assert server.location_buffer.pending_count == 1
+
+def test_risk_events_carry_the_rest_fields(index, monkeypatch):
+    live_route(monkeypatch)
+    index((28.6, 77.2005), (28.6005, 77.2))
+
+    with TestClient(server.app).websocket_connect("/api/route-tracking/r1/live") as websocket:
+        websocket.send_json({"lat": 28.6, "lng": 77.2})
+        event = websocket.receive_json()
+
+    assert event["event"] == "risk"
+    assert event["incident_count"] == 2 and len(event["recent_incidents"]) == 2
+    assert event["recommendations"]
@@ -0,0 +1,55 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+import orjson
+
+import server
+
+START = datetime(2025, 3, 1, 8, 0, 0)
+
+def fixes(flags, start=START):
+    return [{
+        "route_id": "r1",
+        "lat": 28.6 + i * 0.0001,
+        "lng": 77.2 - i * 0.00013,
+        "timestamp": start + timedelta(seconds=i * 5, milliseconds=i * 7),
+        "deviation_detected": flag,
+    } for i, flag in enumerate(flags)]
+
+def test_trace_round_trip_keeps_every_flag_and_timestamp():
+    original = fixes([True, True, False, True, False, False, True, True])
+
+    decoded = list(server.decode_trace(server.encode_trace(original)))
+
+    assert [(t, round(lat, 5), round(lng, 5), flag) for t, lat, lng, flag in decoded] == [
+        (server.epoch_ms(fix["timestamp"]), round(fix["lat"], 5), round(fix["lng"], 5), fix["deviation_detected"])
+        for fix in original
+    ]
+
+def test_trace_round_trip_of_out_of_order_fixes():
+    original = fixes([True, False, True])
+    original.reverse()
+
+    decoded = list(server.decode_trace(server.encode_trace(original)))
+
+    assert [t for t, *_ in decoded] == [server.epoch_ms(fix["timestamp"]) for fix in original]
+    assert [flag for *_, flag in decoded] == [True, False, True]
+
+def test_staged_naive_and_aware_timestamps_are_stored_in_order(db):
+    naive, aware = fixes([False, True, False]), fixes([True, False], START + timedelta(seconds=2))
+    for fix in aware:
+        fix["timestamp"] = fix["timestamp"].replace(tzinfo=timezone.utc).astimezone(timezone(timedelta(hours=5, minutes=30)))
+
+    async def run():
+        buffer = server.LocationWriteBuffer()
+        buffer.stage(naive)
+        buffer.stage(aware)
+        await buffer.flush(force=True)
+        chunk = await db.location_traces.find_one({"route_id": "r1"})
+        return chunk, [line async for line in server.iter_trace("r1", None, None)]
+
+    chunk, body = asyncio.run(run())
+    assert chunk["count"] == 5
+    lines = [orjson.loads(line) for line in b"".join(body).splitlines()]
+    assert [line["deviation_detected"] for line in lines] == [False, True, True, False, False]
+    assert [line["timestamp"] for line in lines] == sorted(line["timestamp"] for line in lines)
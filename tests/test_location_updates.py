@@ -0,0 +1,157 @@
+import asyncio
+import math
+from datetime import datetime, timedelta
+
+from fastapi.testclient import TestClient
+
+import server
+
+# Two vertices ~1.1 km apart along a meridian
+ROUTE = [{"lat": 28.6, "lng": 77.2}, {"lat": 28.61, "lng": 77.2}]
+
+def meters_east(lng, meters, lat=28.605):
+    return lng + meters / (server.METERS_PER_DEGREE_LAT * math.cos(math.radians(lat)))
+
+def tracked(db, monkeypatch, *route_ids):
+    monkeypatch.setattr(server, "ADMISSION_CONTROL", False)
+    routes = server.ActiveRouteCache()
+    for route_id in route_ids:
+        routes.put(server.RouteData(id=route_id, start_location=ROUTE[0], destination=ROUTE[-1],
+                                    planned_route=ROUTE, current_location=ROUTE[0]).dict())
+    monkeypatch.setattr(server, "active_routes_cache", routes)
+    monkeypatch.setattr(server, "location_buffer", server.LocationWriteBuffer())
+    monkeypatch.setattr(server, "event_bus", server.InProcessEventBus())
+    return TestClient(server.app)
+
+def test_deviation_is_measured_against_route_segments(db, monkeypatch):
+    client = tracked(db, monkeypatch, "r1")
+
+    def update(meters):
+        location = {"lat": 28.605, "lng": meters_east(77.2, meters)}
+        return client.post("/api/location-update", params={"route_id": "r1"}, json=location).json()
+
+    # Both points are over 500 m from either vertex; only the second is off the path between them
+    on_path, off_path = update(100), update(800)
+    assert not on_path["deviation_detected"] and abs(on_path["deviation_distance_m"] - 100) < 2
+    assert off_path["deviation_detected"] and abs(off_path["deviation_distance_m"] - 800) < 5
+    assert asyncio.run(db.active_routes.count_documents({})) == 0  # served from the cache
+
+def test_bulk_update_scores_each_fix_and_buffers_the_accepted_ones(db, monkeypatch):
+    client = tracked(db, monkeypatch, "r1", "r2")
+    start = datetime(2025, 3, 1, 8, 0)
+    fixes = [
+        {"route_id": "r1", "lat": 28.601, "lng": 77.2, "timestamp": start.isoformat()},
+        {"route_id": "gone", "lat": 28.601, "lng": 77.2, "timestamp": start.isoformat()},
+        {"route_id": "r2", "lat": 28.605, "lng": meters_east(77.2, 800), "timestamp": start.isoformat()},
+        {"route_id": "r1", "lat": 28.602, "lng": 77.2, "timestamp": (start + timedelta(seconds=5)).isoformat()},
+    ]
+
+    response = client.post("/api/location-update/bulk", json={"fixes": fixes}).json()
+
+    assert (response["accepted"], response["rejected"]) == (3, 1)
+    assert [result["route_id"] for result in response["results"]] == ["r1", "gone", "r2", "r1"]
+    assert response["results"][1]["error"] == "Route not found"
+    assert [result.get("deviation_detected") for result in response["results"]] == [False, None, True, False]
+    assert server.location_buffer.pending_count == 3
+    assert asyncio.run(db.location_traces.count_documents({})) == 0  # nothing written until a flush
+
+    monkeypatch.setattr(server, "BULK_LOCATION_MAX_FIXES", 2)
+    assert client.post("/api/location-update/bulk", json={"fixes": fixes}).status_code == 413
+
+def staged(buffer, route_id, count, start=datetime(2025, 3, 1, 8, 0)):
+    buffer.stage([{"route_id": route_id, "lat": 28.6 + i * 1e-4, "lng": 77.2, "timestamp": start + timedelta(seconds=i),
+                   "deviation_detected": False} for i in range(count)])
+
+def test_buffer_flushes_full_and_stale_routes_only(db, monkeypatch):
+    async def run():
+        buffer = server.LocationWriteBuffer(segment_fixes=4, max_age_s=60)
+        staged(buffer, "full", 4)
+        staged(buffer, "stale", 1)
+        staged(buffer, "fresh", 1)
+        buffer.pending_since["stale"] -= 120
+        await buffer.flush()
+        written = {doc["route_id"]: doc["count"] async for doc in db.location_traces.find()}
+        return buffer, written
+
+    buffer, written = asyncio.run(run())
+    assert written == {"full": 4, "stale": 1}
+    assert list(buffer.pending) == ["fresh"] and buffer.pending_count == 1
+
+def test_full_chunks_are_closed_and_a_new_one_started(db):
+    async def run():
+        buffer = server.LocationWriteBuffer(chunk_fixes=5)
+        for batch in range(3):
+            staged(buffer, "r1", 3, start=datetime(2025, 3, 1, 8, batch))
+            await buffer.flush(force=True)
+        chunks = await db.location_traces.find({"route_id": "r1"}).sort("start", 1).to_list(None)
+        trace = b"".join([line async for line in server.iter_trace("r1", None, None)])
+        return chunks, trace
+
+    chunks, trace = asyncio.run(run())
+    assert [(chunk["count"], chunk["closed"]) for chunk in chunks] == [(3, True), (3, True), (3, False)]
+    assert len(trace.splitlines()) == 9
+
+def failing_bulk_writes(db, monkeypatch, failures):
+    """Count location_traces.bulk_write calls, raising AutoReconnect for the first `failures`"""
+    collection = type(db.location_traces)
+    original, calls = collection.bulk_write, []
+
+    async def bulk_write(self, operations, **kwargs):
+        calls.append(len(operations))
+        if len(calls) <= failures:
+            raise server.AutoReconnect("primary stepped down")
+        return await original(self, operations, **kwargs)
+    monkeypatch.setattr(collection, "bulk_write", bulk_write)
+    return calls
+
+def test_a_flush_is_one_bulk_write(db, monkeypatch):
+    calls = failing_bulk_writes(db, monkeypatch, failures=0)
+
+    async def run():
+        buffer = server.LocationWriteBuffer()
+        for start in (datetime(2025, 3, 1, 8, 0), datetime(2025, 3, 1, 8, 1)):
+            for route_id in ("r1", "r2", "r3"):
+                staged(buffer, route_id, 5, start=start)
+            await buffer.flush(force=True)
+        return await db.location_traces.count_documents({})
+
+    assert asyncio.run(run()) == 3
+    # New chunks take one more write to close any chunk they replace; appends take one
+    assert calls == [3, 3, 3]
+
+def test_transient_failures_requeue_fixes_up_to_a_limit(db, monkeypatch):
+    calls = failing_bulk_writes(db, monkeypatch, failures=server.TRACE_FLUSH_MAX_ATTEMPTS + 1)
+
+    async def run():
+        buffer = server.LocationWriteBuffer()
+        staged(buffer, "r1", 5)
+        await buffer.flush(force=True)
+        requeued = buffer.pending_count
+        staged(buffer, "r1", 2, start=datetime(2025, 3, 1, 9, 0))
+        for _ in range(server.TRACE_FLUSH_MAX_ATTEMPTS - 1):
+            await buffer.flush(force=True)
+        dropped = buffer.pending_count
+        staged(buffer, "r2", 3)
+        await buffer.flush(force=True)  # still failing: r2 is requeued
+        await buffer.flush(force=True)
+        written = {doc["route_id"]: doc["count"] async for doc in db.location_traces.find()}
+        return requeued, dropped, written
+
+    requeued, dropped, written = asyncio.run(run())
+    assert requeued == 5 and dropped == 0
+    assert written == {"r2": 3}
+
+def test_more_than_a_chunk_of_fixes_starts_new_chunks(db):
+    async def run():
+        buffer = server.LocationWriteBuffer(chunk_fixes=3)
+        staged(buffer, "r1", 1)
+        await buffer.flush(force=True)
+        staged(buffer, "r1", 7, start=datetime(2025, 3, 1, 9, 0))
+        await buffer.flush(force=True)
+        chunks = await db.location_traces.find({"route_id": "r1"}).sort("start", 1).to_list(None)
+        trace = b"".join([line async for line in server.iter_trace("r1", None, None)])
+        return chunks, trace
+
+    chunks, trace = asyncio.run(run())
+    assert [(chunk["count"], chunk["closed"]) for chunk in chunks] == [(1, True), (3, True), (3, True), (1, False)]
+    assert len(trace.splitlines()) == 8
@@ -0,0 +1,119 @@
+import asyncio
+from datetime import datetime
+
+import httpx
+import pytest
+
+import server
+
+class RecordingProvider(server.NotificationProvider):
+    name = "recording"
+
+    def __init__(self, failures: int = 0):
+        self.sent = []
+        self.failures = failures
+
+    async def send(self, contact, alert, idempotency_key):
+        if self.failures:
+            self.failures -= 1
+            raise server.NotificationError("busy", retryable=True)
+        self.sent.append(idempotency_key)
+
+def contacts(count):
+    return [{"id": f"c{i}", "name": f"Contact {i}", "priority": i} for i in range(count)]
+
+def alert(alert_id):
+    return {"id": alert_id, "user_id": "u1", "alert_type": "manual", "user_location": {"lat": 0, "lng": 0}}
+
+def test_fan_out_larger_than_queue_does_not_deadlock(db, monkeypatch):
+    async def get(owner_id):
+        return contacts(5)
+    monkeypatch.setattr(server.contact_cache, "get", get)
+    monkeypatch.setattr(server, "NOTIFICATION_QUEUE_SIZE", 3)
+
+    async def run():
+        provider = RecordingProvider()
+        dispatcher = server.NotificationDispatcher([provider], workers=1)
+        dispatcher.start()
+        for alert_id in ("a1", "a2"):
+            await dispatcher.enqueue_alert(alert(alert_id))
+        await asyncio.wait_for(dispatcher.drain(), 2)
+        await dispatcher.stop()
+        return provider.sent
+
+    sent = asyncio.run(run())
+    assert sorted(sent) == sorted(f"{a}:c{i}:recording" for a in ("a1", "a2") for i in range(5))
+
+def test_retries_are_tracked_and_delivered_once(db, monkeypatch):
+    async def get(owner_id):
+        return contacts(1)
+    monkeypatch.setattr(server.contact_cache, "get", get)
+    monkeypatch.setattr(server, "NOTIFICATION_BACKOFF_S", 0.01)
+
+    async def run():
+        provider = RecordingProvider(failures=1)
+        dispatcher = server.NotificationDispatcher([provider], workers=2)
+        dispatcher.start()
+        await dispatcher.enqueue_alert(alert("a1"))
+        await asyncio.wait_for(dispatcher.drain(), 2)
+        assert len(dispatcher._retries) == 1
+        while dispatcher._retries:
+            await asyncio.sleep(0.01)
+        await asyncio.wait_for(dispatcher.drain(), 2)
+        await dispatcher.stop()
+        return provider.sent
+
+    assert asyncio.run(run()) == ["a1:c0:recording"]
+
+def test_two_workers_send_a_job_once(db, monkeypatch):
+    async def get(owner_id):
+        return contacts(3)
+    monkeypatch.setattr(server.contact_cache, "get", get)
+
+    async def run():
+        await db.notification_log.create_index("key", unique=True)
+        provider = RecordingProvider()
+        workers = [server.NotificationDispatcher([provider], workers=2) for _ in range(2)]
+        for worker in workers:
+            worker.start()
+            await worker.enqueue_alert(alert("a1"))
+        for worker in workers:
+            await asyncio.wait_for(worker.drain(), 2)
+            await worker.stop()
+        statuses = {doc["key"]: doc["status"] async for doc in db.notification_log.find()}
+        return provider.sent, statuses
+
+    sent, statuses = asyncio.run(run())
+    assert sorted(sent) == [f"a1:c{i}:recording" for i in range(3)]
+    assert set(statuses.values()) == {"delivered"}
+
+def test_providers_must_implement_send():
+    class Incomplete(server.NotificationProvider):
+        name = "incomplete"
+
+    with pytest.raises(TypeError):
+        Incomplete()
+
+def twilio(handler):
+    provider = server.TwilioSMSProvider("AC1", "token", "+15550000")
+    provider.client = httpx.AsyncClient(base_url="https://twilio.test", transport=httpx.MockTransport(handler))
+    return provider
+
+def test_twilio_does_not_retry_after_the_request_may_have_been_sent():
+    def read_timeout(request):
+        raise httpx.ReadTimeout("no response", request=request)
+
+    def refused(request):
+        raise httpx.ConnectError("refused", request=request)
+
+    async def attempt(handler):
+        provider = twilio(handler)
+        try:
+            await provider.send({"phone": "+15551111"}, {**alert("a1"), "timestamp": datetime(2025, 1, 1)}, "k")
+        except server.NotificationError as e:
+            return e.retryable
+        finally:
+            await provider.close()
+
+    assert asyncio.run(attempt(read_timeout)) is False
+    assert asyncio.run(attempt(refused)) is True
@@ -0,0 +1,58 @@
+from datetime import datetime
+
+import numpy as np
+import pytest
+from fastapi.testclient import TestClient
+
+import server
+
+AT = datetime(2025, 6, 1, 18, 30)
+
+def meters_north(lat, meters):
+    return lat + meters / server.METERS_PER_DEGREE_LAT
+
+def test_small_radius_counts_only_incidents_inside_it(index):
+    index((meters_north(28.6, 150), 77.2), (meters_north(28.6, 250), 77.2))
+
+    weighted = server.risk_aggregates.weighted_counts(np.array([28.6]), np.array([77.2]), 200, AT)[0]
+    single = server.risk_aggregates.weighted_counts(np.array([meters_north(28.6, 150)]), np.array([77.2]), 50, AT)[0]
+
+    assert len(server.incident_index.query(28.6, 77.2, 200)) == 1
+    assert weighted == pytest.approx(single)
+
+def test_small_radius_score_agrees_with_incident_count(index):
+    rng = np.random.default_rng(3)
+    index(*zip(28.6 + rng.random(300) * 0.05, 77.2 + rng.random(300) * 0.05))
+    lats, lngs = 28.6 + rng.random(200) * 0.05, 77.2 + rng.random(200) * 0.05
+
+    for radius in (50, 150, 300):
+        weighted = server.risk_aggregates.weighted_counts(lats, lngs, radius, AT)
+        counts = server.incident_index.count_within(lats, lngs, radius)
+        np.testing.assert_array_equal(weighted > 0, counts > 0)
+
+def test_exact_and_cell_weighting_agree_for_a_lone_incident(index):
+    index((28.60125, 77.20125))
+
+    exact = server.risk_aggregates.weighted_counts(np.array([28.60125]), np.array([77.20125]), 100, AT)[0]
+    by_cell = server.risk_aggregates.weighted_counts(np.array([28.60125]), np.array([77.20125]), 1000, AT)[0]
+
+    assert exact > 0
+    assert exact == pytest.approx(by_cell, rel=0.01)
+
+def test_chunking_does_not_change_counts(index, monkeypatch):
+    rng = np.random.default_rng(9)
+    index(*zip(28.6 + rng.random(300) * 0.05, 77.2 + rng.random(300) * 0.05))
+    lats, lngs = 28.6 + rng.random(50) * 0.05, 77.2 + rng.random(50) * 0.05
+
+    whole = server.risk_aggregates.weighted_counts(lats, lngs, 2000, AT)
+    monkeypatch.setattr(server, "RISK_AGG_CHUNK_CELLS", 1000)
+    np.testing.assert_allclose(server.risk_aggregates.weighted_counts(lats, lngs, 2000, AT), whole)
+
+def test_radius_is_bounded(index, monkeypatch):
+    monkeypatch.setattr(server, "ADMISSION_CONTROL", False)
+    client = TestClient(server.app)
+
+    for radius in (0, 5001):
+        assert client.get("/api/risk-analysis", params={"lat": 28.6, "lng": 77.2, "radius": radius}).status_code == 422
+        assert client.post("/api/risk-analysis/batch", json={"points": [{"lat": 28.6, "lng": 77.2}], "radius": radius}).status_code == 422
+    assert client.get("/api/risk-analysis", params={"lat": 28.6, "lng": 77.2, "radius": 5000}).status_code == 200
@@ -0,0 +1,79 @@
+import asyncio
+
+import numpy as np
+import pytest
+from fastapi.testclient import TestClient
+
+import server
+
+KEY = (28600, 77200, 1000, None)
+
+def test_concurrent_misses_share_one_computation():
+    calls = []
+
+    async def compute():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        return {"risk_score": 0.4}, True
+
+    async def run():
+        cache = server.RiskResultCache()
+        results = await asyncio.gather(*(cache.get(KEY, compute) for _ in range(5)))
+        return results, await cache.get(KEY, compute), cache
+
+    results, cached, cache = asyncio.run(run())
+    assert results == [{"risk_score": 0.4}] * 5 and cached == {"risk_score": 0.4}
+    assert len(calls) == 1
+    assert (cache.misses, cache.shared, cache.hits) == (1, 4, 1)
+
+def test_cancelled_leader_does_not_strand_waiters():
+    started = []
+
+    async def compute():
+        started.append(1)
+        await asyncio.sleep(0.05 if len(started) == 1 else 0)
+        return {"risk_score": 0.2}, True
+
+    async def run():
+        cache = server.RiskResultCache()
+        leader = asyncio.create_task(cache.get(KEY, compute))
+        await asyncio.sleep(0)
+        waiter = asyncio.create_task(cache.get(KEY, compute))
+        await asyncio.sleep(0)
+        leader.cancel()
+        result = await asyncio.wait_for(waiter, 1)
+        with pytest.raises(asyncio.CancelledError):
+            await leader
+        return result, cache
+
+    result, cache = asyncio.run(run())
+    assert result == {"risk_score": 0.2}
+    assert len(started) == 2 and not cache.inflight
+
+def test_failed_computation_reaches_every_waiter():
+    async def compute():
+        await asyncio.sleep(0.01)
+        raise RuntimeError("index unavailable")
+
+    async def run():
+        cache = server.RiskResultCache()
+        return await asyncio.gather(*(cache.get(KEY, compute) for _ in range(3)), return_exceptions=True), cache
+
+    results, cache = asyncio.run(run())
+    assert all(isinstance(result, RuntimeError) for result in results)
+    assert not cache.inflight and not cache.entries
+
+def test_single_and_batch_risk_agree(index, monkeypatch):
+    monkeypatch.setattr(server, "ADMISSION_CONTROL", False)
+    rng = np.random.default_rng(11)
+    index(*zip(28.6 + rng.random(400) * 0.03, 77.2 + rng.random(400) * 0.03))
+    points = [{"lat": float(lat), "lng": float(lng)} for lat, lng in zip(28.6 + rng.random(8) * 0.03, 77.2 + rng.random(8) * 0.03)]
+    client = TestClient(server.app)
+
+    for radius in (150, 1000):
+        batch = client.post("/api/risk-analysis/batch", json={"points": points, "radius": radius, "at": "2025-06-01T18:40:00"}).json()
+        for point, scored in zip(points, batch["results"]):
+            single = client.get("/api/risk-analysis", params={**point, "radius": radius, "at": "2025-06-01T18:40:00"}).json()
+            assert single["at"] == batch["at"]
+            assert single["risk_score"] == pytest.approx(scored["risk_score"])
+            assert single["incident_count"] == scored["incident_count"]
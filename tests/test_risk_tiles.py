@@ -0,0 +1,25 @@
+import random
+
+import numpy as np
+
+import server
+
+def test_tile_keys_covering_matches_tiles_covering():
+    rng = random.Random(7)
+    lats = [26 + rng.random() * 5 for _ in range(200)]
+    lngs = [75 + rng.random() * 5 for _ in range(200)]
+    for z in (10, 14, 17):
+        expected = {x * 2 ** z + y for lat, lng in zip(lats, lngs) for x, y in server.tiles_covering(z, lat, lng, 1000)}
+        assert set(server.tile_keys_covering(z, np.array(lats), np.array(lngs), 1000).tolist()) == expected
+
+def test_apply_incidents_drops_only_reached_tiles():
+    tiles = server.RiskTileCache()
+    hour = server.risk_tile_hour(None)
+    near = server.tiles_covering(15, 28.61, 77.21, 0)[0]
+    far = server.tiles_covering(15, 19.07, 72.87, 0)[0]
+    for x, y in (near, far):
+        tiles.risk[(15, x, y, hour)] = np.zeros(1)
+
+    tiles.apply_incidents([{"lat": 28.61, "lng": 77.21}])
+
+    assert list(tiles.risk) == [(15, *far, hour)]
@@ -0,0 +1,46 @@
+import numpy as np
+from scipy.sparse.csgraph import dijkstra
+
+import server
+
+def grid_graph(n=30, spacing_deg=0.001):
+    ids = np.arange(n * n).reshape(n, n)
+    lat = np.repeat(28.6 + np.arange(n) * spacing_deg, n)
+    lng = np.tile(77.2 + np.arange(n) * spacing_deg, n)
+    u = np.concatenate([ids[:, :-1].ravel(), ids[:-1, :].ravel()])
+    v = np.concatenate([ids[:, 1:].ravel(), ids[1:, :].ravel()])
+    return server.RoadGraph(lat, lng, u, v)
+
+def path_cost(graph, path):
+    return sum(graph.weights[a, b] for a, b in zip(path, path[1:]))
+
+def test_shortest_path_matches_unbounded_dijkstra():
+    graph = grid_graph()
+    rng = np.random.default_rng(3)
+    graph.incident_counts = rng.integers(0, 6, len(graph.indices))
+    graph._set_risk(np.arange(len(graph.indices)))
+    for source, target in rng.integers(0, len(graph), (20, 2)).tolist():
+        path = graph.shortest_path(source, target)
+        assert path[0] == source and path[-1] == target
+        assert np.isclose(path_cost(graph, path), dijkstra(graph.weights, indices=source)[target])
+
+def test_disconnected_nodes_have_no_path():
+    lat, lng = np.array([28.6, 28.601, 28.7, 28.701]), np.array([77.2, 77.2, 77.3, 77.3])
+    graph = server.RoadGraph(lat, lng, np.array([0, 2]), np.array([1, 3]))
+    assert graph.shortest_path(0, 3) is None
+    assert graph.shortest_path(0, 1) == [0, 1]
+
+def test_path_from_stale_weights_is_not_cached(monkeypatch):
+    graph = grid_graph(10)
+    original = server.dijkstra
+
+    def dijkstra_during_risk_update(*args, **kwargs):
+        graph._set_risk(np.arange(len(graph.indices)))  # what an incident landing mid-search does
+        return original(*args, **kwargs)
+
+    monkeypatch.setattr(server, "dijkstra", dijkstra_during_risk_update)
+    assert graph.shortest_path(0, 99) is not None
+    assert (0, 99) not in graph.routes
+    monkeypatch.setattr(server, "dijkstra", original)
+    graph.shortest_path(0, 99)
+    assert (0, 99) in graph.routes
@@ -0,0 +1,99 @@
+import asyncio
+from datetime import datetime, timedelta
+
+from fastapi.encoders import jsonable_encoder
+from fastapi.testclient import TestClient
+
+import server
+
+ROUTE = [{"lat": 28.6, "lng": 77.2}, {"lat": 28.61, "lng": 77.21}]
+
+def route(route_id, **fields):
+    return {**server.RouteData(id=route_id, start_location=ROUTE[0], destination=ROUTE[-1],
+                               planned_route=ROUTE, current_location=ROUTE[0]).dict(), **fields}
+
+def lifecycle(db, monkeypatch):
+    monkeypatch.setattr(server, "ADMISSION_CONTROL", False)
+    monkeypatch.setattr(server, "active_routes_cache", server.ActiveRouteCache())
+    monkeypatch.setattr(server, "location_buffer", server.LocationWriteBuffer())
+    monkeypatch.setattr(server, "event_bus", server.InProcessEventBus())
+    return TestClient(server.app)
+
+def ended_events():
+    return [(event["route_id"], event["status"]) for channel, event in server.event_bus.pending
+            if channel == server.ROUTE_LIFECYCLE_CHANNEL]
+
+def test_stopping_a_route_twice_conflicts(db, monkeypatch):
+    client = lifecycle(db, monkeypatch)
+    route_id = client.post("/api/route-tracking", json=jsonable_encoder(route("r1"))).json()["route_id"]
+
+    assert client.post(f"/api/route-tracking/{route_id}/stop").status_code == 200
+    second = client.post(f"/api/route-tracking/{route_id}/stop")
+    assert second.status_code == 409 and second.json()["detail"] == "Route already stopped"
+    assert client.post(f"/api/route-tracking/{route_id}/complete").status_code == 409
+    assert client.post("/api/route-tracking/missing/stop").status_code == 404
+    assert client.post("/api/location-update", params={"route_id": route_id}, json=ROUTE[0]).status_code == 404
+    assert ended_events() == [("r1", "stopped")]
+
+def test_cold_miss_reloads_live_routes_only(db, monkeypatch):
+    lifecycle(db, monkeypatch)
+
+    async def run():
+        await db.active_routes.insert_many([route("live"), route("done", is_active=False, status="completed")])
+        cache = server.ActiveRouteCache()
+        live, done = await cache.get("live"), await cache.get("done")
+        await db.active_routes.delete_one({"id": "live"})
+        return live, done, await cache.get("live")
+
+    live, done, cached = asyncio.run(run())
+    assert live is not None and live.id == "live" and done is None
+    assert cached is live
+
+def test_archiver_expires_idle_routes_and_archives_ended_ones(db, monkeypatch):
+    client = lifecycle(db, monkeypatch)
+    now = datetime.utcnow().replace(microsecond=0)  # Mongo keeps milliseconds
+    legacy = route("legacy")
+    del legacy["last_seen_at"]
+
+    async def setup():
+        await db.active_routes.insert_many([
+            route("idle", last_seen_at=now - timedelta(hours=1)),
+            route("fresh", last_seen_at=now - timedelta(seconds=10)),
+            route("stopped", is_active=False, status="stopped", ended_at=now),
+            legacy,
+        ])
+        await server.active_routes_cache.get("idle")
+    asyncio.run(setup())
+    idle_track = server.active_routes_cache.routes["idle"]
+
+    async def sweep():
+        archiver = server.RouteArchiver(idle_ttl_s=600, batch=2)
+        expired, archived = await archiver.expire_idle(now), await archiver.archive_ended(now)
+        active = {doc["id"] async for doc in db.active_routes.find()}
+        archived_routes = {doc["id"]: doc async for doc in db.archived_routes.find()}
+        return expired, archived, active, archived_routes
+
+    expired, archived, active, archived_routes = asyncio.run(sweep())
+    assert (expired, archived) == (2, 3)
+    assert active == {"fresh"}
+    assert {route_id: doc["status"] for route_id, doc in archived_routes.items()} == {
+        "idle": "expired", "legacy": "expired", "stopped": "stopped"}
+    assert all(doc["archived_at"] == now for doc in archived_routes.values())
+    assert idle_track.status == "expired" and "idle" not in server.active_routes_cache.routes
+    assert sorted(ended_events()) == [("idle", "expired"), ("legacy", "expired")]
+
+    # Archived routes still answer with 409 rather than 404
+    assert client.post("/api/route-tracking/idle/complete").status_code == 409
+
+def test_sweep_records_activity_so_busy_routes_stay_live(db, monkeypatch):
+    client = lifecycle(db, monkeypatch)
+    start = datetime.utcnow() - timedelta(hours=1)
+    client.post("/api/route-tracking", json=jsonable_encoder(route("r1", started_at=start, last_seen_at=start)))
+    client.post("/api/location-update", params={"route_id": "r1"}, json=ROUTE[1])
+
+    async def sweep():
+        await server.RouteArchiver(idle_ttl_s=600).sweep()
+        return await db.active_routes.find_one({"id": "r1"})
+
+    stored = asyncio.run(sweep())
+    assert stored["is_active"] and stored["last_seen_at"] > start
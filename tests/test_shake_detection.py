@@ -0,0 +1,57 @@
+import numpy as np
+import pytest
+from fastapi.testclient import TestClient
+
+import server
+
+def record(device_id, xyz, rate=50):
+    xyz = np.asarray(xyz, dtype="<f4")
+    return server.SHAKE_RECORD_HEADER.pack(device_id.encode(), rate, len(xyz)) + xyz.tobytes()
+
+def motion(hz, amplitude, seconds=2.56, rate=50):
+    t = np.arange(int(seconds * rate)) / rate
+    xyz = np.zeros((len(t), 3))
+    xyz[:, 0] = amplitude * np.sin(2 * np.pi * hz * t)
+    xyz[:, 2] = 9.81  # gravity
+    return xyz
+
+def walking(seconds=2.56, rate=50):
+    t = np.arange(int(seconds * rate)) / rate
+    xyz = np.zeros((len(t), 3))
+    xyz[:, 2] = 9.81 + 2.5 * np.abs(np.sin(np.pi * 1.8 * t)) + np.random.default_rng(5).normal(0, 0.3, len(t))
+    xyz[:, 0] = 0.8 * np.sin(np.pi * 0.9 * t)
+    return xyz
+
+def test_three_hertz_shake_triggers_and_walking_does_not():
+    body = record("shaker", motion(3.0, 15.0)) + record("walker", walking()) + record("shaker-100hz", motion(3.0, 15.0, rate=100), rate=100)
+
+    device_ids, signals = server.parse_shake_windows(body)
+    result = server.detect_sos_shakes(signals)
+
+    assert device_ids == ["shaker", "walker", "shaker-100hz"]
+    assert result["sos_triggered"].tolist() == [True, False, True]
+    assert result["dominant_hz"][0] == pytest.approx(3.0, abs=0.5)
+
+@pytest.mark.parametrize("body", [
+    b"",
+    record("phone", motion(3.0, 15.0))[:10],
+    record("phone", motion(3.0, 15.0))[:-4],
+    server.SHAKE_RECORD_HEADER.pack(b"phone", 0, 2) + b"\0" * 24,
+    server.SHAKE_RECORD_HEADER.pack(b"phone", 50, server.SHAKE_MAX_SAMPLES + 1) + b"\0" * 12 * (server.SHAKE_MAX_SAMPLES + 1),
+])
+def test_malformed_records_are_rejected(body):
+    with pytest.raises(ValueError):
+        server.parse_shake_windows(body)
+
+def test_too_many_windows_are_rejected(monkeypatch):
+    monkeypatch.setattr(server, "SHAKE_MAX_WINDOWS", 2)
+    with pytest.raises(ValueError):
+        server.parse_shake_windows(record("a", walking()) * 3)
+
+def test_endpoint_refuses_oversized_bodies(monkeypatch):
+    monkeypatch.setattr(server, "ADMISSION_CONTROL", False)
+    monkeypatch.setattr(server, "SHAKE_MAX_BODY_BYTES", 1000)
+    client = TestClient(server.app)
+
+    assert client.post("/api/shake-detection/batch", content=b"\0" * 2000).status_code == 413
+    assert client.post("/api/shake-detection/batch", content=record("a", motion(3.0, 15.0))[:500]).status_code == 400
@@ -0,0 +1,93 @@
+import asyncio
+
+import server
+
+def sos(lat, **identity):
+    return server.SOSAlert(user_location={"lat": lat, "lng": 77.2}, alert_type="shake", **identity)
+
+def submit_all(db, monkeypatch, alerts):
+    enqueued = []
+
+    async def enqueue_alert(alert):
+        enqueued.append(alert["id"])
+    monkeypatch.setattr(server.notification_dispatcher, "enqueue_alert", enqueue_alert)
+
+    async def run():
+        coalescer = server.SOSCoalescer(window_s=60)
+        results = [await coalescer.submit(server.sos_coalesce_key(alert), alert) for alert in alerts]
+        stored = await db.sos_alerts.find({}, {"_id": 0}).to_list(None)
+        return results, stored
+
+    results, stored = asyncio.run(run())
+    return results, {alert["id"]: alert for alert in stored}, enqueued
+
+def test_triggers_from_one_user_merge_into_the_first_alert(db, monkeypatch):
+    results, stored, enqueued = submit_all(db, monkeypatch, [sos(28.60, user_id="u1"), sos(28.61, user_id="u1")])
+
+    (first_id, first_merged), (second_id, second_merged) = results
+    assert (first_merged, second_merged) == (False, True)
+    assert first_id == second_id and enqueued == [first_id]
+    alert = stored[first_id]
+    assert alert["trigger_count"] == 2
+    assert alert["user_location"]["lat"] == 28.60
+    assert [e["user_location"]["lat"] for e in alert["evidence"]] == [28.60, 28.61]
+
+def test_anonymous_triggers_are_never_merged(db, monkeypatch):
+    results, stored, enqueued = submit_all(db, monkeypatch, [sos(28.60), sos(28.61)])
+
+    assert [merged for _, merged in results] == [False, False]
+    assert len(stored) == 2 and len(enqueued) == 2
+
+def test_user_and_device_keys_do_not_collide(db, monkeypatch):
+    results, stored, _ = submit_all(db, monkeypatch, [sos(28.60, user_id="abc"), sos(28.61, device_id="abc")])
+
+    assert [merged for _, merged in results] == [False, False]
+    assert len(stored) == 2
+
+def run_workers(db, monkeypatch, scenario, window_s=60):
+    enqueued = []
+
+    async def enqueue_alert(alert):
+        enqueued.append(alert["id"])
+    monkeypatch.setattr(server.notification_dispatcher, "enqueue_alert", enqueue_alert)
+
+    async def run():
+        workers = [server.SOSCoalescer(window_s=window_s), server.SOSCoalescer(window_s=window_s)]
+        results = await scenario(workers)
+        stored = await db.sos_alerts.find({}, {"_id": 0}).to_list(None)
+        return results, stored
+
+    results, stored = asyncio.run(run())
+    return results, stored, enqueued
+
+def submit(worker, alert):
+    return worker.submit(server.sos_coalesce_key(alert), alert)
+
+def test_triggers_on_different_workers_merge(db, monkeypatch):
+    async def scenario(workers):
+        return [await submit(workers[0], sos(28.60, user_id="u1")), await submit(workers[1], sos(28.61, user_id="u1")),
+                await submit(workers[0], sos(28.62, user_id="u1"))]
+
+    results, stored, enqueued = run_workers(db, monkeypatch, scenario)
+    assert [merged for _, merged in results] == [False, True, True]
+    assert len({alert_id for alert_id, _ in results}) == 1
+    assert len(stored) == 1 and stored[0]["trigger_count"] == 3 and len(enqueued) == 1
+
+def test_concurrent_triggers_on_different_workers_create_one_alert(db, monkeypatch):
+    async def scenario(workers):
+        return await asyncio.gather(*(submit(workers[i % 2], sos(28.6, user_id="u1")) for i in range(6)))
+
+    results, stored, enqueued = run_workers(db, monkeypatch, scenario)
+    assert len({alert_id for alert_id, _ in results}) == 1
+    assert sorted(merged for _, merged in results) == [False] + [True] * 5
+    assert len(stored) == 1 and stored[0]["trigger_count"] == 6 and len(enqueued) == 1
+
+def test_a_trigger_after_the_window_raises_a_new_alert(db, monkeypatch):
+    async def scenario(workers):
+        first = await submit(workers[0], sos(28.60, user_id="u1"))
+        await asyncio.sleep(0.1)
+        return [first, await submit(workers[1], sos(28.61, user_id="u1"))]
+
+    results, stored, enqueued = run_workers(db, monkeypatch, scenario, window_s=0.05)
+    assert [merged for _, merged in results] == [False, False]
+    assert len(stored) == 2 and len(enqueued) == 2
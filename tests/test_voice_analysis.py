@@ -0,0 +1,26 @@
+import struct
+
+import pytest
+from fastapi.testclient import TestClient
+
+import server
+
+@pytest.mark.parametrize("sample_rate", [0, -8000, 500000])
+def test_invalid_sample_rate_is_rejected(sample_rate):
+    client = TestClient(server.app)
+    response = client.post("/api/voice-analysis", params={"sample_rate": sample_rate},
+                           files={"audio": ("clip.raw", b"\x00" * 64000, "application/octet-stream")})
+    assert response.status_code == 422
+
+def test_wav_header_with_zero_sample_rate_is_rejected():
+    fmt = struct.pack("<HHIIHH", 1, 1, 0, 0, 2, 16)
+    header = b"RIFF" + struct.pack("<I", 36) + b"WAVE" + b"fmt " + struct.pack("<I", 16) + fmt + b"data" + struct.pack("<I", 0)
+    with pytest.raises(ValueError):
+        server.parse_wav_header(header)
+
+def test_live_voice_answers_text_frames_with_an_error():
+    with TestClient(server.app).websocket_connect("/api/voice-analysis/live") as websocket:
+        websocket.send_text("hello")
+        assert websocket.receive_json()["event"] == "error"
+        websocket.send_text("still here")
+        assert websocket.receive_json()["event"] == "error"